@@ -0,0 +1,54 @@
+"""Benchmarks of hashing, matching, caching and listing notebooks.
+
+Operations on a single notebook are benchmarked for each notebook profile
+(cell counts, output sizes and image payloads),
+and operations on the cache for each cache size.
+"""
+
+import itertools
+
+from synthetic import make_notebook
+
+from jupyter_cache.base import CacheBundleIn
+from jupyter_cache.cache.main import JupyterCacheBase
+from jupyter_cache.utils import tabulate_project_records
+
+# indexes of notebooks cached by the benchmarks, distinct from the project notebooks
+_NEW_INDEX = itertools.count(10**9)
+
+
+def test_create_hashed_notebook(measure, profile, tmp_path):
+    cache = JupyterCacheBase(str(tmp_path))
+    nb = make_notebook(0, profile)
+    measure(lambda: cache.create_hashed_notebook(nb))
+
+
+def test_merge_match_into_notebook(measure, profile, populated_cache):
+    populated_cache.cache_notebook_bundle(
+        CacheBundleIn(make_notebook(-1, profile), "merge.ipynb"),
+        check_validity=False,
+        overwrite=True,
+    )
+    nb = make_notebook(-1, profile, executed=False)
+    measure(lambda: populated_cache.merge_match_into_notebook(nb))
+
+
+def test_cache_notebook_bundle(measure, profile, populated_cache):
+    def setup():
+        nb = make_notebook(next(_NEW_INDEX), profile)
+        return (CacheBundleIn(nb, "new.ipynb"),), {"check_validity": False}
+
+    measure(populated_cache.cache_notebook_bundle, setup=setup)
+
+
+def test_list_unexecuted(measure, populated_cache):
+    measure(populated_cache.list_unexecuted, rounds=3)
+
+
+def test_tabulate_project_records(measure, populated_cache):
+    measure(
+        lambda: tabulate_project_records(
+            populated_cache.list_project_records(), cache=populated_cache
+        ),
+        rounds=3,
+    )
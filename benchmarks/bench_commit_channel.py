@@ -0,0 +1,84 @@
+"""Benchmark committing executed notebooks from many worker processes.
+
+Notebook "execution" is simulated (no kernels are started),
+so that the benchmark measures the contention of cache commits only.
+Each run compares workers committing directly to the cache,
+against workers returning their notebooks to a single writer.
+Notebooks that fail to be cached (e.g. with "database is locked",
+or from concurrent truncation of the cache) are reported as errored::
+
+    python benchmarks/bench_commit_channel.py --workers 32 --notebooks 512
+"""
+
+import argparse
+import logging
+from pathlib import Path
+import tempfile
+import time
+
+import nbformat as nbf
+from synthetic import make_notebook
+
+from jupyter_cache.cache.main import JupyterCacheBase
+from jupyter_cache.executors.basic import (
+    ExecutionWorkerLocalMProc,
+    JupyterExecutorLocalMproc,
+)
+from jupyter_cache.executors.utils import ExecutionResult
+
+
+class SimulatedWorker(ExecutionWorkerLocalMProc):
+    """Execution worker, that fills in outputs without starting a kernel."""
+
+    @staticmethod
+    def execute(project_nb, data):
+        for count, cell in enumerate(project_nb.nb.cells, 1):
+            cell.execution_count = count
+            cell.outputs = [
+                nbf.v4.new_output("stream", name="stdout", text=f"{count}\n")
+            ]
+        return ExecutionResult(project_nb.nb, None, 0.0)
+
+
+class SimulatedExecutor(JupyterExecutorLocalMproc):
+    _EXECUTION_WORKER = SimulatedWorker
+
+
+def run(folder: Path, notebooks: int, workers: int, single_writer: bool) -> dict:
+    cache = JupyterCacheBase(str(folder / "cache"))
+    cache.change_cache_limit(notebooks)
+    for index in range(notebooks):
+        path = folder / f"nb_{index}.ipynb"
+        nbf.write(make_notebook(index, executed=False), str(path))
+        cache.add_nb_to_project(str(path))
+
+    executor = SimulatedExecutor(cache, logging.getLogger(__name__))
+    start = time.perf_counter()
+    result = executor.run_and_cache(workers=workers, single_writer=single_writer)
+    seconds = time.perf_counter() - start
+    return {
+        "mode": "single-writer" if single_writer else "direct",
+        "seconds": seconds,
+        "notebooks/s": notebooks / seconds,
+        "succeeded": len(result.succeeded),
+        "errored": len(result.errored),
+        "cached": len(cache.list_cache_records()),
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--notebooks", type=int, default=512)
+    options = parser.parse_args(args)
+    for single_writer in (False, True):
+        with tempfile.TemporaryDirectory() as folder:
+            stats = run(Path(folder), options.notebooks, options.workers, single_writer)
+        print(
+            "{mode:>13}: {seconds:6.2f} s, {notebooks/s:7.1f} notebooks/s, "
+            "{succeeded} succeeded, {errored} errored, {cached} cached".format(**stats)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Fixtures for the benchmarks, which require pytest-benchmark::
+
+pytest benchmarks --cache-sizes 10,1000
+"""
+
+import tracemalloc
+
+import pytest
+from synthetic import PROFILES, populate_cache
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--cache-sizes",
+        default="10,1000,10000",
+        help="Comma-separated numbers of notebooks, in the caches to benchmark",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "cache_size" in metafunc.fixturenames:
+        sizes = [int(s) for s in metafunc.config.getoption("cache_sizes").split(",")]
+        metafunc.parametrize("cache_size", sizes, scope="session")
+    if "profile_name" in metafunc.fixturenames:
+        metafunc.parametrize("profile_name", list(PROFILES))
+
+
+@pytest.fixture(scope="session")
+def populated_cache(cache_size, tmp_path_factory):
+    """A project of ``cache_size`` notebooks, half of which are cached.
+
+    This is shared between benchmarks, since large caches are slow to create.
+    """
+    return populate_cache(tmp_path_factory.mktemp(f"cache_{cache_size}"), cache_size)
+
+
+@pytest.fixture
+def profile(profile_name):
+    return PROFILES[profile_name]
+
+
+@pytest.fixture
+def measure(benchmark):
+    """Benchmark the time of a function, and the peak memory of one call to it.
+
+    If ``setup`` is given, it is called before each call,
+    to return the ``(args, kwargs)`` of the call.
+    If ``rounds`` is given, the function is called that many times,
+    rather than as many as fit in pytest-benchmark's time budget.
+    """
+
+    def _measure(func, setup=None, rounds=None):
+        args, kwargs = setup() if setup else ((), {})
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            benchmark.extra_info["peak_memory_kib"] = (
+                tracemalloc.get_traced_memory()[1] // 1024
+            )
+        finally:
+            tracemalloc.stop()
+        if setup is None and rounds is None:
+            return benchmark(func)
+        return benchmark.pedantic(func, setup=setup, rounds=rounds or 20)
+
+    return _measure
@@ -0,0 +1,171 @@
+"""Stress a cache with many processes, committing, reading and removing notebooks.
+
+Each process runs a random mix of ``cache_notebook_bundle``, ``get_cache_bundle``,
+``remove_cache`` and ``truncate_caches`` against one cache,
+with a cache limit low enough that commits also evict notebooks.
+The throughput and latency percentiles of each operation are reported,
+with the errors raised (records removed concurrently by another process
+raise ``KeyError``, which is counted but expected).
+Afterwards, the cache is checked for records without files,
+and for directories without records.
+The exit code is 1 if errors other than ``KeyError`` were raised,
+or if the invariants do not hold::
+
+    python benchmarks/stress_cache.py --processes 16 --seconds 30
+"""
+
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import make_notebook
+
+from jupyter_cache.base import CacheBundleIn
+from jupyter_cache.cache.main import JupyterCacheBase
+
+OPERATIONS = ("commit", "get", "remove", "truncate")
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    """Parse operation weights, e.g. ``commit=4,get=4,remove=1,truncate=1``."""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {name!r}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def _random_pk(cache: JupyterCacheBase, rand: random.Random) -> int:
+    records = cache.list_cache_records()
+    if not records:
+        raise KeyError("No cache records")
+    return rand.choice(records).pk
+
+
+def worker(path: str, index: int, mix: dict, start_at: float, seconds: float):
+    """Run random operations until the time is up,
+    returning the ``(operation, seconds, error)`` of each.
+    """
+    cache = JupyterCacheBase(path)
+    rand = random.Random(index)
+    names, weights = list(mix), list(mix.values())
+    results = []
+    count = 0
+    time.sleep(max(start_at - time.time(), 0))
+    while time.time() < start_at + seconds:
+        name = rand.choices(names, weights)[0]
+        start = time.perf_counter()
+        error = None
+        try:
+            if name == "commit":
+                count += 1
+                nb = make_notebook(index * 10**6 + count)
+                cache.cache_notebook_bundle(
+                    CacheBundleIn(nb, f"nb_{index}.ipynb"), check_validity=False
+                )
+            elif name == "get":
+                cache.get_cache_bundle(_random_pk(cache, rand))
+            elif name == "remove":
+                cache.remove_cache(_random_pk(cache, rand))
+            else:
+                cache.truncate_caches()
+        except Exception as exc:
+            error = f"{exc.__class__.__name__}: {exc}"
+        results.append((name, time.perf_counter() - start, error))
+    return results
+
+
+def check_invariants(cache: JupyterCacheBase) -> list[str]:
+    """Return the violations of the cache invariants:
+    every record has its notebook file, and every directory has its record.
+    """
+    result = cache.fsck(dry_run=True, min_age=0)
+    return [f"Record {pk} has no notebook file" for pk in result.dangling_records] + [
+        f"Directory has no record: {name}" for name in result.orphan_folders
+    ]
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def report(results: list[tuple[str, float, str]], seconds: float) -> int:
+    """Print the throughput, latencies and errors of each operation,
+    returning the number of unexpected errors.
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(Counter)
+    for name, duration, error in results:
+        latencies[name].append(duration)
+        if error:
+            errors[name][error.split(":")[0]] += 1
+    print(
+        f"{'operation':>10} {'count':>7} {'ops/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  errors"
+    )
+    unexpected = 0
+    for name in OPERATIONS:
+        if not latencies[name]:
+            continue
+        times = latencies[name]
+        print(
+            f"{name:>10} {len(times):7d} {len(times) / seconds:8.1f} "
+            f"{1000 * percentile(times, 0.5):8.1f} "
+            f"{1000 * percentile(times, 0.95):8.1f} "
+            f"{1000 * percentile(times, 0.99):8.1f}  "
+            + ", ".join(f"{k} x{v}" for k, v in errors[name].most_common())
+        )
+        unexpected += sum(v for k, v in errors[name].items() if k != "KeyError")
+    first_errors = {}
+    for name, _, error in results:
+        if error and not error.startswith("KeyError"):
+            first_errors.setdefault(error, name)
+    for error, name in first_errors.items():
+        print(f"{name}: {error}")
+    return unexpected
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--cache-limit", type=int, default=100)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default="commit=4,get=4,remove=1,truncate=1",
+        help="Relative weights of the operations",
+    )
+    options = parser.parse_args(args)
+    with tempfile.TemporaryDirectory() as folder:
+        path = str(Path(folder) / "cache")
+        cache = JupyterCacheBase(path)
+        cache.change_cache_limit(options.cache_limit)
+        # leave time for the processes to start
+        start_at = time.time() + 2
+        with ProcessPoolExecutor(options.processes) as pool:
+            futures = [
+                pool.submit(worker, path, index, options.mix, start_at, options.seconds)
+                for index in range(options.processes)
+            ]
+            results = [result for future in futures for result in future.result()]
+        unexpected = report(results, options.seconds)
+        violations = check_invariants(cache)
+        print(
+            f"{len(cache.list_cache_records())} records, {len(violations)} violations"
+        )
+        for violation in violations[:20]:
+            print(f"  {violation}")
+    return 1 if unexpected or violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
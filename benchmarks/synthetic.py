@@ -0,0 +1,97 @@
+"""Generate synthetic notebooks and caches, for benchmarks.
+
+Notebooks are generated deterministically from an index,
+so that notebooks with different indexes have different hashkeys.
+"""
+
+import base64
+from pathlib import Path
+import random
+
+import attr
+import nbformat as nbf
+
+from jupyter_cache.base import CacheBundleIn
+from jupyter_cache.cache.main import JupyterCacheBase
+
+
+@attr.s(frozen=True, slots=True)
+class NotebookProfile:
+    """The shape of the notebooks to generate."""
+
+    cells: int = attr.ib(default=10, metadata={"help": "Code cells per notebook"})
+    output_bytes: int = attr.ib(
+        default=100, metadata={"help": "Bytes of stream output per code cell"}
+    )
+    images: int = attr.ib(default=0, metadata={"help": "PNG outputs per notebook"})
+    image_bytes: int = attr.ib(
+        default=100_000, metadata={"help": "Bytes of each PNG output"}
+    )
+
+
+PROFILES = {
+    "small": NotebookProfile(),
+    "many-cells": NotebookProfile(cells=500),
+    "large-outputs": NotebookProfile(output_bytes=1_000_000),
+    "images": NotebookProfile(images=5),
+}
+
+
+def make_notebook(
+    index: int, profile: NotebookProfile = PROFILES["small"], executed: bool = True
+) -> nbf.NotebookNode:
+    """Generate a notebook, with outputs if executed."""
+    rand = random.Random(index)
+    nb = nbf.v4.new_notebook()
+    nb.metadata["kernelspec"] = {
+        "name": "python3",
+        "display_name": "Python 3",
+        "language": "python",
+    }
+    nb.cells.append(nbf.v4.new_markdown_cell(f"# Notebook {index}"))
+    for count in range(1, profile.cells + 1):
+        cell = nbf.v4.new_code_cell(f"x = {index}\nprint(x * {count})")
+        if executed:
+            cell.execution_count = count
+            cell.outputs.append(
+                nbf.v4.new_output(
+                    "stream", name="stdout", text="x" * profile.output_bytes
+                )
+            )
+            if count <= profile.images:
+                png = base64.b64encode(rand.randbytes(profile.image_bytes))
+                cell.outputs.append(
+                    nbf.v4.new_output(
+                        "display_data",
+                        data={
+                            "image/png": png.decode("ascii"),
+                            "text/plain": "<Figure size 640x480 with 1 Axes>",
+                        },
+                    )
+                )
+        nb.cells.append(cell)
+    return nb
+
+
+def populate_cache(
+    folder: Path,
+    notebooks: int,
+    profile: NotebookProfile = PROFILES["small"],
+    cached_fraction: float = 0.5,
+) -> JupyterCacheBase:
+    """Create a cache, with a project of notebooks written to ``folder``,
+    of which the first ``cached_fraction`` have executed versions cached.
+    """
+    cache = JupyterCacheBase(str(folder / "cache"))
+    # leave room for the notebooks cached by benchmarks
+    cache.change_cache_limit(2 * notebooks + 1000)
+    for index in range(notebooks):
+        path = folder / f"nb_{index}.ipynb"
+        nbf.write(make_notebook(index, profile, executed=False), str(path))
+        cache.add_nb_to_project(str(path))
+        if index < notebooks * cached_fraction:
+            cache.cache_notebook_bundle(
+                CacheBundleIn(make_notebook(index, profile), str(path)),
+                check_validity=False,
+            )
+    return cache
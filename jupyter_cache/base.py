@@ -8,7 +8,7 @@ from abc import ABC, abstractmethod
 from collections.abc import Iterable, Mapping
 import io
 from pathlib import Path
-from typing import Optional, Union
+from typing import BinaryIO, Optional, Union
 
 import attr
 from attr.validators import instance_of, optional
@@ -62,6 +62,16 @@ class ProjectNb:
         factory=list,
         metadata={"help": "File paths required to run the notebook"},
     )
+    hashkey: Optional[str] = attr.ib(
+        default=None,
+        validator=optional(instance_of(str)),
+        metadata={"help": "the hash of the notebook as read (if computed)"},
+    )
+    mtime_ns: Optional[int] = attr.ib(
+        default=None,
+        validator=optional(instance_of(int)),
+        metadata={"help": "the modification time of the file, before it was read"},
+    )
 
 
 class NbArtifactsAbstract(ABC):
@@ -129,6 +139,31 @@ class CacheBundleOut:
     )
 
 
+@attr.s(frozen=True, slots=True)
+class FsckResult:
+    """The inconsistencies found between the cache records and their files."""
+
+    orphan_folders: list[str] = attr.ib(
+        factory=list,
+        metadata={"help": "the hashkeys of executed folders, without a record"},
+    )
+    dangling_records: list[int] = attr.ib(
+        factory=list,
+        metadata={"help": "the IDs of records, without a notebook file"},
+    )
+    trash_folders: int = attr.ib(
+        default=0,
+        metadata={"help": "the number of removed folders, not yet deleted"},
+    )
+    reclaimable_bytes: int = attr.ib(
+        default=0, metadata={"help": "the size of the orphan and removed folders"}
+    )
+    dry_run: bool = attr.ib(
+        default=False,
+        metadata={"help": "whether the inconsistencies were only reported"},
+    )
+
+
 class JupyterCacheAbstract(ABC):
     """An abstract cache for storing pre/post executed notebooks.
 
@@ -149,6 +184,8 @@ class JupyterCacheAbstract(ABC):
         bundle: CacheBundleIn,
         check_validity: bool = True,
         overwrite: bool = False,
+        truncate: bool = True,
+        hashkey: Optional[str] = None,
     ) -> NbCacheRecord:
         """Commit an executed notebook, returning its cache record.
 
@@ -158,9 +195,40 @@ class JupyterCacheAbstract(ABC):
         :param check_validity: check that the notebook has been executed correctly,
             by asserting `execution_count`s are consecutive and start at 1.
         :param overwrite: Allow overwrite of cache with matching hash
+        :param truncate: Truncate the cache to its limit after the commit,
+            set to False when committing a batch, then call ``truncate_caches``
+        :param hashkey: The hash of the notebook source that was executed,
+            if already computed (e.g. ``ProjectNb.hashkey``), to avoid re-hashing
         :return: The primary key of the cache
         """
 
+    @abstractmethod
+    def truncate_caches(self) -> None:
+        """If the number of cached notebooks exceeds set limit, delete the oldest."""
+
+    @abstractmethod
+    def fsck(
+        self, dry_run: bool = False, workers: int = 8, min_age: float = 60
+    ) -> FsckResult:
+        """Reconcile the cache records with their files,
+        e.g. after a process crashed whilst committing or removing a notebook.
+
+        Folders without a record are deleted, records without files are removed,
+        and the folders of removed notebooks (not yet deleted) are deleted.
+
+        :param dry_run: Only report the inconsistencies
+        :param workers: The number of threads scanning folders
+        :param min_age: Skip records and folders newer than this (in seconds),
+            since they may be part of a commit in progress
+        """
+
+    @abstractmethod
+    def stats(self) -> dict[str, float]:
+        """Return metrics on the use of the cache, e.g. its hit ratio.
+
+        See ``jupyter_cache.metrics`` for their descriptions.
+        """
+
     @abstractmethod
     def cache_notebook_file(
         self,
@@ -186,6 +254,42 @@ class JupyterCacheAbstract(ABC):
         :return: The primary key of the cache
         """
 
+    @abstractmethod
+    def import_cache(
+        self, other: Union[str, Path, "JupyterCacheAbstract"], hardlink: bool = True
+    ) -> tuple[list[str], list[str]]:
+        """Merge the executed notebooks (and artifacts) of another cache into this one.
+
+        :param other: The other cache, or the path to its folder
+        :param hardlink: Hardlink files, rather than copying them,
+            where both caches are on the same file system
+        :return: The hashkeys imported, and the hashkeys skipped
+            (already in this cache, or missing from the other cache)
+        """
+
+    @abstractmethod
+    def export_archive(
+        self, fileobj: BinaryIO, project_only: bool = False
+    ) -> list[str]:
+        """Write a consistent snapshot of the cache, as a gzipped tar archive.
+
+        :param fileobj: The binary file to write to, which may be a stream
+        :param project_only: Only export the executed notebooks
+            that match the current notebooks of the project
+        :return: The hashkeys exported
+        """
+
+    @abstractmethod
+    def import_archive(self, fileobj: BinaryIO) -> tuple[list[str], list[str]]:
+        """Read a snapshot of a cache, written by ``export_archive``.
+
+        If this cache does not yet exist, it is restored from the snapshot.
+        Otherwise, the executed notebooks are merged into it, as for ``import_cache``.
+
+        :param fileobj: The binary file to read from, which may be a stream
+        :return: The hashkeys imported, and the hashkeys skipped
+        """
+
     @abstractmethod
     def list_cache_records(self) -> list[NbCacheRecord]:
         """Return a list of cached notebook records."""
@@ -210,9 +314,20 @@ class JupyterCacheAbstract(ABC):
         """
 
     @abstractmethod
-    def match_cache_notebook(self, nb: nbf.NotebookNode) -> NbCacheRecord:
+    def hash_project_notebook(self, project_nb: ProjectNb) -> str:
+        """Return the hashkey of a project notebook,
+        by which its execution is stored in the cache.
+        """
+
+    @abstractmethod
+    def match_cache_notebook(
+        self, nb: nbf.NotebookNode, hashkey: Optional[str] = None
+    ) -> NbCacheRecord:
         """Match to an executed notebook, returning its primary key.
 
+        :param hashkey: The hashkey to match, rather than the hash of the notebook,
+            e.g. from ``hash_project_notebook`` (which includes the assets
+            and environment of project notebooks, if enabled)
         :raises KeyError: if no match is found
         """
 
@@ -230,12 +345,15 @@ class JupyterCacheAbstract(ABC):
         nb: nbf.NotebookNode,
         nb_meta=("kernelspec", "language_info", "widgets"),
         cell_meta=None,
+        hashkey: Optional[str] = None,
     ) -> tuple[int, nbf.NotebookNode]:
         """Match to an executed notebook and return a merged version
 
         :param nb: The input notebook
         :param nb_meta: metadata keys to merge from the cache (all if None)
         :param cell_meta: cell metadata keys to merge from the cache (all if None)
+        :param hashkey: The hashkey to match, rather than the hash of the notebook
+            (see ``match_cache_notebook``)
         :raises KeyError: if no match is found
         :return: pk, input notebook with cached code cells and metadata merged.
         """
@@ -257,6 +375,32 @@ class JupyterCacheAbstract(ABC):
         nb = nbf.read(str(path), nbf.NO_CONVERT)
         return self.merge_match_into_notebook(nb, nb_meta, cell_meta)
 
+    def merge_match_into_project_nb(
+        self,
+        uri_or_pk: Union[int, str],
+        nb_meta=("kernelspec", "language_info", "widgets"),
+        cell_meta=None,
+    ) -> tuple[int, nbf.NotebookNode]:
+        """Match a project notebook to an executed notebook and return a merged version
+
+        The notebook is matched by its project hashkey (see ``hash_project_notebook``),
+        so includes its assets and environment, if enabled.
+
+        :param uri_or_pk: The URI or pk of the notebook in the project
+        :param nb_meta: metadata keys to merge from the cache (all if None)
+        :param cell_meta: cell metadata keys to merge from the cache (all if None)
+        :raises NbReadError: if the notebook cannot be read
+        :raises KeyError: if no match is found
+        :return: pk, input notebook with cached code cells and metadata merged.
+        """
+        project_nb = self.get_project_notebook(uri_or_pk)
+        return self.merge_match_into_notebook(
+            project_nb.nb,
+            nb_meta,
+            cell_meta,
+            hashkey=self.hash_project_notebook(project_nb),
+        )
+
     @abstractmethod
     def diff_nbnode_with_cache(
         self, pk: int, nb: nbf.NotebookNode, uri: str = "", as_str=False, **kwargs
@@ -283,12 +427,17 @@ class JupyterCacheAbstract(ABC):
         *,
         read_data: Mapping = DEFAULT_READ_DATA,
         assets: list[str] = (),
+        depends_on: list[str] = (),
+        outputs: list[str] = (),
     ) -> NbProjectRecord:
         """Add a single notebook to the project.
 
         :param uri: The path to the file
         :param read_data: Data to generate a function, to read the uri and return a NotebookNode
         :param assets: The path of files required by the notebook to run.
+        :param depends_on: The paths of project notebooks that must execute first
+        :param outputs: The paths of files written by the notebook,
+            notebooks with these files as assets must execute after it
         :raises ValueError: assets not within the same folder as the notebook URI.
         """
 
@@ -331,3 +480,17 @@ class JupyterCacheAbstract(ABC):
         filter_pks: Optional[list[int]] = None,
     ) -> list[NbProjectRecord]:
         """List notebooks in the project, whose hash is not present in the cache."""
+
+    @abstractmethod
+    def list_unexecuted_notebooks(
+        self,
+        filter_uris: Optional[list[str]] = None,
+        filter_pks: Optional[list[int]] = None,
+    ) -> list[ProjectNb]:
+        """List notebooks in the project, whose hash is not present in the cache.
+
+        The notebooks are returned as read, with their ``hashkey``,
+        so that they can be executed without reading them again.
+
+        :raises NbReadError: if a notebook cannot be read
+        """
@@ -2,9 +2,20 @@ from contextlib import contextmanager
 import datetime
 import os
 from pathlib import Path
+import time
 from typing import Any, Optional, Union
 
-from sqlalchemy import JSON, Column, DateTime, Integer, String, Text
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.engine import Engine, create_engine
 from sqlalchemy.exc import IntegrityError, OperationalError
 
@@ -29,12 +40,20 @@ DB_NAME = "global.db"
 #   - added read_data and exec_data fields to nbproject
 
 
-def create_db(path: Union[str, Path]) -> Engine:
+def create_db(path: Union[str, Path], read_only: bool = False) -> Engine:
     """Get or create a database at the given path.
 
     :param path: The path to the cache folder.
+    :param read_only: Open an existing database, without writing to it
+        (e.g. on a read-only mount)
+    :raises FileNotFoundError: if read_only and the database does not exist
     """
     exists = (Path(path) / DB_NAME).exists()
+    if read_only:
+        if not exists:
+            raise FileNotFoundError(f"Not a cache folder: {path}")
+        uri = Path(path).absolute().joinpath(DB_NAME).as_uri()
+        return create_engine(f"sqlite:///{uri}?mode=ro&uri=true")
     engine = create_engine(f"sqlite:///{os.path.join(path, DB_NAME)}")
     if not exists:
         # add all the tables, and a version identifier
@@ -119,6 +138,66 @@ class Setting(OrmBase):
         return {k: v for k, v in results}
 
 
+class AssetDigest(OrmBase):
+    """The content digest of an asset file, memoized by its size and mtime."""
+
+    __tablename__ = "assetdigest"
+
+    pk = Column(Integer(), primary_key=True)
+    path = Column(String(255), nullable=False, unique=True)
+    size = Column(Integer(), nullable=False)
+    mtime_ns = Column(Integer(), nullable=False)
+    digest = Column(String(64), nullable=False)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(path={self.path!r})"
+
+    @staticmethod
+    def create_table(db: Engine):
+        """Create the table, if it does not exist (e.g. in an older cache)."""
+        AssetDigest.__table__.create(db, checkfirst=True)
+
+    @staticmethod
+    def get_digests(paths: list[str], db: Engine) -> dict[str, tuple[int, int, str]]:
+        """Return the memoized ``(size, mtime_ns, digest)`` of each known path."""
+        with session_context(db) as session:  # type: Session
+            results = (
+                session.query(
+                    AssetDigest.path,
+                    AssetDigest.size,
+                    AssetDigest.mtime_ns,
+                    AssetDigest.digest,
+                )
+                .filter(AssetDigest.path.in_(paths))
+                .all()
+            )
+        return {
+            path: (size, mtime_ns, digest) for path, size, mtime_ns, digest in results
+        }
+
+    @staticmethod
+    def set_digests(digests: dict[str, tuple[int, int, str]], db: Engine):
+        """Memoize the ``(size, mtime_ns, digest)`` of paths."""
+        with session_context(db) as session:  # type: Session
+            records = {
+                record.path: record
+                for record in session.query(AssetDigest).filter(
+                    AssetDigest.path.in_(list(digests))
+                )
+            }
+            for path, (size, mtime_ns, digest) in digests.items():
+                record = records.get(path)
+                if record is None:
+                    record = AssetDigest(path=path)
+                    session.add(record)
+                record.size, record.mtime_ns, record.digest = size, mtime_ns, digest
+            try:
+                session.commit()
+            except IntegrityError:
+                # memoized concurrently by another process
+                session.rollback()
+
+
 class NbProjectRecord(OrmBase):
     """A record of a notebook within the project."""
 
@@ -207,10 +286,13 @@ class NbProjectRecord(OrmBase):
         raise_on_exists=True,
         *,
         assets=(),
+        exec_data: Optional[dict[str, Any]] = None,
     ) -> "NbProjectRecord":
         assets = NbProjectRecord.validate_assets(assets, uri)
         with session_context(db) as session:  # type: Session
-            record = NbProjectRecord(uri=uri, read_data=read_data, assets=assets)
+            record = NbProjectRecord(
+                uri=uri, read_data=read_data, assets=assets, exec_data=exec_data
+            )
             session.add(record)
             try:
                 session.commit()
@@ -333,6 +415,20 @@ class NbCacheRecord(OrmBase):
             session.expunge(record)
         return record
 
+    @staticmethod
+    def create_records(records: list[dict[str, Any]], db: Engine):
+        """Create many records in a single transaction.
+
+        :param records: The column values of each record
+        :raises ValueError: if any hashkey already exists (no records are created)
+        """
+        with session_context(db) as session:  # type: Session
+            session.add_all([NbCacheRecord(**kwargs) for kwargs in records])
+            try:
+                session.commit()
+            except IntegrityError:
+                raise ValueError("hashkey already exists")
+
     def remove_record(pk: int, db: Engine):
         with session_context(db) as session:  # type: Session
             record = session.get(NbCacheRecord, pk)
@@ -417,3 +513,217 @@ class NbCacheRecord(OrmBase):
                 .all()
             ]
         return pks_to_delete
+
+
+class NbLeaseRecord(OrmBase):
+    """A lease on the execution of a notebook, claimed by one of many executors.
+
+    Leases are grouped by a queue name, shared by all executors of the same run,
+    and keyed by the hash of the notebook to execute.
+    A lease is held until it expires, unless it is renewed (a heartbeat),
+    after which it can be claimed by another executor.
+    """
+
+    __tablename__ = "nblease"
+    __table_args__ = (UniqueConstraint("queue", "hashkey"),)
+
+    pk = Column(Integer(), primary_key=True)
+    queue = Column(String(255), nullable=False)
+    hashkey = Column(String(255), nullable=False)
+    uri = Column(String(255), nullable=False)
+    owner = Column(String(255), nullable=False)
+    """An identifier of the executor that holds the lease."""
+    expires = Column(Float(), nullable=False)
+    """The time (seconds since the epoch) at which the lease expires."""
+    done = Column(Boolean(), nullable=False, default=False)
+    """Whether the execution was completed (successfully or not)."""
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}"
+            f"(queue={self.queue!r}, hashkey={self.hashkey!r}, owner={self.owner!r})"
+        )
+
+    @staticmethod
+    def create_table(db: Engine):
+        """Create the table, if it does not exist (e.g. in an older cache)."""
+        NbLeaseRecord.__table__.create(db, checkfirst=True)
+
+    @staticmethod
+    def claim(
+        queue: str, hashkey: str, uri: str, owner: str, seconds: float, db: Engine
+    ) -> bool:
+        """Claim a lease, if it is not already held or done, returning success."""
+        expires = time.time() + seconds
+        with session_context(db) as session:  # type: Session
+            session.add(
+                NbLeaseRecord(
+                    queue=queue, hashkey=hashkey, uri=uri, owner=owner, expires=expires
+                )
+            )
+            try:
+                session.commit()
+                return True
+            except IntegrityError:
+                session.rollback()
+            # only one executor can take over an expired lease
+            updated = (
+                session.query(NbLeaseRecord)
+                .filter_by(queue=queue, hashkey=hashkey, done=False)
+                .filter(NbLeaseRecord.expires < time.time())
+                .update({"owner": owner, "expires": expires, "uri": uri})
+            )
+            session.commit()
+        return updated == 1
+
+    @staticmethod
+    def renew(queue: str, hashkey: str, owner: str, seconds: float, db: Engine) -> bool:
+        """Extend a held lease, returning False if it is no longer held."""
+        with session_context(db) as session:  # type: Session
+            updated = (
+                session.query(NbLeaseRecord)
+                .filter_by(queue=queue, hashkey=hashkey, owner=owner, done=False)
+                .update({"expires": time.time() + seconds})
+            )
+            session.commit()
+        return updated == 1
+
+    @staticmethod
+    def complete(queue: str, hashkey: str, owner: str, db: Engine) -> bool:
+        """Mark a held lease as done, returning False if it is no longer held."""
+        with session_context(db) as session:  # type: Session
+            updated = (
+                session.query(NbLeaseRecord)
+                .filter_by(queue=queue, hashkey=hashkey, owner=owner, done=False)
+                .update({"done": True})
+            )
+            session.commit()
+        return updated == 1
+
+    @staticmethod
+    def release(queue: str, hashkey: str, owner: str, db: Engine):
+        """Release a held lease, so that it can be claimed by another executor."""
+        with session_context(db) as session:  # type: Session
+            session.query(NbLeaseRecord).filter_by(
+                queue=queue, hashkey=hashkey, owner=owner, done=False
+            ).delete()
+            session.commit()
+
+    @staticmethod
+    def records_from_queue(queue: str, db: Engine) -> list["NbLeaseRecord"]:
+        with session_context(db) as session:  # type: Session
+            results = session.query(NbLeaseRecord).filter_by(queue=queue).all()
+            session.expunge_all()
+        return results
+
+    @staticmethod
+    def remove_queue(queue: str, db: Engine):
+        """Remove all leases of a queue."""
+        with session_context(db) as session:  # type: Session
+            session.query(NbLeaseRecord).filter_by(queue=queue).delete()
+            session.commit()
+
+
+class NbFailureRecord(OrmBase):
+    """The hashkey of the last failed execution of a project notebook.
+
+    Executors skip a notebook whose hashkey is unchanged since it failed,
+    unless failures are retried.
+    """
+
+    __tablename__ = "nbfailure"
+
+    pk = Column(Integer(), primary_key=True)
+    uri = Column(String(255), nullable=False, unique=True)
+    hashkey = Column(String(255), nullable=False)
+    traceback = Column(Text(), nullable=True)
+    created = Column(DateTime, nullable=False, default=datetime_utcnow())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(uri={self.uri!r}, hashkey={self.hashkey!r})"
+
+    @staticmethod
+    def create_table(db: Engine):
+        """Create the table, if it does not exist (e.g. in an older cache)."""
+        NbFailureRecord.__table__.create(db, checkfirst=True)
+
+    @staticmethod
+    def set_failure(uri: str, hashkey: str, traceback: Optional[str], db: Engine):
+        """Record the failure of a notebook, replacing any previous failure."""
+        with session_context(db) as session:  # type: Session
+            session.query(NbFailureRecord).filter_by(uri=uri).delete()
+            session.add(NbFailureRecord(uri=uri, hashkey=hashkey, traceback=traceback))
+            try:
+                session.commit()
+            except IntegrityError:
+                # recorded concurrently by another process
+                session.rollback()
+
+    @staticmethod
+    def remove_uris(uris: list[str], db: Engine):
+        with session_context(db) as session:  # type: Session
+            session.query(NbFailureRecord).filter(NbFailureRecord.uri.in_(uris)).delete(
+                synchronize_session=False
+            )
+            session.commit()
+
+    @staticmethod
+    def records_all(db: Engine) -> list["NbFailureRecord"]:
+        with session_context(db) as session:  # type: Session
+            results = session.query(NbFailureRecord).all()
+            session.expunge_all()
+        return results
+
+
+class CacheMetric(OrmBase):
+    """A counter of the use of the cache (see ``jupyter_cache.metrics``)."""
+
+    __tablename__ = "cachemetric"
+
+    pk = Column(Integer(), primary_key=True)
+    name = Column(String(255), nullable=False, unique=True)
+    value = Column(Float(), nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name}={self.value})"
+
+    @staticmethod
+    def create_table(db: Engine):
+        """Create the table, if it does not exist (e.g. in an older cache)."""
+        CacheMetric.__table__.create(db, checkfirst=True)
+
+    @staticmethod
+    def increment(values: dict[str, float], db: Engine):
+        """Add to the value of each counter, in a single transaction."""
+        with session_context(db) as session:  # type: Session
+            for name, value in values.items():
+                updated = (
+                    session.query(CacheMetric)
+                    .filter_by(name=name)
+                    .update(
+                        {CacheMetric.value: CacheMetric.value + value},
+                        synchronize_session=False,
+                    )
+                )
+                if not updated:
+                    session.add(CacheMetric(name=name, value=value))
+            try:
+                session.commit()
+                return
+            except IntegrityError:
+                # a counter was created concurrently by another process
+                session.rollback()
+        CacheMetric.increment(values, db)
+
+    @staticmethod
+    def get_values(db: Engine) -> dict[str, float]:
+        with session_context(db) as session:  # type: Session
+            results = session.query(CacheMetric.name, CacheMetric.value).all()
+        return {name: value for name, value in results}
+
+    @staticmethod
+    def reset(db: Engine):
+        """Remove all counters."""
+        with session_context(db) as session:  # type: Session
+            session.query(CacheMetric).delete()
+            session.commit()
@@ -0,0 +1,130 @@
+"""Fingerprints of the environment notebooks are executed in.
+
+A fingerprint can be folded into the hashkey of project notebooks,
+so that notebooks are re-executed after their kernel's environment changes,
+whilst records of the previous environment are evicted as they age.
+"""
+
+import functools
+import json
+import re
+import subprocess
+import sys
+from typing import Optional
+
+import attr
+
+# print the python version and installed distributions, in a kernel's interpreter
+_FREEZE_SCRIPT = """\
+import sys
+from importlib import metadata
+print("python==%s.%s" % sys.version_info[:2])
+for dist in metadata.distributions():
+    print("%s==%s" % (dist.metadata["Name"], dist.version))
+"""
+
+
+@attr.s(frozen=True, slots=True)
+class EnvironmentOptions:
+    """Options for the environment fingerprint."""
+
+    lockfiles: tuple[str, ...] = attr.ib(
+        default=(),
+        converter=tuple,
+        metadata={
+            "help": "Paths of lockfiles to hash, "
+            "rather than the packages installed in the kernel's environment"
+        },
+    )
+    packages: tuple[str, ...] = attr.ib(
+        default=(),
+        converter=tuple,
+        metadata={"help": "Installed packages to hash (all if empty)"},
+    )
+
+    def as_json(self) -> dict:
+        return {"lockfiles": list(self.lockfiles), "packages": list(self.packages)}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "EnvironmentOptions":
+        return cls(data.get("lockfiles", ()), data.get("packages", ()))
+
+
+def normalize_package_name(name: str) -> str:
+    """Normalize a distribution name, as in PEP 503."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+@functools.lru_cache(maxsize=None)
+def kernel_environment(kernel_name: str) -> tuple[str, tuple[str, ...]]:
+    """Return the language of a kernel, and the packages installed for it.
+
+    Packages are ``name==version`` lines (including the python version),
+    read by running the interpreter of python kernels.
+    The result is memoized per process, since this takes a subprocess call.
+
+    :raises RuntimeError: if the kernel's environment cannot be read
+    """
+    from jupyter_client.kernelspec import NATIVE_KERNEL_NAME, KernelSpecManager
+
+    try:
+        spec = KernelSpecManager().get_kernel_spec(kernel_name or NATIVE_KERNEL_NAME)
+    except Exception as exc:
+        raise RuntimeError(f"Kernel not found: {kernel_name!r}") from exc
+    if spec.language.lower() != "python" or not spec.argv:
+        return spec.language, ()
+    executable = spec.argv[0]
+    # as resolved by jupyter_client, when starting the kernel
+    if executable in {
+        "python",
+        "python%i" % sys.version_info[0],
+        "python%i.%i" % sys.version_info[:2],
+    }:
+        executable = sys.executable
+    try:
+        output = subprocess.run(
+            [executable, "-c", _FREEZE_SCRIPT],
+            capture_output=True,
+            check=True,
+            text=True,
+            timeout=60,
+        ).stdout
+    except (OSError, subprocess.SubprocessError) as exc:
+        raise RuntimeError(
+            f"Failed to read the environment of kernel {kernel_name!r}: {exc}"
+        ) from exc
+    return spec.language, tuple(sorted(set(output.splitlines())))
+
+
+def environment_fingerprint(
+    kernel_name: str,
+    options: EnvironmentOptions,
+    lockfile_digests: Optional[dict[str, str]] = None,
+) -> str:
+    """Return a string identifying the environment of a kernel.
+
+    :param lockfile_digests: The digest of each of ``options.lockfiles``
+    """
+    if options.lockfiles:
+        return json.dumps(
+            {
+                "kernel": kernel_name,
+                "lockfiles": sorted((lockfile_digests or {}).values()),
+            }
+        )
+    try:
+        language, packages = kernel_environment(kernel_name)
+    except RuntimeError:
+        # the notebook will fail to execute, rather than be hashed
+        language, packages = "", ()
+    if options.packages:
+        selected = {normalize_package_name(name) for name in options.packages}
+        selected.add("python")
+        packages = tuple(
+            line
+            for line in packages
+            if normalize_package_name(line.split("==")[0]) in selected
+        )
+    return json.dumps(
+        {"kernel": kernel_name, "language": language, "packages": list(packages)}
+    )
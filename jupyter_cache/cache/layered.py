@@ -0,0 +1,89 @@
+"""A cache that falls back to read-only upstream caches.
+
+For example, a team-wide cache of executed notebooks on a read-only mount,
+under the local cache of each developer.
+Lookups check the local cache first, then each upstream cache in turn,
+and notebooks matched in an upstream cache are promoted into the local cache
+(hardlinking their files, where on the same file system),
+so that records, primary keys and eviction only ever refer to the local cache.
+All writes go to the local cache.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+from .db import NbCacheRecord
+from .main import JupyterCacheBase
+
+# upstream cache folders, separated by ``os.pathsep``
+UPSTREAM_ENV = "JUPYTERCACHE_UPSTREAM"
+
+
+class LayeredCache(JupyterCacheBase):
+    """A local cache, that falls back to read-only upstream caches."""
+
+    def __init__(
+        self,
+        path,
+        upstreams: Optional[Sequence[Union[str, Path]]] = None,
+        hardlink: bool = True,
+    ):
+        """Initiate the cache.
+
+        :param path: The path to the local cache folder
+        :param upstreams: The paths to the upstream cache folders, in the order checked
+            (defaults to the ``JUPYTERCACHE_UPSTREAM`` environment variable)
+        :param hardlink: Hardlink the files of promoted notebooks, rather than
+            copying them, where both caches are on the same file system
+        """
+        super().__init__(path)
+        if upstreams is None:
+            upstreams = os.environ.get(UPSTREAM_ENV, "").split(os.pathsep)
+        self._upstreams = [
+            JupyterCacheBase(upstream, read_only=True)
+            for upstream in upstreams
+            if upstream
+        ]
+        self._hardlink = hardlink
+
+    @property
+    def upstreams(self) -> list[JupyterCacheBase]:
+        """The read-only upstream caches, in the order checked."""
+        return list(self._upstreams)
+
+    def _record_from_hashkey(self, hashkey: str) -> NbCacheRecord:
+        try:
+            return super()._record_from_hashkey(hashkey)
+        except KeyError:
+            pass
+        for upstream in self._upstreams:
+            try:
+                record = NbCacheRecord.record_from_hashkey(hashkey, upstream.db)
+            except (FileNotFoundError, KeyError):
+                # not in this cache, or the cache is not available (e.g. not mounted)
+                continue
+            if self._promote(upstream, record):
+                return super()._record_from_hashkey(hashkey)
+        raise KeyError(f"Cache record not found for NB with hashkey: {hashkey}")
+
+    def _promote(self, upstream: JupyterCacheBase, record: NbCacheRecord) -> bool:
+        """Copy an executed notebook from an upstream cache into the local cache.
+
+        :return: False if its files are missing from the upstream cache
+        """
+        try:
+            # the local lookup has already missed
+            imported, _ = self._import_records(
+                upstream, [record], self._hardlink, existing=set()
+            )
+        except ValueError:
+            # promoted concurrently, by another process
+            return True
+        if not imported:
+            return False
+        # promoted notebooks are the most recently used, so are not evicted first
+        NbCacheRecord.touch_hashkey(record.hashkey, self.db)
+        self._record_metrics(upstream_hits=1)
+        self.truncate_caches()
+        return True
@@ -1,12 +1,23 @@
+import atexit
 from collections.abc import Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 import copy
+import datetime
 import hashlib
 import io
-from pathlib import Path
+import multiprocessing.util
+import os
+from pathlib import Path, PurePosixPath
 import shutil
-from typing import Optional, Union
-
+import sqlite3
+import tarfile
+import tempfile
+import time
+from typing import BinaryIO, Optional, Union
+import weakref
+
+import attr
 import nbformat as nbf
 
 from jupyter_cache.base import (  # noqa: F401
@@ -14,19 +25,53 @@ from jupyter_cache.base import (  # noqa: F401
     CacheBundleIn,
     CacheBundleOut,
     CachingError,
+    FsckResult,
     JupyterCacheAbstract,
     NbArtifactsAbstract,
     NbValidityError,
     ProjectNb,
     RetrievalError,
 )
+from jupyter_cache.metrics import derive_stats
 from jupyter_cache.readers import DEFAULT_READ_DATA, NbReadError, get_reader
-from jupyter_cache.utils import to_relative_paths
-
-from .db import NbCacheRecord, NbProjectRecord, Setting, create_db, get_version
+from jupyter_cache.tracing import span
+from jupyter_cache.utils import file_digest, folder_size, to_relative_paths
+
+from .db import (
+    DB_NAME,
+    AssetDigest,
+    CacheMetric,
+    NbCacheRecord,
+    NbProjectRecord,
+    Setting,
+    create_db,
+    get_version,
+)
+from .environment import EnvironmentOptions, environment_fingerprint
+from .trash import (
+    TRASH_FOLDER,
+    delete_in_background,
+    move_to_trash,
+    purge_trash,
+    trash_size,
+)
 
 CACHE_LIMIT_KEY = "cache_limit"
 DEFAULT_CACHE_LIMIT = 1000
+HASH_ASSETS_KEY = "hash_assets"
+ENV_FINGERPRINT_KEY = "env_fingerprint"
+SHARD_DEPTH_KEY = "shard_depth"
+MAX_SHARD_DEPTH = 4
+# the maximum time that metrics of lookups are buffered, before writing them
+METRICS_FLUSH_SECONDS = 5.0
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    """Hardlink a file, falling back to a copy (e.g. across file systems)."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
 
 
 class NbArtifacts(NbArtifactsAbstract):
@@ -56,10 +101,85 @@ class NbArtifacts(NbArtifactsAbstract):
                 yield path.relative_to(self.in_folder), handle
 
 
+class NbArtifactsInMemory(NbArtifactsAbstract):
+    """Container for artefacts of a notebook execution, read into memory.
+
+    This allows artefacts to outlive the folder they were created in
+    (e.g. a temporary execution folder), and to be pickled between processes.
+    """
+
+    def __init__(self, files: Mapping[Union[str, Path], bytes]):
+        """Initiate NbArtifactsInMemory
+
+        :param files: mapping of relative path to file content
+        """
+        self.files = {Path(path): content for path, content in files.items()}
+
+    @property
+    def relative_paths(self) -> list[Path]:
+        """Return the list of paths (relative to the notebook folder)."""
+        return list(self.files)
+
+    def __iter__(self) -> Iterable[tuple[Path, io.BytesIO]]:
+        """Yield the relative path and open files (in bytes mode)"""
+        for path, content in self.files.items():
+            yield path, io.BytesIO(content)
+
+
+# caches with buffered metrics, which are written to the database on exit
+_UNFLUSHED_METRICS: "weakref.WeakSet[JupyterCacheBase]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_metrics_on_exit():
+    for cache in list(_UNFLUSHED_METRICS):
+        # do not re-create a cache that has been removed
+        if cache._path.joinpath(DB_NAME).exists():
+            try:
+                cache.flush_metrics()
+            except Exception:
+                pass
+
+
+def _register_exit_finalizer(_=None):
+    # processes started by multiprocessing do not run atexit handlers,
+    # and forked processes discard the finalizers of their parent
+    multiprocessing.util.Finalize(None, _flush_metrics_on_exit, exitpriority=0)
+
+
+_register_exit_finalizer()
+multiprocessing.util.register_after_fork(_UNFLUSHED_METRICS, _register_exit_finalizer)
+
+
+def _discard_unflushed_metrics():
+    # the metrics buffered before a fork are written by the parent process
+    for cache in list(_UNFLUSHED_METRICS):
+        cache._metrics = {}
+    _UNFLUSHED_METRICS.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_discard_unflushed_metrics)
+
+
 class JupyterCacheBase(JupyterCacheAbstract):
-    def __init__(self, path):
+    def __init__(self, path, read_only: bool = False):
+        """Initiate the cache.
+
+        :param path: The path to the cache folder
+        :param read_only: Only read an existing cache (e.g. on a read-only mount),
+            so that writing to it raises an error
+        """
         self._path = Path(path).absolute()
+        self._read_only = read_only
         self._db = None
+        # metrics not yet written to the database
+        self._metrics: dict[str, float] = {}
+        self._metrics_flushed = time.monotonic()
+        # whether the table of metrics is known to exist (e.g. in an older cache)
+        self._metrics_table = False
+        # memoized, since it is read for every path in the cache
+        self._shard_depth: Optional[int] = None
 
     @property
     def path(self):
@@ -71,7 +191,10 @@ class JupyterCacheBase(JupyterCacheAbstract):
     def db(self):
         """a simple database for storing persistent global data."""
         if self._db is None:
-            self._db = create_db(self.path)
+            if self._read_only:
+                self._db = create_db(self._path, read_only=True)
+            else:
+                self._db = create_db(self.path)
         return self._db
 
     def __repr__(self):
@@ -81,26 +204,148 @@ class JupyterCacheBase(JupyterCacheAbstract):
         """For pickling instances, db must be removed."""
         state = self.__dict__.copy()
         state["_db"] = None
+        # buffered metrics are written by this instance
+        state["_metrics"] = {}
         return state
 
     def get_version(self) -> Optional[str]:
         return get_version(self.path)
 
     def clear_cache(self):
-        """Clear the cache completely."""
-        shutil.rmtree(self.path)
+        """Clear the cache completely.
+
+        The cache folder is renamed, then deleted in the background
+        (or by the next purge of the trash, if the process exits first).
+        """
+        delete_in_background(self.path)
         self._db = None
+        self._metrics = {}
+        self._metrics_table = False
+        self._shard_depth = None
+
+    def _move_to_trash(self, folder: Path) -> None:
+        """Delete a folder of the cache in the background."""
+        move_to_trash(folder, self.path / TRASH_FOLDER)
+
+    def get_shard_depth(self) -> int:
+        """Return the number of sub-folder levels, that cached notebooks are stored in.
+
+        For example, with a depth of 2 a notebook is stored in
+        ``executed/ab/cd/abcd...``, rather than ``executed/abcd...``.
+        """
+        if self._shard_depth is None:
+            self._shard_depth = Setting.get_value(SHARD_DEPTH_KEY, self.db, 0)
+        return self._shard_depth
+
+    def change_shard_depth(self, depth: int, workers: int = 8) -> int:
+        """Set the number of sub-folder levels, that cached notebooks are stored in,
+        and move the cached notebooks into this layout, returning the number moved.
+
+        Whilst notebooks are moved, they are read from either layout,
+        and moving can be resumed (e.g. if interrupted) by calling this again.
+
+        :param workers: The number of threads scanning folders
+        """
+        if not 0 <= depth <= MAX_SHARD_DEPTH:
+            raise ValueError(f"Shard depth must be from 0 to {MAX_SHARD_DEPTH}")
+        # new notebooks are written in the new layout, during the move
+        Setting.set_value(SHARD_DEPTH_KEY, depth, self.db)
+        self._shard_depth = depth
+        with ThreadPoolExecutor(max(workers, 1)) as pool:
+            folders = self._list_executed_folders(pool)
+        moved = 0
+        for hashkey, folder in folders:
+            target = self._get_executed_folder(hashkey, depth)
+            if folder == target:
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.exists():
+                # written in the new layout since the listing, so this is stale
+                self._move_to_trash(folder)
+                continue
+            try:
+                folder.rename(target)
+            except FileNotFoundError:
+                # removed since the listing
+                continue
+            moved += 1
+        self._prune_shard_folders()
+        return moved
+
+    def _get_executed_folder(self, hashkey: str, depth: Optional[int] = None) -> Path:
+        """Return the folder of a cached notebook, in the layout of a shard depth
+        (by default the current one).
+        """
+        depth = self.get_shard_depth() if depth is None else depth
+        shards = [hashkey[2 * level : 2 * level + 2] for level in range(depth)]
+        return self.path.joinpath("executed", *shards, hashkey)
+
+    def _find_executed_folder(self, hashkey: str) -> Path:
+        """Return the folder of a cached notebook, in the current layout,
+        unless only found in another (i.e. not yet moved by ``change_shard_depth``).
+        """
+        folder = self._get_executed_folder(hashkey)
+        if folder.exists():
+            return folder
+        for depth in range(MAX_SHARD_DEPTH + 1):
+            other = self._get_executed_folder(hashkey, depth)
+            if other != folder and other.exists():
+                return other
+        return folder
+
+    def _list_executed_folders(
+        self, pool: ThreadPoolExecutor
+    ) -> list[tuple[str, Path]]:
+        """Return the hashkey and path of every notebook folder, in any layout,
+        scanning the sub-folders of each level in parallel.
+        """
+
+        def _scan(folder: Path) -> tuple[list[tuple[str, Path]], list[Path]]:
+            found, shards = [], []
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                return found, shards
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                # shard folders are named by 2 characters of the hashkey
+                if len(entry.name) == 2:
+                    shards.append(Path(entry.path))
+                else:
+                    found.append((entry.name, Path(entry.path)))
+            return found, shards
+
+        folders, level = [], [self.path / "executed"]
+        while level:
+            next_level = []
+            for found, shards in pool.map(_scan, level):
+                folders.extend(found)
+                next_level.extend(shards)
+            level = next_level
+        return folders
+
+    def _prune_shard_folders(self) -> None:
+        """Remove empty shard folders."""
+        executed = self.path / "executed"
+        for root, _, _ in os.walk(executed, topdown=False):
+            if Path(root) != executed and len(Path(root).name) == 2:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    # not empty
+                    pass
 
     def _get_notebook_path_cache(self, hashkey, raise_on_missing=False) -> Path:
         """Retrieve a relative path in the cache to a notebook, from its hash."""
-        path = self.path.joinpath(Path("executed", hashkey, "base.ipynb"))
+        path = self._find_executed_folder(hashkey) / "base.ipynb"
         if not path.exists() and raise_on_missing:
             raise RetrievalError(f"hashkey not in cache: {hashkey}")
         return path
 
     def _get_artifact_path_cache(self, hashkey) -> Path:
         """Retrieve a relative path in the cache to a notebook, from its hash."""
-        path = self.path.joinpath(Path("executed", hashkey, "artifacts"))
+        path = self._find_executed_folder(hashkey) / "artifacts"
         return path
 
     def truncate_caches(self):
@@ -109,8 +354,134 @@ class JupyterCacheBase(JupyterCacheAbstract):
         # TODO you could have better control over this by e.g. tagging certain caches
         # that should not be deleted.
         pks = NbCacheRecord.records_to_delete(cache_limit, self.db)
-        for pk in pks:
-            self.remove_cache(pk)
+        if pks:
+            evicted = 0
+            with span("evict", count=len(pks)):
+                for pk in pks:
+                    try:
+                        self.remove_cache(pk)
+                    except KeyError:
+                        # removed concurrently, or the files are missing,
+                        # which may be a commit in progress (see ``fsck``)
+                        continue
+                    evicted += 1
+            self._record_metrics(evictions=evicted)
+
+    def fsck(
+        self, dry_run: bool = False, workers: int = 8, min_age: float = 60
+    ) -> FsckResult:
+        cutoff = time.time() - min_age
+        created_cutoff = datetime.datetime.now(datetime.timezone.utc).replace(
+            tzinfo=None
+        ) - datetime.timedelta(seconds=min_age)
+
+        def _scan(name: str) -> tuple[bool, float, int]:
+            """Return if a folder has its notebook, its modified time and size."""
+            folder = folders[name]
+            try:
+                mtime = folder.stat().st_mtime
+            except FileNotFoundError:
+                # removed since it was listed
+                return True, time.time(), 0
+            if folder.joinpath("base.ipynb").exists() and name in hashkeys:
+                return True, mtime, 0
+            return False, mtime, folder_size(folder)
+
+        with ThreadPoolExecutor(max(workers, 1)) as pool:
+            # list folders before records, since records are created before folders
+            folders = dict(self._list_executed_folders(pool))
+            records = self.list_cache_records()
+            hashkeys = {record.hashkey for record in records}
+            scanned = dict(zip(folders, pool.map(_scan, folders)))
+
+        orphans = sorted(
+            name
+            for name, (_, mtime, _) in scanned.items()
+            if name not in hashkeys and mtime < cutoff
+        )
+        dangling = [
+            record
+            for record in records
+            if not scanned.get(record.hashkey, (False,))[0]
+            and record.created.replace(tzinfo=None) < created_cutoff
+        ]
+        # the folders of records without a notebook file are partial commits
+        remove = orphans + [r.hashkey for r in dangling if r.hashkey in scanned]
+        trash = self.path / TRASH_FOLDER
+        trash_folders, trash_bytes = trash_size(trash)
+        result = FsckResult(
+            orphan_folders=orphans,
+            dangling_records=[record.pk for record in dangling],
+            trash_folders=trash_folders,
+            reclaimable_bytes=sum(scanned[name][2] for name in remove) + trash_bytes,
+            dry_run=dry_run,
+        )
+        if not dry_run:
+            if dangling:
+                NbCacheRecord.remove_records(result.dangling_records, self.db)
+            for name in remove:
+                shutil.rmtree(folders[name], ignore_errors=True)
+            purge_trash(trash)
+            self._prune_shard_folders()
+        return result
+
+    def _record_metrics(self, flush: bool = False, **values: float) -> None:
+        """Add to the metrics of the cache (see ``jupyter_cache.metrics``).
+
+        Metrics are buffered, so that counting them does not add database writes
+        (and lock contention) to lookups and commits,
+        and written with the next flush, at most ``METRICS_FLUSH_SECONDS`` later
+        (or on exit).
+        """
+        for name, value in values.items():
+            self._metrics[name] = self._metrics.get(name, 0.0) + value
+        if flush or time.monotonic() - self._metrics_flushed > METRICS_FLUSH_SECONDS:
+            self.flush_metrics()
+        else:
+            _UNFLUSHED_METRICS.add(self)
+
+    def _record_lookup(self, hit: bool, start: float) -> None:
+        """Add to the metrics of lookups.
+
+        :param start: The time the lookup started, from ``time.perf_counter``
+        """
+        self._record_metrics(
+            lookup_seconds=time.perf_counter() - start,
+            **{"lookup_hits" if hit else "lookup_misses": 1},
+        )
+
+    def flush_metrics(self) -> None:
+        """Write any buffered metrics to the database."""
+        metrics, self._metrics = self._metrics, {}
+        self._metrics_flushed = time.monotonic()
+        _UNFLUSHED_METRICS.discard(self)
+        if metrics:
+            self._create_metrics_table()
+            CacheMetric.increment(metrics, self.db)
+
+    def _create_metrics_table(self) -> None:
+        """Create the table of metrics, if not already checked by this instance."""
+        if not self._metrics_table:
+            CacheMetric.create_table(self.db)
+            self._metrics_table = True
+
+    def stats(self) -> dict[str, float]:
+        """Return metrics on the use of the cache, e.g. its hit ratio.
+
+        See ``jupyter_cache.metrics`` for their descriptions.
+        """
+        self.flush_metrics()
+        self._create_metrics_table()
+        stats = derive_stats(CacheMetric.get_values(self.db))
+        stats["records"] = float(len(self.list_cache_records()))
+        stats["cache_limit"] = float(self.get_cache_limit())
+        return stats
+
+    def reset_stats(self) -> None:
+        """Reset the metrics of the cache to zero."""
+        self._metrics = {}
+        self._create_metrics_table()
+        CacheMetric.reset(self.db)
 
     def get_cache_limit(self):
         return Setting.get_value(CACHE_LIMIT_KEY, self.db, DEFAULT_CACHE_LIMIT)
@@ -119,6 +490,91 @@ class JupyterCacheBase(JupyterCacheAbstract):
         assert isinstance(size, int) and size > 0
         Setting.set_value(CACHE_LIMIT_KEY, size, self.db)
 
+    def get_hash_assets(self) -> bool:
+        return Setting.get_value(HASH_ASSETS_KEY, self.db, False)
+
+    def change_hash_assets(self, value: bool):
+        Setting.set_value(HASH_ASSETS_KEY, bool(value), self.db)
+
+    def get_env_fingerprint(self) -> Optional[EnvironmentOptions]:
+        data = Setting.get_value(ENV_FINGERPRINT_KEY, self.db, {})
+        return EnvironmentOptions.from_json(data) if data else None
+
+    def change_env_fingerprint(self, options: Optional[EnvironmentOptions]):
+        """Set the options for the environment fingerprint (None to disable)."""
+        Setting.set_value(
+            ENV_FINGERPRINT_KEY,
+            options.as_json() if options is not None else None,
+            self.db,
+        )
+
+    def hash_project_notebook(self, project_nb: ProjectNb) -> str:
+        """Return the hashkey of a project notebook.
+
+        If enabled by ``change_hash_assets``,
+        the content of the notebook's assets is included in the hashkey,
+        so that the notebook is re-executed when they change.
+        If enabled by ``change_env_fingerprint``,
+        a fingerprint of the notebook's kernel environment is included,
+        so that the notebook is re-executed when the environment changes.
+        """
+        with span("hash", uri=project_nb.uri):
+            hashkey = self.create_hashed_notebook(project_nb.nb)[1]
+            lines = []
+            if project_nb.assets and self.get_hash_assets():
+                folder = Path(project_nb.uri).parent
+                digests = self._asset_digests(project_nb.assets)
+                lines.extend(
+                    f"{Path(path).relative_to(folder).as_posix()}:{digests[path]}"
+                    for path in sorted(digests)
+                )
+            env_options = self.get_env_fingerprint()
+            if env_options is not None:
+                kernel_name = project_nb.nb.metadata.get("kernelspec", {}).get(
+                    "name", ""
+                )
+                fingerprint = environment_fingerprint(
+                    kernel_name, env_options, self._asset_digests(env_options.lockfiles)
+                )
+                lines.append(f"environment:{fingerprint}")
+            if not lines:
+                return hashkey
+            return hashlib.md5("\n".join([hashkey] + lines).encode()).hexdigest()
+
+    def _asset_digests(self, assets: Iterable[Union[str, Path]]) -> dict[str, str]:
+        """Return the digest of each asset file (including the files of folders).
+
+        Digests are memoized in the database by the file's size and mtime,
+        so that unchanged files are not read again.
+        """
+        stats = {}
+        for asset in assets:
+            asset = Path(asset).absolute()
+            paths = sorted(asset.glob("**/*")) if asset.is_dir() else [asset]
+            for path in paths:
+                try:
+                    stat = path.stat()
+                except OSError:
+                    # missing assets still change the hashkey
+                    stats[str(path)] = None
+                else:
+                    if not path.is_dir():
+                        stats[str(path)] = (stat.st_size, stat.st_mtime_ns)
+        AssetDigest.create_table(self.db)
+        memoized = AssetDigest.get_digests(list(stats), self.db)
+        digests, updated = {}, {}
+        for path, stat in stats.items():
+            if stat is None:
+                digests[path] = "missing"
+            elif memoized.get(path, (None, None))[:2] == stat:
+                digests[path] = memoized[path][2]
+            else:
+                digests[path] = file_digest(path)
+                updated[path] = (*stat, digests[path])
+        if updated:
+            AssetDigest.set_digests(updated, self.db)
+        return digests
+
     def create_hashed_notebook(
         self,
         nb: nbf.NotebookNode,
@@ -177,6 +633,19 @@ class JupyterCacheBase(JupyterCacheAbstract):
 
         return (nb, hash_string)
 
+    @staticmethod
+    def _strip_notebook(nb: nbf.NotebookNode) -> nbf.NotebookNode:
+        """Convert a notebook to the format stored in the cache,
+        as for ``create_hashed_notebook``, but without copying cell contents.
+        """
+        if nb.nbformat != NB_VERSION:
+            nb = nbf.convert(copy.deepcopy(nb), to_version=NB_VERSION)
+        if nb.nbformat_minor > 5:
+            raise CachingError("notebook version greater than 4.5 not yet supported")
+        return nbf.NotebookNode(
+            {**nb, "cells": [cell for cell in nb.cells if cell.cell_type == "code"]}
+        )
+
     def _validate_nb_bundle(self, nb_bundle: CacheBundleIn):
         """Validate that a notebook bundle should be cached.
 
@@ -204,50 +673,63 @@ class JupyterCacheBase(JupyterCacheAbstract):
         check_validity: bool = True,
         overwrite: bool = False,
         description="",
+        truncate: bool = True,
+        hashkey: Optional[str] = None,
     ) -> NbCacheRecord:
         """Cache an executed notebook."""
         # TODO it would be ideal to have some 'rollback' mechanism on exception
 
-        if check_validity:
-            self._validate_nb_bundle(bundle)
+        with span("cache write", uri=bundle.uri):
+            if check_validity:
+                self._validate_nb_bundle(bundle)
 
-        hashed_nb, hashkey = self.create_hashed_notebook(bundle.nb)
+            if hashkey is None:
+                hashed_nb, hashkey = self.create_hashed_notebook(bundle.nb)
+            else:
+                hashed_nb = self._strip_notebook(bundle.nb)
 
-        path = self._get_notebook_path_cache(hashkey)
-        if path.exists():
-            if not overwrite:
-                raise CachingError(
-                    "Notebook already exists in cache and overwrite=False."
-                )
-            shutil.rmtree(path.parent)
+            path = self._get_notebook_path_cache(hashkey)
+            if path.exists():
+                if not overwrite:
+                    raise CachingError(
+                        "Notebook already exists in cache and overwrite=False."
+                    )
+                self._move_to_trash(path.parent)
+                # write in the current layout, if found in another
+                path = self._get_notebook_path_cache(hashkey)
 
-        try:
-            record = NbCacheRecord.record_from_hashkey(hashkey, self.db)
-        except KeyError:
-            pass
-        else:
-            NbCacheRecord.remove_record(record.pk, self.db)
-
-        record = NbCacheRecord.create_record(
-            uri=bundle.uri,
-            hashkey=hashkey,
-            db=self.db,
-            data=bundle.data,
-            description=description,
-        )
-        path.parent.mkdir(parents=True)
-        path.write_text(nbf.writes(hashed_nb, nbf.NO_CONVERT), encoding="utf8")
-
-        # write artifacts
-        artifact_folder = self._get_artifact_path_cache(hashkey)
-        if artifact_folder.exists():
-            shutil.rmtree(artifact_folder)
-        for rel_path, handle in bundle.artifacts or []:
-            write_path = artifact_folder.joinpath(rel_path)
-            write_path.parent.mkdir(parents=True, exist_ok=True)
-            write_path.write_bytes(handle.read())
+            try:
+                record = NbCacheRecord.record_from_hashkey(hashkey, self.db)
+            except KeyError:
+                pass
+            else:
+                NbCacheRecord.remove_record(record.pk, self.db)
+
+            record = NbCacheRecord.create_record(
+                uri=bundle.uri,
+                hashkey=hashkey,
+                db=self.db,
+                data=bundle.data,
+                description=description,
+            )
+            path.parent.mkdir(parents=True)
+            content = nbf.writes(hashed_nb, nbf.NO_CONVERT).encode("utf8")
+            path.write_bytes(content)
+            written = len(content)
 
-        self.truncate_caches()
+            # write artifacts
+            artifact_folder = self._get_artifact_path_cache(hashkey)
+            if artifact_folder.exists():
+                shutil.rmtree(artifact_folder)
+            for rel_path, handle in bundle.artifacts or []:
+                write_path = artifact_folder.joinpath(rel_path)
+                write_path.parent.mkdir(parents=True, exist_ok=True)
+                written += write_path.write_bytes(handle.read())
+
+        self._record_metrics(cached_notebooks=1, cached_bytes=written)
+
+        if truncate:
+            self.truncate_caches()
 
         return record
 
@@ -286,6 +768,204 @@ class JupyterCacheBase(JupyterCacheAbstract):
             overwrite=overwrite,
         )
 
+    def import_cache(
+        self, other: Union[str, Path, "JupyterCacheBase"], hardlink: bool = True
+    ) -> tuple[list[str], list[str]]:
+        """Merge the executed notebooks (and artifacts) of another cache into this one.
+
+        Records keep their URI, data and creation/access times.
+        Hardlinked files are shared by both caches, which is safe since cached files
+        are only ever replaced (never modified in-place).
+
+        :param other: The other cache, or the path to its folder
+        :param hardlink: Hardlink files, rather than copying them,
+            where both caches are on the same file system
+        :return: The hashkeys imported, and the hashkeys skipped
+            (already in this cache, or missing from the other cache)
+        """
+        if not isinstance(other, JupyterCacheBase):
+            if not Path(other).joinpath(DB_NAME).exists():
+                raise FileNotFoundError(f"Not a cache folder: {other}")
+            other = JupyterCacheBase(other)
+        imported, skipped = self._import_records(
+            other, other.list_cache_records(), hardlink
+        )
+        self.truncate_caches()
+        return imported, skipped
+
+    def _import_records(
+        self,
+        other: "JupyterCacheBase",
+        other_records: Iterable[NbCacheRecord],
+        hardlink: bool = True,
+        existing: Optional[set[str]] = None,
+    ) -> tuple[list[str], list[str]]:
+        """Copy records of another cache (and their files) into this one.
+
+        :param existing: The hashkeys already in this cache, if known
+        :raises ValueError: if a record was added to this cache concurrently
+        :return: The hashkeys imported, and the hashkeys skipped
+        """
+        if existing is None:
+            existing = {record.hashkey for record in self.list_cache_records()}
+        copy_function = _link_or_copy if hardlink else shutil.copy2
+        imported, skipped, records = [], [], []
+        for record in other_records:
+            source = other._get_notebook_path_cache(record.hashkey)
+            if record.hashkey in existing or not source.exists():
+                skipped.append(record.hashkey)
+                continue
+            target = self._get_notebook_path_cache(record.hashkey).parent
+            if target.exists():
+                # files without a record, left by an interrupted commit
+                self._move_to_trash(target)
+            shutil.copytree(source.parent, target, copy_function=copy_function)
+            records.append(
+                {
+                    "uri": record.uri,
+                    "hashkey": record.hashkey,
+                    "description": record.description,
+                    "data": record.data,
+                    "created": record.created,
+                    "accessed": record.accessed,
+                }
+            )
+            imported.append(record.hashkey)
+        # create all records at once, rather than locking the database per record
+        NbCacheRecord.create_records(records, self.db)
+        return imported, skipped
+
+    def export_archive(
+        self, fileobj: BinaryIO, project_only: bool = False
+    ) -> list[str]:
+        """Write a snapshot of the cache, as a gzipped tar archive.
+
+        The archive contains an online backup of the cache database,
+        which is consistent even whilst the cache is written to,
+        and the folders of the executed notebooks recorded in it.
+        It is written as a stream, so can be written to e.g. stdout.
+
+        :param fileobj: The binary file to write to
+        :param project_only: Only export the executed notebooks
+            that match the current notebooks of the project
+        :return: The hashkeys exported
+        """
+        keep = None
+        if project_only:
+            keep = set()
+            for project_record in self.list_project_records():
+                try:
+                    record = self.get_cached_project_nb(project_record.uri)
+                except (NbReadError, OSError):
+                    # e.g. the notebook file was moved or deleted
+                    continue
+                if record is not None:
+                    keep.add(record.hashkey)
+        _ = self.db
+        exported, dropped = [], []
+        with tempfile.TemporaryDirectory(dir=self.path, prefix=".export-") as temp:
+            db_path = Path(temp, DB_NAME)
+            source = sqlite3.connect(str(self.path / DB_NAME))
+            backup = sqlite3.connect(str(db_path))
+            try:
+                with backup:
+                    source.backup(backup)
+                source.close()
+                hashkeys = [
+                    key for key, in backup.execute("SELECT hashkey FROM nbcache")
+                ]
+                with tarfile.open(fileobj=fileobj, mode="w|gz") as tar:
+                    version = self.path / "__version__.txt"
+                    if version.exists():
+                        tar.add(version, arcname=version.name)
+                    for hashkey in hashkeys:
+                        if keep is not None and hashkey not in keep:
+                            dropped.append(hashkey)
+                            continue
+                        folder = self._find_executed_folder(hashkey)
+                        # hardlink the files first, since a folder may be evicted
+                        # whilst it is added, which cannot be undone in a stream
+                        snapshot = Path(temp, hashkey)
+                        try:
+                            shutil.copytree(
+                                folder, snapshot, copy_function=_link_or_copy
+                            )
+                        except (FileNotFoundError, shutil.Error):
+                            dropped.append(hashkey)
+                            continue
+                        if not snapshot.joinpath("base.ipynb").exists():
+                            dropped.append(hashkey)
+                        else:
+                            # folders are archived in the flat layout
+                            tar.add(snapshot, arcname=f"executed/{hashkey}")
+                            exported.append(hashkey)
+                        shutil.rmtree(snapshot)
+                    # only records of the exported notebooks
+                    with backup:
+                        backup.executemany(
+                            "DELETE FROM nbcache WHERE hashkey = ?",
+                            [(hashkey,) for hashkey in dropped],
+                        )
+                    backup.close()
+                    tar.add(db_path, arcname=DB_NAME)
+            finally:
+                source.close()
+                backup.close()
+        return exported
+
+    def import_archive(self, fileobj: BinaryIO) -> tuple[list[str], list[str]]:
+        """Read a snapshot of a cache, written by ``export_archive``.
+
+        If this cache does not yet exist, it is restored from the snapshot,
+        including its project and settings.
+        Otherwise, the executed notebooks are merged into it, as for ``import_cache``.
+
+        :param fileobj: The binary file to read from, which may be a stream
+        :raises ValueError: If the archive is not a snapshot of a cache
+        :return: The hashkeys imported, and the hashkeys skipped
+            (already in this cache)
+        """
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # extract next to the cache, so that files can be moved or hardlinked
+        temp = Path(
+            tempfile.mkdtemp(
+                dir=self._path.parent, prefix=f".{self._path.name}.import-"
+            )
+        )
+        try:
+            with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+                if hasattr(tarfile, "data_filter"):
+                    tar.extraction_filter = tarfile.data_filter
+                for member in tar:
+                    path = PurePosixPath(member.name)
+                    if (
+                        path.is_absolute()
+                        or ".." in path.parts
+                        or not (member.isfile() or member.isdir())
+                    ):
+                        raise ValueError(f"Unexpected archive member: {member.name}")
+                    tar.extract(member, temp)
+            if not temp.joinpath(DB_NAME).exists():
+                raise ValueError("Archive is not a snapshot of a cache")
+            if not self._path.joinpath(DB_NAME).exists():
+                self._path.mkdir(exist_ok=True)
+                for path in temp.iterdir():
+                    path.rename(self._path / path.name)
+                self._db = None
+                self._metrics_table = False
+                self._shard_depth = None
+                # move the folders into the layout of the restored settings
+                if self.get_shard_depth():
+                    self.change_shard_depth(self.get_shard_depth())
+                return [record.hashkey for record in self.list_cache_records()], []
+            other = JupyterCacheBase(temp)
+            try:
+                return self.import_cache(other)
+            finally:
+                other.db.dispose()
+        finally:
+            shutil.rmtree(temp, ignore_errors=True)
+
     def list_cache_records(self) -> list[NbCacheRecord]:
         return NbCacheRecord.records_all(self.db)
 
@@ -327,16 +1007,35 @@ class JupyterCacheBase(JupyterCacheAbstract):
         path = self._get_notebook_path_cache(record.hashkey)
         if not path.exists():
             raise KeyError(f"Notebook file does not exist for cache record PK: {pk}")
-        shutil.rmtree(path.parent)
+        self._move_to_trash(path.parent)
         NbCacheRecord.remove_records([pk], self.db)
 
-    def match_cache_notebook(self, nb: nbf.NotebookNode) -> NbCacheRecord:
+    def _record_from_hashkey(self, hashkey: str) -> NbCacheRecord:
+        """Return the record of an executed notebook, for lookups by its hash.
+
+        :raises KeyError: if no match is found
+        """
+        return NbCacheRecord.record_from_hashkey(hashkey, self.db)
+
+    def match_cache_notebook(
+        self, nb: nbf.NotebookNode, hashkey: Optional[str] = None
+    ) -> NbCacheRecord:
         """Match to an executed notebook, returning its primary key.
 
+        :param hashkey: The hashkey to match, rather than the hash of the notebook,
+            e.g. from ``hash_project_notebook`` (which includes the assets
+            and environment of project notebooks, if enabled)
         :raises KeyError: if no match is found
         """
-        _, hashkey = self.create_hashed_notebook(nb)
-        cache_record = NbCacheRecord.record_from_hashkey(hashkey, self.db)
+        start = time.perf_counter()
+        if hashkey is None:
+            _, hashkey = self.create_hashed_notebook(nb)
+        try:
+            cache_record = self._record_from_hashkey(hashkey)
+        except KeyError:
+            self._record_lookup(False, start)
+            raise
+        self._record_lookup(True, start)
         return cache_record
 
     def merge_match_into_notebook(
@@ -344,17 +1043,20 @@ class JupyterCacheBase(JupyterCacheAbstract):
         nb: nbf.NotebookNode,
         nb_meta: Optional[Iterable[str]] = ("kernelspec", "language_info", "widgets"),
         cell_meta: Optional[Iterable[str]] = None,
+        hashkey: Optional[str] = None,
     ) -> tuple[int, nbf.NotebookNode]:
         """Match to an executed notebook and return a merged version
 
         :param nb: The input notebook
         :param nb_meta: metadata keys to merge from the cached notebook (all if None)
         :param cell_meta: cell metadata keys to merge from cached notebook (all if None)
+        :param hashkey: The hashkey to match, rather than the hash of the notebook
+            (see ``match_cache_notebook``)
         :raises KeyError: if no match is found
         :return: pk, input notebook with cached code cells and metadata merged.
 
         """
-        pk = self.match_cache_notebook(nb).pk
+        pk = self.match_cache_notebook(nb, hashkey=hashkey).pk
         cache_nb = self.get_cache_bundle(pk).nb
         nb = nbf.convert(copy.deepcopy(nb), NB_VERSION)
         if nb_meta is None:
@@ -415,10 +1117,17 @@ class JupyterCacheBase(JupyterCacheAbstract):
         *,
         read_data: Mapping = DEFAULT_READ_DATA,
         assets: list[str] = (),
+        depends_on: list[str] = (),
+        outputs: list[str] = (),
     ) -> NbProjectRecord:
         # check the reader can be loaded
         read_data = dict(read_data)
         _ = get_reader(read_data)
+        exec_data = {}
+        if depends_on:
+            exec_data["depends_on"] = [str(Path(p).absolute()) for p in depends_on]
+        if outputs:
+            exec_data["outputs"] = [str(Path(p).absolute()) for p in outputs]
         # TODO should we test that the file can be read by the reader?
         return NbProjectRecord.create_record(
             str(Path(path).absolute()),
@@ -426,6 +1135,7 @@ class JupyterCacheBase(JupyterCacheAbstract):
             raise_on_exists=False,
             read_data=read_data,
             assets=assets,
+            exec_data=exec_data or None,
         )
         # TODO physically copy to cache?
         # TODO assets
@@ -462,44 +1172,95 @@ class JupyterCacheBase(JupyterCacheAbstract):
             record = NbProjectRecord.record_from_pk(uri_or_pk, self.db)
         else:
             record = NbProjectRecord.record_from_uri(uri_or_pk, self.db)
-        if not Path(record.uri).exists():
+        return self._read_project_notebook(record)
+
+    def _read_project_notebook(
+        self, record: NbProjectRecord, hash_nb: bool = False
+    ) -> ProjectNb:
+        """Read the notebook of a project record.
+
+        :param hash_nb: Also compute the hashkey of the notebook
+        """
+        try:
+            mtime_ns = Path(record.uri).stat().st_mtime_ns
+        except FileNotFoundError:
             raise OSError(
                 f"The URI of the project record no longer exists: {record.uri}"
             )
-        try:
-            reader = get_reader(record.read_data)
-            notebook = reader(record.uri)
-            assert isinstance(
-                notebook, nbf.NotebookNode
-            ), f"Reader did not return a v4 NotebookNode: {type(notebook)} {notebook}"
-        except Exception as exc:
-            raise NbReadError(f"Failed to read the notebook: {exc}") from exc
-        return ProjectNb(record.pk, record.uri, notebook, record.assets)
+        with span("read", uri=record.uri):
+            try:
+                reader = get_reader(record.read_data)
+                notebook = reader(record.uri)
+                assert isinstance(
+                    notebook, nbf.NotebookNode
+                ), f"Reader did not return a v4 NotebookNode: {type(notebook)} {notebook}"
+            except Exception as exc:
+                raise NbReadError(f"Failed to read the notebook: {exc}") from exc
+        project_nb = ProjectNb(
+            record.pk, record.uri, notebook, record.assets, mtime_ns=mtime_ns
+        )
+        if hash_nb:
+            project_nb = attr.evolve(
+                project_nb, hashkey=self.hash_project_notebook(project_nb)
+            )
+        return project_nb
 
     def get_cached_project_nb(
         self, uri_or_pk: Union[int, str]
     ) -> Optional[NbCacheRecord]:
-        nb = self.get_project_notebook(uri_or_pk).nb
-        _, hashkey = self.create_hashed_notebook(nb)
+        project_nb = self.get_project_notebook(uri_or_pk)
+        start = time.perf_counter()
+        hashkey = self.hash_project_notebook(project_nb)
         try:
-            return NbCacheRecord.record_from_hashkey(hashkey, self.db)
+            record = self._record_from_hashkey(hashkey)
         except KeyError:
+            self._record_lookup(False, start)
             return None
+        self._record_lookup(True, start)
+        return record
 
     def list_unexecuted(
         self,
         filter_uris: Optional[list[str]] = None,
         filter_pks: Optional[list[int]] = None,
     ) -> list[NbProjectRecord]:
-        records = []
-        for record in self.list_project_records(filter_uris, filter_pks):
-            nb = self.get_project_notebook(record.uri).nb
-            _, hashkey = self.create_hashed_notebook(nb)
+        return [
+            record
+            for record, _ in self._iter_unexecuted(
+                self.list_project_records(filter_uris, filter_pks)
+            )
+        ]
+
+    def list_unexecuted_notebooks(
+        self,
+        filter_uris: Optional[list[str]] = None,
+        filter_pks: Optional[list[int]] = None,
+    ) -> list[ProjectNb]:
+        return [
+            project_nb
+            for _, project_nb in self._iter_unexecuted(
+                self.list_project_records(filter_uris, filter_pks)
+            )
+        ]
+
+    def _iter_unexecuted(
+        self, records: Iterable[NbProjectRecord]
+    ) -> Iterable[tuple[NbProjectRecord, ProjectNb]]:
+        """Yield the records (and read notebooks) whose hash is not in the cache."""
+        for record in records:
+            project_nb = self._read_project_notebook(record)
+            start = time.perf_counter()
+            project_nb = attr.evolve(
+                project_nb, hashkey=self.hash_project_notebook(project_nb)
+            )
             try:
-                NbCacheRecord.record_from_hashkey(hashkey, self.db)
+                self._record_from_hashkey(project_nb.hashkey)
             except KeyError:
-                records.append(record)
-        return records
+                self._record_lookup(False, start)
+                yield record, project_nb
+            else:
+                self._record_lookup(True, start)
+        self.flush_metrics()
 
     # removed until defined use case
     # def get_cache_codecell(self, pk: int, index: int) -> nbf.NotebookNode:
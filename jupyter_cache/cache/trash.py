@@ -0,0 +1,155 @@
+"""Deferred deletion of cache folders.
+
+Folders are renamed into a trash folder, which is fast even for folders of many files
+(e.g. on network file systems), then deleted by a background thread.
+The process does not wait for the deletions at exit,
+so any folders left in the trash are deleted by the next purge.
+"""
+
+import os
+from pathlib import Path
+import shutil
+import threading
+from typing import Optional
+import uuid
+
+from jupyter_cache.utils import folder_size
+
+TRASH_FOLDER = ".trash"
+
+
+class _Purger:
+    """Delete folders in a background thread."""
+
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        self._paths: list[Path] = []
+        self._lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._busy = False
+
+    def schedule(self, path: Path) -> None:
+        with self._lock:
+            if path not in self._paths:
+                self._paths.append(path)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="jcache_trash_purger", daemon=True
+                )
+                self._thread.start()
+            self._pending.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                self._busy = False
+                self._pending.notify_all()
+                while not self._paths:
+                    self._pending.wait()
+                path = self._paths.pop(0)
+                self._busy = True
+            try:
+                if path.name == TRASH_FOLDER:
+                    purge_trash(path)
+                else:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                # e.g. the cache was cleared, or is purged by another process
+                pass
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the scheduled deletions, returning False on timeout."""
+        with self._lock:
+            return self._pending.wait_for(
+                lambda: not self._paths and not self._busy, timeout
+            )
+
+
+_PURGER = _Purger()
+if hasattr(os, "register_at_fork"):
+    # the thread (and the state of its lock) is not inherited by forked processes
+    os.register_at_fork(after_in_child=_PURGER._reset)
+
+
+def wait_for_purge(timeout: Optional[float] = None) -> bool:
+    """Wait for folders moved to the trash to be deleted, returning False on timeout."""
+    return _PURGER.wait(timeout)
+
+
+def move_to_trash(path: Path, trash: Path) -> None:
+    """Move a folder into a trash folder, and delete it in the background.
+
+    If the folder cannot be moved (e.g. the trash is on another file system),
+    it is deleted immediately.
+    """
+    trash.mkdir(exist_ok=True)
+    try:
+        path.rename(trash / f"{path.name}.{uuid.uuid4().hex}")
+    except FileNotFoundError:
+        return
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    # purge the whole trash, including folders left by other processes
+    _PURGER.schedule(trash)
+
+
+def _deleted_siblings(path: Path) -> list[Path]:
+    """Return the renamed copies of a folder, that are not yet deleted."""
+    if not path.parent.exists():
+        return []
+    return sorted(path.parent.glob(f".{path.name}.deleted.*"))
+
+
+def delete_in_background(path: Path) -> None:
+    """Rename a folder to a hidden sibling, and delete it in the background.
+
+    Siblings left by earlier calls (e.g. by a process that exited)
+    are deleted with it, or by the next purge of the trash inside the folder.
+    """
+    target = path.with_name(f".{path.name}.deleted.{uuid.uuid4().hex}")
+    try:
+        path.rename(target)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        shutil.rmtree(path)
+    for sibling in _deleted_siblings(path):
+        _PURGER.schedule(sibling)
+
+
+def trash_size(trash: Path) -> tuple[int, int]:
+    """Return the number of folders in the trash, and the size of their files.
+
+    This includes the renamed copies of the cache folder, that contains the trash.
+    """
+    paths = _deleted_siblings(trash.parent)
+    if trash.exists():
+        paths.extend(trash.iterdir())
+    return len(paths), sum(folder_size(path) for path in paths)
+
+
+def purge_trash(trash: Path) -> int:
+    """Delete the folders in the trash, returning the number deleted.
+
+    This includes the renamed copies of the cache folder, that contains the trash.
+    """
+    count = 0
+    for sibling in _deleted_siblings(trash.parent):
+        shutil.rmtree(sibling, ignore_errors=True)
+        count += 1
+    if not trash.exists():
+        return count
+    for entry in os.scandir(trash):
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+        count += 1
+    return count
@@ -35,6 +35,11 @@ class CacheContext:
             ):
                 raise click.Abort()
 
+        if os.environ.get("JUPYTERCACHE_UPSTREAM"):
+            from jupyter_cache.cache.layered import LayeredCache
+
+            return get_cache(self.cache_path, cache_cls=LayeredCache)
+
         # gets created lazily
         return get_cache(self.cache_path)
 
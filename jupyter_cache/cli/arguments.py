@@ -36,6 +36,13 @@ OUTPUT_PATH = click.argument(
     type=click.Path(dir_okay=False, writable=True, resolve_path=True),
 )
 
+OTHER_CACHE_PATHS = click.argument(
+    "other_paths",
+    metavar="CACHE_PATHS",
+    nargs=-1,
+    type=click.Path(exists=True, readable=True, allow_dash=True),
+)
+
 
 PK = click.argument("pk", metavar="ID", type=int)
 
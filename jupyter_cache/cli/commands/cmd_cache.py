@@ -1,8 +1,16 @@
+import os
+
 import click
 
 from jupyter_cache.cli import arguments, options, pass_cache
 from jupyter_cache.cli.commands.cmd_main import jcache
-from jupyter_cache.utils import tabulate_cache_records
+from jupyter_cache.utils import (
+    CELL_SECONDS_KEY,
+    RESOURCE_KEYS,
+    format_resources,
+    shorten_path,
+    tabulate_cache_records,
+)
 
 
 @jcache.group("cache")
@@ -44,11 +52,24 @@ def list_caches(cache, latest_only, hashkeys, path_length):
     )
 
 
+def _source_summary(source: str, length: int = 60) -> str:
+    """Return the first line of a cell source, truncated to a length."""
+    lines = source.strip().splitlines()
+    line = lines[0] if lines else ""
+    if len(line) > length or len(lines) > 1:
+        line = line[: length - 3] + "..."
+    return line
+
+
 @cmnd_cache.command("info")
 @arguments.PK
+@click.option(
+    "--timings", is_flag=True, help="Show the execution time of each code cell."
+)
 @pass_cache
-def cached_info(cache, pk):
+def cached_info(cache, pk, timings):
     """Show details of a cached notebook."""
+    import tabulate
     import yaml
 
     db = cache.get_cache()
@@ -58,7 +79,32 @@ def cached_info(cache, pk):
         click.secho(f"ID {pk} does not exist, Aborting!", fg="red")
         raise click.Abort()
     data = record.format_dict(hashkey=True, path_length=None)
+    if "Data" in data:
+        # cell timings are shown separately
+        data["Data"] = {k: v for k, v in data["Data"].items() if k != CELL_SECONDS_KEY}
+    if any(key in (record.data or {}) for key in RESOURCE_KEYS):
+        data["Resources"] = format_resources(record.data)
     click.echo(yaml.safe_dump(data, sort_keys=False), nl=False)
+    if timings:
+        cell_seconds = (record.data or {}).get(CELL_SECONDS_KEY)
+        if not cell_seconds:
+            click.echo("Cell timings: none recorded")
+        else:
+            cells = db.get_cache_bundle(pk).nb.cells
+            rows = [
+                {
+                    "Cell": index,
+                    "Time (s)": f"{seconds:.3f}",
+                    "Source": (
+                        _source_summary(cells[index].source)
+                        if index < len(cells)
+                        else ""
+                    ),
+                }
+                for index, seconds in cell_seconds
+            ]
+            click.echo("Cell timings:")
+            click.echo(tabulate.tabulate(rows, headers="keys"))
     with db.cache_artefacts_temppath(pk) as folder:
         paths = [str(p.relative_to(folder)) for p in folder.glob("**/*") if p.is_file()]
     if not paths:
@@ -70,6 +116,154 @@ def cached_info(cache, pk):
             click.echo(f"- {path}")
 
 
+@cmnd_cache.command("slowest-cells")
+@click.option(
+    "-n",
+    "--count",
+    default=10,
+    show_default=True,
+    help="The number of cells to show.",
+)
+@options.PATH_LENGTH
+@pass_cache
+def slowest_cells(cache, count, path_length):
+    """List the slowest cells across all cached notebooks."""
+    import tabulate
+
+    from jupyter_cache.utils import get_slowest_cells
+
+    db = cache.get_cache()
+    timings = get_slowest_cells(db, count)
+    if not timings:
+        click.secho("No cell timings recorded", fg="blue")
+        return
+    rows = [
+        {
+            "ID": timing.pk,
+            "Origin URI": str(shorten_path(timing.uri, path_length)),
+            "Cell": timing.index,
+            "Time (s)": f"{timing.seconds:.3f}",
+        }
+        for timing in timings
+    ]
+    click.echo(tabulate.tabulate(rows, headers="keys"))
+
+
+def _format_stat(name: str, value: float) -> str:
+    if name == "hit_ratio":
+        return f"{value:.1%}"
+    if "seconds" in name:
+        return f"{value:.3f}"
+    return f"{value:.0f}"
+
+
+@cmnd_cache.command("stats")
+@click.option(
+    "--prometheus",
+    help=(
+        "Also write the stats to this file, "
+        "for the Prometheus node exporter textfile collector (e.g. jcache.prom)."
+    ),
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    default=None,
+)
+@click.option("--reset", is_flag=True, help="Reset the stats to zero, after showing.")
+@pass_cache
+def cache_stats(cache, prometheus, reset):
+    """Show metrics on the use of the cache, e.g. its hit ratio."""
+    import tabulate
+
+    from jupyter_cache.metrics import COUNTERS, GAUGES, write_prometheus_textfile
+
+    db = cache.get_cache()
+    stats = db.stats()
+    descriptions = {**COUNTERS, **GAUGES}
+    rows = [
+        {
+            "Metric": name,
+            "Value": _format_stat(name, value),
+            "Description": descriptions.get(name, ""),
+        }
+        for name, value in stats.items()
+    ]
+    click.echo(tabulate.tabulate(rows, headers="keys", disable_numparse=True))
+    if prometheus:
+        write_prometheus_textfile(stats, prometheus, labels={"cache": str(db.path)})
+        click.echo(f"Written to: {prometheus}")
+    if reset:
+        db.reset_stats()
+        click.secho("Stats reset!", fg="green")
+
+
+@cmnd_cache.command("fsck")
+@click.option(
+    "--dry-run", is_flag=True, help="Only report the inconsistencies, do not fix them."
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(1),
+    default=8,
+    show_default=True,
+    help="Number of threads scanning the cache folders.",
+)
+@click.option(
+    "--min-age",
+    type=click.FloatRange(0),
+    default=60,
+    show_default=True,
+    help="Skip records and folders newer than this (seconds), "
+    "which may be part of a commit in progress.",
+)
+@pass_cache
+def fsck_cache(cache, dry_run, workers, min_age):
+    """Reconcile cached notebook records with their files.
+
+    Folders without a record (e.g. left by a crashed commit) are deleted,
+    records without files are removed,
+    and removed folders not yet deleted (in the background) are deleted.
+    """
+    db = cache.get_cache()
+    result = db.fsck(dry_run=dry_run, workers=workers, min_age=min_age)
+    for hashkey in result.orphan_folders:
+        click.echo(f"Folder without record: {hashkey}")
+    for pk in result.dangling_records:
+        click.echo(f"Record without files: ID {pk}")
+    click.echo(
+        f"{len(result.orphan_folders)} orphan folder(s), "
+        f"{len(result.dangling_records)} dangling record(s), "
+        f"{result.trash_folders} removed folder(s), "
+        f"{result.reclaimable_bytes / 1e6:.1f} MB reclaimable"
+    )
+    if dry_run:
+        click.secho("Dry run, nothing changed.", fg="yellow")
+    else:
+        click.secho("Success!", fg="green")
+
+
+@cmnd_cache.command("layout")
+@click.argument("depth", metavar="DEPTH", type=click.IntRange(0), required=False)
+@pass_cache
+def change_layout(cache, depth):
+    """Get/set the sub-folder levels, that cached notebooks are stored in.
+
+    For example, with a depth of 2 notebooks are stored in ``executed/ab/cd/abcd...``,
+    which keeps folders small for caches of many notebooks.
+    Setting the depth moves the cached notebooks to the new layout.
+    """
+    db = cache.get_cache()
+    if depth is None:
+        click.echo(f"Current shard depth: {db.get_shard_depth()}")
+        return
+    try:
+        moved = db.change_shard_depth(depth)
+    except ValueError as err:
+        click.secho(str(err), fg="red")
+        raise click.Abort()
+    click.echo(f"Moved {moved} notebook(s)")
+    click.secho("Shard depth changed!", fg="green")
+
+
 @cmnd_cache.command("cat-artefact")
 @arguments.PK
 @arguments.ARTIFACT_RPATH
@@ -153,6 +347,64 @@ def cache_nbs(cache, nbpaths, validate, overwrite):
         click.secho("Success!", fg="green")
 
 
+@cmnd_cache.command("export")
+@click.argument(
+    "output", metavar="OUTPUT", default="-", type=click.Path(allow_dash=True)
+)
+@click.option(
+    "--project-only",
+    is_flag=True,
+    help="Only export the executed notebooks of the current project notebooks.",
+)
+@pass_cache
+def export_cache(cache, output, project_only):
+    """Write a snapshot of the cache to a gzipped tar archive.
+
+    The snapshot is consistent, even whilst the cache is written to.
+    If OUTPUT is ``-`` (the default), the archive is written to stdout,
+    e.g. ``jcache cache export | ssh host jcache cache import -``.
+    """
+    db = cache.get_cache(ask_on_missing=False)
+    with click.open_file(output, "wb") as handle:
+        exported = db.export_archive(handle, project_only=project_only)
+    # keep stdout for the archive
+    click.secho(f"Exported {len(exported)} notebook(s)", fg="green", err=output == "-")
+
+
+@cmnd_cache.command("import")
+@arguments.OTHER_CACHE_PATHS
+@click.option("--copy", is_flag=True, help="Copy files, rather than hardlinking them.")
+@pass_cache
+def import_caches(cache, other_paths, copy):
+    """Merge executed notebooks from other cache(s), e.g. of project shards.
+
+    CACHE_PATHS are cache folders, or archives written by ``jcache cache export``
+    (``-`` reads an archive from stdin).
+    If the cache does not yet exist, it is restored from an archive.
+    Notebooks already in the cache are skipped.
+    """
+    import tarfile
+
+    db = cache.get_cache(ask_on_missing=False)
+    for other_path in other_paths:
+        try:
+            if os.path.isdir(other_path):
+                imported, skipped = db.import_cache(
+                    os.path.abspath(other_path), hardlink=not copy
+                )
+            else:
+                with click.open_file(other_path, "rb") as handle:
+                    imported, skipped = db.import_archive(handle)
+        except (FileNotFoundError, ValueError, tarfile.TarError) as err:
+            click.secho(str(err), fg="red")
+            raise click.Abort()
+        click.echo(
+            f"Imported {len(imported)} notebook(s), skipped {len(skipped)}: "
+            f"{other_path}"
+        )
+    click.secho("Success!", fg="green")
+
+
 @cmnd_cache.command("clear")
 @options.FORCE
 @pass_cache
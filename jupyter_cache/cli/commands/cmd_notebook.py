@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 import logging
 import os
 
@@ -39,12 +40,20 @@ def add_notebooks(cache, nbpaths, reader):
 @arguments.ASSET_PATHS
 @options.NB_PATH
 @options.READER_KEY
+@options.NB_DEPENDS_ON
+@options.NB_OUTPUTS
 @pass_cache
-def add_notebook(cache, nbpath, reader, asset_paths):
-    """Add notebook(s) to the project, with possible asset files."""
+def add_notebook(cache, nbpath, reader, asset_paths, depends_on, outputs):
+    """Add notebook(s) to the project, with possible asset files,
+    and dependencies on other notebooks.
+    """
     db = cache.get_cache()
     db.add_nb_to_project(
-        nbpath, read_data={"name": reader, "type": "plugin"}, assets=asset_paths
+        nbpath,
+        read_data={"name": reader, "type": "plugin"},
+        assets=asset_paths,
+        depends_on=depends_on,
+        outputs=outputs,
     )
     click.secho("Success!", fg="green")
 
@@ -173,10 +182,9 @@ def show_project_record(cache, pk_path, tb):
 def merge_executed(cache, pk_path, outpath):
     """Create notebook merged with cached outputs (by ID/URI)."""
     db = cache.get_cache()
-    nb = db.get_project_notebook(
+    cached_pk, nb = db.merge_match_into_project_nb(
         int(pk_path) if pk_path.isdigit() else os.path.abspath(pk_path)
-    ).nb
-    cached_pk, nb = db.merge_match_into_notebook(nb)
+    )
     nbformat.write(nb, outpath)
     click.echo(f"Merged with cache PK {cached_pk}")
     click.secho("Success!", fg="green")
@@ -186,14 +194,44 @@ def merge_executed(cache, pk_path, outpath):
 @arguments.PK_OR_PATHS
 @options.EXECUTOR_KEY
 @options.EXEC_TIMEOUT
+@options.EXEC_JOBS
+@options.EXEC_FAIL_FAST
+@options.EXEC_SINGLE_WRITER
+@options.EXEC_POOL_SIZE
+@options.EXEC_MAX_KERNEL_USES
+@options.EXEC_ARTIFACTS
 @options.EXEC_FORCE(default=True)
+@options.EXEC_RETRY_FAILED
+@options.EXEC_TRACE
 @options.set_log_level(logger)
 @pass_cache
-def execute_nbs(cache, pk_paths, executor, timeout, force):
-    """Execute specific notebooks in the project."""
+def execute_nbs(
+    cache,
+    pk_paths,
+    executor,
+    timeout,
+    jobs,
+    fail_fast,
+    single_writer,
+    force,
+    pool_size,
+    max_kernel_uses,
+    artifact_include,
+    artifact_exclude,
+    artifact_max_size,
+    artifact_max_total,
+    retry_failed,
+    trace,
+):
+    """Execute specific notebooks in the project.
+
+    With ``--no-force``, notebooks that failed previously are skipped
+    if they are unchanged, unless ``--retry-failed`` is used.
+    """
     import yaml
 
     from jupyter_cache.executors import load_executor
+    from jupyter_cache.tracing import tracing
 
     uris = [os.path.abspath(p) for p in pk_paths if not p.isdigit()] or None
     pks = [int(p) for p in pk_paths if p.isdigit()] or None
@@ -205,9 +243,31 @@ def execute_nbs(cache, pk_paths, executor, timeout, force):
     except ImportError as error:
         logger.error(str(error))
         return 1
-    result = executor.run_and_cache(
-        filter_pks=pks, filter_uris=uris, timeout=timeout, force=force
-    )
+    with tracing(trace) if trace else nullcontext():
+        result = executor.run_and_cache(
+            filter_pks=pks,
+            filter_uris=uris,
+            timeout=timeout,
+            force=force,
+            **utils.executor_kwargs(
+                executor,
+                logger,
+                workers=jobs,
+                fail_fast=fail_fast,
+                single_writer=single_writer,
+                pool_size=pool_size,
+                max_kernel_uses=max_kernel_uses,
+                artifacts=utils.artifact_options(
+                    artifact_include,
+                    artifact_exclude,
+                    artifact_max_size,
+                    artifact_max_total,
+                ),
+                retry_failed=retry_failed or None,
+            ),
+        )
+    if trace:
+        click.echo(f"Trace written to: {trace}")
     click.secho(
         "Finished! Successfully executed notebooks have been cached.", fg="green"
     )
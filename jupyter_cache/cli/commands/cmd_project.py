@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 import logging
 
 import click
@@ -63,17 +64,109 @@ def change_cache_limit(cache, limit):
         click.secho("Cache limit changed!", fg="green")
 
 
+@cmnd_project.command("hash-assets")
+@click.argument("value", metavar="on|off", type=click.BOOL, required=False)
+@pass_cache
+def change_hash_assets(cache, value):
+    """Get/set whether the content of notebook assets is part of their hash.
+
+    If on, notebooks are re-executed when their assets change.
+    """
+    db = cache.get_cache()
+    if value is None:
+        value = db.get_hash_assets()
+        click.echo(f"Hash assets: {'on' if value else 'off'}")
+    else:
+        db.change_hash_assets(value)
+        click.secho("Hash assets changed!", fg="green")
+
+
+@cmnd_project.command("env-fingerprint")
+@click.argument("value", metavar="on|off", type=click.BOOL, required=False)
+@click.option(
+    "--lockfile",
+    "lockfiles",
+    multiple=True,
+    type=click.Path(dir_okay=False, exists=True, readable=True, resolve_path=True),
+    help="Hash a lockfile (repeatable), rather than the installed packages.",
+)
+@click.option(
+    "--package",
+    "packages",
+    multiple=True,
+    help="Hash only the version of this installed package (repeatable).",
+)
+@pass_cache
+def change_env_fingerprint(cache, value, lockfiles, packages):
+    """Get/set whether the kernel environment is part of notebook hashes.
+
+    If on, notebooks are re-executed when the packages installed for their kernel
+    (or the lockfiles) change.
+    """
+    from jupyter_cache.cache.environment import EnvironmentOptions
+
+    db = cache.get_cache()
+    if value is None:
+        options = db.get_env_fingerprint()
+        click.echo(f"Environment fingerprint: {'off' if options is None else 'on'}")
+        if options is not None:
+            for lockfile in options.lockfiles:
+                click.echo(f"- lockfile: {lockfile}")
+            for package in options.packages:
+                click.echo(f"- package: {package}")
+    else:
+        db.change_env_fingerprint(
+            EnvironmentOptions(lockfiles, packages) if value else None
+        )
+        click.secho("Environment fingerprint changed!", fg="green")
+
+
 @cmnd_project.command("execute")
 @options.EXECUTOR_KEY
 @options.EXEC_TIMEOUT
+@options.EXEC_JOBS
+@options.EXEC_SHARD
+@options.EXEC_FAIL_FAST
+@options.EXEC_SINGLE_WRITER
+@options.EXEC_POOL_SIZE
+@options.EXEC_MAX_KERNEL_USES
+@options.EXEC_ARTIFACTS
+@options.EXEC_QUEUE_ID
+@options.EXEC_LEASE_SECONDS
 @options.EXEC_FORCE(default=False)
+@options.EXEC_RETRY_FAILED
+@options.EXEC_TRACE
 @options.set_log_level(logger)
 @pass_cache
-def execute_nbs(cache, executor, timeout, force):
-    """Execute all outdated notebooks in the project."""
+def execute_nbs(
+    cache,
+    executor,
+    timeout,
+    jobs,
+    shard,
+    fail_fast,
+    single_writer,
+    force,
+    pool_size,
+    max_kernel_uses,
+    artifact_include,
+    artifact_exclude,
+    artifact_max_size,
+    artifact_max_total,
+    queue_id,
+    lease_seconds,
+    retry_failed,
+    trace,
+):
+    """Execute all outdated notebooks in the project.
+
+    Notebooks that failed previously are skipped if they are unchanged,
+    unless ``--retry-failed`` is used.
+    """
     import yaml
 
     from jupyter_cache.executors import load_executor
+    from jupyter_cache.tracing import tracing
 
     db = cache.get_cache()
     try:
@@ -81,8 +174,70 @@ def execute_nbs(cache, executor, timeout, force):
     except ImportError as error:
         logger.error(str(error))
         return 1
-    result = executor.run_and_cache(timeout=timeout, force=force)
+    filter_pks = None
+    if shard is not None:
+        from jupyter_cache.executors.utils import shard_project
+
+        filter_pks = [record.pk for record in shard_project(db, *shard)]
+        logger.info(f"Shard {shard[0]}/{shard[1]}: {len(filter_pks)} notebook(s)")
+    with tracing(trace) if trace else nullcontext():
+        result = executor.run_and_cache(
+            filter_pks=filter_pks,
+            timeout=timeout,
+            force=force,
+            **utils.executor_kwargs(
+                executor,
+                logger,
+                workers=jobs,
+                fail_fast=fail_fast,
+                single_writer=single_writer,
+                pool_size=pool_size,
+                max_kernel_uses=max_kernel_uses,
+                artifacts=utils.artifact_options(
+                    artifact_include,
+                    artifact_exclude,
+                    artifact_max_size,
+                    artifact_max_total,
+                ),
+                queue_id=queue_id,
+                lease_seconds=lease_seconds,
+                # only passed if set, for executors that do not support it
+                retry_failed=retry_failed or None,
+            ),
+        )
+    if trace:
+        click.echo(f"Trace written to: {trace}")
     click.secho(
         "Finished! Successfully executed notebooks have been cached.", fg="green"
     )
     click.echo(yaml.safe_dump(result.as_json(), sort_keys=False))
+
+
+@cmnd_project.command("stats")
+@click.option(
+    "-s",
+    "--sort-by",
+    type=click.Choice(["time", "startup", "memory", "cpu"]),
+    help="Sort notebooks by a resource (largest first).",
+)
+@options.PATH_LENGTH
+@pass_cache
+def project_stats(cache, sort_by, path_length):
+    """Show the resources used by the latest execution of each notebook."""
+    from jupyter_cache.utils import tabulate_project_stats
+
+    db = cache.get_cache()
+    records = db.list_project_records()
+    if not records:
+        click.secho("No notebooks in project", fg="blue")
+        return
+    sort_key = {
+        "time": "execution_seconds",
+        "startup": "kernel_startup_seconds",
+        "memory": "peak_memory_bytes",
+        "cpu": "cpu_user_seconds",
+        None: None,
+    }[sort_by]
+    click.echo(
+        tabulate_project_stats(records, db, path_length=path_length, sort_by=sort_key)
+    )
@@ -74,6 +74,25 @@ READER_KEY = click.option(
 )
 
 
+NB_DEPENDS_ON = click.option(
+    "--depends-on",
+    help="A project notebook that must execute first (repeatable).",
+    multiple=True,
+    type=click.Path(dir_okay=False, exists=True, readable=True, resolve_path=True),
+)
+
+NB_OUTPUTS = click.option(
+    "--output",
+    "outputs",
+    help=(
+        "A file written by the notebook (repeatable), "
+        "notebooks with it as an asset will execute after this notebook."
+    ),
+    multiple=True,
+    type=click.Path(resolve_path=True),
+)
+
+
 EXECUTOR_KEY = click.option(
     "-e",
     "--executor",
@@ -92,6 +111,133 @@ EXEC_TIMEOUT = click.option(
 )
 
 
+EXEC_JOBS = click.option(
+    "-j",
+    "--jobs",
+    help="Maximum number of notebooks to execute in parallel (parallel executors only).",
+    type=click.IntRange(min=1),
+    default=None,
+)
+
+
+def callback_shard(ctx, param, value):
+    """Parse a shard, given as ``INDEX/COUNT``."""
+    if value is None:
+        return None
+    try:
+        index, count = (int(i) for i in value.split("/"))
+    except ValueError:
+        raise click.BadParameter("must be of the form INDEX/COUNT, e.g. 1/4")
+    if not 1 <= index <= count:
+        raise click.BadParameter("INDEX must be between 1 and COUNT")
+    return index, count
+
+
+EXEC_SHARD = click.option(
+    "--shard",
+    help=(
+        "Execute only one of COUNT shards of the project (INDEX from 1 to COUNT), "
+        "balanced by previous execution times."
+    ),
+    metavar="INDEX/COUNT",
+    callback=callback_shard,
+    default=None,
+)
+
+EXEC_FAIL_FAST = click.option(
+    "--fail-fast",
+    is_flag=True,
+    default=None,
+    help=(
+        "Cancel notebooks not yet executing, on the first failure "
+        "(parallel executors only)."
+    ),
+)
+
+EXEC_SINGLE_WRITER = click.option(
+    "--single-writer",
+    is_flag=True,
+    default=None,
+    help=(
+        "Cache executed notebooks from a single writer, rather than from each process "
+        "(parallel executors only)."
+    ),
+)
+
+EXEC_POOL_SIZE = click.option(
+    "--pool-size",
+    help="Number of kernels to keep started, per kernelspec (pooled executors only).",
+    type=click.IntRange(min=1),
+    default=None,
+)
+
+EXEC_MAX_KERNEL_USES = click.option(
+    "--max-kernel-uses",
+    help=(
+        "Number of notebooks executed by a kernel before it is restarted "
+        "(pooled executors only)."
+    ),
+    type=click.IntRange(min=1),
+    default=None,
+)
+
+EXEC_QUEUE_ID = click.option(
+    "--queue-id",
+    help=(
+        "ID of the queue shared by executors of the same run, "
+        "use a new ID per run (shared-queue executor only) [default: $JCACHE_QUEUE_ID]."
+    ),
+    default=None,
+)
+
+EXEC_LEASE_SECONDS = click.option(
+    "--lease-seconds",
+    help=(
+        "Seconds after which a notebook is claimed by another executor, "
+        "if its executor stops responding (shared-queue executor only)."
+    ),
+    type=click.FloatRange(min=1),
+    default=None,
+)
+
+EXEC_TRACE = click.option(
+    "--trace",
+    help=(
+        "Write the spans of each execution phase to this file, "
+        "as Chrome trace-event JSON (e.g. to open in https://ui.perfetto.dev)."
+    ),
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    default=None,
+)
+
+
+def EXEC_ARTIFACTS(f):
+    """Options for collecting execution artifacts (temporary folder executors only)."""
+    f = click.option(
+        "--artifact-max-total",
+        help="Maximum size (MB) of all artifacts of a notebook [default: 100].",
+        type=click.FloatRange(min=0),
+        default=None,
+    )(f)
+    f = click.option(
+        "--artifact-max-size",
+        help="Maximum size (MB) of an artifact file [default: 10].",
+        type=click.FloatRange(min=0),
+        default=None,
+    )(f)
+    f = click.option(
+        "--artifact-exclude",
+        help="Glob of files not to cache as artifacts (repeatable).",
+        multiple=True,
+    )(f)
+    f = click.option(
+        "--artifact-include",
+        help="Glob of files to cache as artifacts (repeatable) [default: **/*].",
+        multiple=True,
+    )(f)
+    return f
+
+
 def EXEC_FORCE(default=False):
     return click.option(
         "-f",
@@ -103,6 +249,13 @@ def EXEC_FORCE(default=False):
     )
 
 
+EXEC_RETRY_FAILED = click.option(
+    "--retry-failed",
+    is_flag=True,
+    help="Execute notebooks that failed previously, even if they are unchanged.",
+)
+
+
 PATH_LENGTH = click.option(
     "-l", "--path-length", default=3, show_default=True, help="Maximum URI path."
 )
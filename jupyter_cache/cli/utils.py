@@ -1,4 +1,6 @@
+import inspect
 import logging
+from typing import Optional
 
 import click
 
@@ -22,3 +24,45 @@ def setup_logger(logger: logging.Logger) -> None:
         logger.addHandler(ClickLogHandler())
     else:
         click_log.basic_config(logger)
+
+
+def executor_kwargs(executor, logger: logging.Logger, **kwargs) -> dict:
+    """Return the (non-None) keyword arguments supported by ``executor.run_and_cache``.
+
+    A warning is logged for any that are not supported.
+    """
+    parameters = inspect.signature(executor.run_and_cache).parameters
+    supported = {}
+    for key, value in kwargs.items():
+        if value is None:
+            continue
+        if key in parameters:
+            supported[key] = value
+        else:
+            logger.warning(f"{key!r} option is not supported by: {executor}")
+    return supported
+
+
+def artifact_options(
+    include: tuple[str, ...] = (),
+    exclude: tuple[str, ...] = (),
+    max_size: Optional[float] = None,
+    max_total: Optional[float] = None,
+):
+    """Return the ``ArtifactOptions`` for the CLI options (sizes in MB),
+    or None if no options were given.
+    """
+    if not (include or exclude or max_size is not None or max_total is not None):
+        return None
+    from jupyter_cache.executors.utils import ArtifactOptions
+
+    kwargs = {}
+    if include:
+        kwargs["include"] = include
+    if exclude:
+        kwargs["exclude"] = exclude
+    if max_size is not None:
+        kwargs["max_file_size"] = int(max_size * 2**20)
+    if max_total is not None:
+        kwargs["max_total_size"] = int(max_total * 2**20)
+    return ArtifactOptions(**kwargs)
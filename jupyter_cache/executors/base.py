@@ -91,6 +91,7 @@ class JupyterExecutorAbstract(ABC):
         timeout: Optional[int] = 30,
         allow_errors: bool = False,
         force: bool = False,
+        retry_failed: bool = False,
         **kwargs: Any,
     ) -> ExecutorRunResult:
         """Run execution, cache successfully executed notebooks and return their URIs
@@ -101,6 +102,8 @@ class JupyterExecutorAbstract(ABC):
         :param allow_errors: Whether to halt execution on the first cell exception
             (provided the cell is not tagged as an expected exception)
         :param force: Whether to force execution of all notebooks, even if they are cached
+        :param retry_failed: Whether to execute notebooks that failed previously,
+            even if they (and their upstream notebooks) are unchanged
         :param kwargs: Additional keyword arguments to pass to the executor
         """
 
@@ -1,23 +1,50 @@
+import asyncio
+from collections.abc import Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+from functools import partial
 import logging
 import multiprocessing as mproc
 import os
 from pathlib import Path
 import tempfile
-from typing import NamedTuple
+from typing import Callable, NamedTuple, Optional, Union
+
+import attr
 
 from jupyter_cache.base import JupyterCacheAbstract, ProjectNb
-from jupyter_cache.cache.db import NbProjectRecord
+from jupyter_cache.cache.db import NbFailureRecord, NbProjectRecord
 from jupyter_cache.executors.base import ExecutorRunResult, JupyterExecutorAbstract
+from jupyter_cache.executors.cache_writer import CacheWriter
+from jupyter_cache.executors.dependencies import (
+    DependencyScheduler,
+    downstream_notebooks,
+    project_dependencies,
+)
+from jupyter_cache.executors.kernel_pool import KernelPool
 from jupyter_cache.executors.utils import (
+    ArtifactOptions,
     ExecutionResult,
+    async_single_nb_execution,
+    available_memory,
+    collect_artifacts,
     copy_assets,
     create_cache_bundle,
+    folder_digests,
+    get_latest_cache_data,
+    predict_execution_seconds,
+    predict_makespan,
     single_nb_execution,
 )
+from jupyter_cache.tracing import add_span, now_us, set_track, span, tracing_enabled
+from jupyter_cache.utils import Timer
 
 REPORT_LEVEL = logging.INFO + 1
 logging.addLevelName(REPORT_LEVEL, "REPORT")
 
+# the names of the worker result statuses
+_RESULT_NAMES = ("Succeeded", "Excepted", "Errored")
+
 
 class ProcessData(NamedTuple):
     """Data for the process worker."""
@@ -27,6 +54,101 @@ class ProcessData(NamedTuple):
     cache: JupyterCacheAbstract
     timeout: int
     allow_errors: bool
+    # the notebook already read (and hashed) by the parent, if available
+    project_nb: Optional[ProjectNb] = None
+    # how to collect artifacts (for executors running in a temporary folder)
+    artifacts: Optional[ArtifactOptions] = None
+    # the time the notebook was queued for execution (see ``tracing.now_us``)
+    queued_us: Optional[int] = None
+
+
+def get_process_data(
+    executor: JupyterExecutorAbstract,
+    filter_uris: Optional[list[str]],
+    filter_pks: Optional[list[int]],
+    timeout: int,
+    allow_errors: bool,
+    force: bool,
+    artifacts: Optional[ArtifactOptions] = None,
+    retry_failed: bool = False,
+) -> list[ProcessData]:
+    """Return the data for the notebooks that require execution.
+
+    Notebooks read (and hashed) to check whether they are already cached
+    are passed on to the worker, so that it does not need to read them again.
+    Notebooks downstream of those (see ``project_dependencies``) are also returned,
+    since their cached executions will be invalidated.
+
+    Unless ``retry_failed`` (or ``force``), notebooks whose hashkey is unchanged
+    since their last execution failed are skipped, as are the notebooks downstream.
+    """
+    NbFailureRecord.create_table(executor.cache.db)
+    if force:
+        execute_data = [
+            ProcessData(
+                record.pk,
+                record.uri,
+                executor.cache,
+                timeout,
+                allow_errors,
+                artifacts=artifacts,
+            )
+            for record in executor.get_records(
+                filter_uris, filter_pks, clear_tracebacks=True, force=True
+            )
+        ]
+        return _set_queued(execute_data)
+    notebooks = executor.cache.list_unexecuted_notebooks(filter_uris, filter_pks)
+    upstream = project_dependencies(executor.cache.list_project_records())
+    skipped: set[str] = set()
+    if not retry_failed:
+        failed = {
+            record.uri: record.hashkey
+            for record in NbFailureRecord.records_all(executor.cache.db)
+        }
+        skipped = {nb.uri for nb in notebooks if failed.get(nb.uri) == nb.hashkey}
+        skipped.update(downstream_notebooks(upstream, skipped))
+        for nb in notebooks:
+            if nb.uri in skipped:
+                executor.logger.warning(
+                    "Skipped, since it (or an upstream notebook) failed "
+                    "and is unchanged (retry failed to re-execute): %s" % nb.uri
+                )
+        notebooks = [nb for nb in notebooks if nb.uri not in skipped]
+    execute_data = [
+        ProcessData(nb.pk, nb.uri, executor.cache, timeout, allow_errors, nb, artifacts)
+        for nb in notebooks
+    ]
+    downstream = (
+        downstream_notebooks(upstream, [nb.uri for nb in notebooks])
+        .difference(nb.uri for nb in notebooks)
+        .difference(skipped)
+    )
+    if downstream:
+        execute_data.extend(
+            ProcessData(
+                record.pk,
+                record.uri,
+                executor.cache,
+                timeout,
+                allow_errors,
+                artifacts=artifacts,
+            )
+            for record in executor.cache.list_project_records(filter_uris, filter_pks)
+            if record.uri in downstream
+        )
+    NbProjectRecord.remove_tracebacks(
+        [data.pk for data in execute_data], executor.cache.db
+    )
+    return _set_queued(execute_data)
+
+
+def _set_queued(execute_data: list[ProcessData]) -> list[ProcessData]:
+    """Set the time the notebooks were queued, if tracing is enabled."""
+    if not tracing_enabled():
+        return execute_data
+    queued = now_us()
+    return [data._replace(queued_us=queued) for data in execute_data]
 
 
 class ExecutionWorkerBase:
@@ -45,26 +167,36 @@ class ExecutionWorkerBase:
     def execute(self, project_nb: ProjectNb, data: ProcessData) -> ExecutionResult:
         raise NotImplementedError
 
-    def __call__(self, data: ProcessData) -> tuple[int, str]:
+    def get_project_notebook(self, data: ProcessData) -> Optional[ProjectNb]:
+        """Read (and hash) the notebook to execute, if not already read,
+        returning None on failure.
+        """
+        if data.project_nb is not None:
+            return data.project_nb
         try:
             project_nb = data.cache.get_project_notebook(data.pk)
-        except Exception:
-            self.logger.error(
-                "Failed Retrieving: %s" % data.uri,
-                exc_info=True,
+            # hash before execution, in case the execution changes the assets
+            return attr.evolve(
+                project_nb, hashkey=data.cache.hash_project_notebook(project_nb)
             )
-            return (2, data.uri)
-
-        try:
-            self.log_info("Executing: %s" % project_nb.uri)
-            result = self.execute(project_nb, data)
         except Exception:
             self.logger.error(
-                "Failed Executing: %s" % data.uri,
+                "Failed Retrieving: %s" % data.uri,
                 exc_info=True,
             )
-            return (2, data.uri)
+            return None
 
+    def cache_result(
+        self,
+        project_nb: ProjectNb,
+        data: ProcessData,
+        result: ExecutionResult,
+        truncate: bool = True,
+    ) -> tuple[int, str]:
+        """Record the result of an execution in the cache.
+
+        :param truncate: Truncate the cache to its limit, after caching the notebook
+        """
         if result.err:
             self.logger.warning(
                 "Execution Excepted: %s\n%s: %s"
@@ -73,16 +205,37 @@ class ExecutionWorkerBase:
             NbProjectRecord.set_traceback(
                 project_nb.uri, result.exc_string, data.cache.db
             )
+            if project_nb.hashkey is not None:
+                NbFailureRecord.set_failure(
+                    project_nb.uri, project_nb.hashkey, result.exc_string, data.cache.db
+                )
+            data.cache._record_metrics(
+                executions_failed=1, execution_seconds=result.time
+            )
             return (1, data.uri)
 
         self.log_info("Execution Successful: %s" % project_nb.uri)
+        if project_nb.mtime_ns is not None and project_nb.mtime_ns != _mtime_ns(
+            project_nb.uri
+        ):
+            # the result is still cached, against the source that was executed
+            self.logger.warning("Source changed during execution: %s" % project_nb.uri)
         try:
-            # TODO deal with artifact retrieval
             bundle = create_cache_bundle(
-                project_nb, result.cwd, None, result.time, result.exc_string
+                project_nb,
+                result.cwd,
+                None,
+                result.time,
+                result.exc_string,
+                result.data,
+                artifacts=result.artifacts,
             )
             data.cache.cache_notebook_bundle(
-                bundle, check_validity=False, overwrite=True
+                bundle,
+                check_validity=False,
+                overwrite=True,
+                truncate=truncate,
+                hashkey=project_nb.hashkey,
             )
         except Exception:
             self.logger.error(
@@ -91,8 +244,44 @@ class ExecutionWorkerBase:
             )
             return (2, data.uri)
 
+        NbFailureRecord.remove_uris([project_nb.uri], data.cache.db)
+        data.cache._record_metrics(
+            executions_succeeded=1, execution_seconds=result.time
+        )
         return (0, data.uri)
 
+    def execute_data(
+        self, data: ProcessData
+    ) -> Optional[tuple[ProjectNb, ExecutionResult]]:
+        """Read and execute the notebook, without caching the result.
+
+        :returns: None if the notebook could not be read or executed
+        """
+        if data.queued_us is not None:
+            add_span("queue wait", data.queued_us, uri=data.uri)
+        project_nb = self.get_project_notebook(data)
+        if project_nb is None:
+            return None
+
+        try:
+            self.log_info("Executing: %s" % project_nb.uri)
+            with span("execute", uri=project_nb.uri):
+                result = self.execute(project_nb, data)
+        except Exception:
+            self.logger.error(
+                "Failed Executing: %s" % data.uri,
+                exc_info=True,
+            )
+            return None
+
+        return project_nb, result
+
+    def __call__(self, data: ProcessData) -> tuple[int, str]:
+        executed = self.execute_data(data)
+        if executed is None:
+            return (2, data.uri)
+        return self.cache_result(executed[0], data, executed[1])
+
 
 class ExecutionWorkerLocalSerial(ExecutionWorkerBase):
     """Execution worker, that executes in local folder."""
@@ -127,42 +316,124 @@ class ExecutionWorkerTempSerial(ExecutionWorkerBase):
     def logger(self) -> logging.Logger:
         return self._logger
 
-    @staticmethod
-    def execute(project_nb: ProjectNb, data: ProcessData) -> ExecutionResult:
+    def execute(self, project_nb: ProjectNb, data: ProcessData) -> ExecutionResult:
         with tempfile.TemporaryDirectory() as cwd:
             copy_assets(project_nb.uri, project_nb.assets, cwd)
+            before = folder_digests(cwd)
+            result = single_nb_execution(
+                project_nb.nb,
+                cwd=cwd,
+                timeout=data.timeout,
+                allow_errors=data.allow_errors,
+            )
+            result.artifacts = collect_artifacts(
+                cwd, before, data.artifacts, self.logger
+            )
+            return result
+
+
+def _mtime_ns(path: str) -> Optional[int]:
+    """Return the modification time of a file, or None if it no longer exists."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _kernel_name(project_nb: ProjectNb) -> str:
+    """Return the kernelspec name of the notebook (empty for the default kernel)."""
+    return project_nb.nb.metadata.get("kernelspec", {}).get("name", "")
+
+
+class ExecutionWorkerLocalPooled(ExecutionWorkerLocalSerial):
+    """Execution worker, that executes in local folder, using a pre-started kernel."""
+
+    def __init__(self, logger: logging.Logger, pool: KernelPool) -> None:
+        super().__init__(logger)
+        self._pool = pool
+
+    def execute(self, project_nb: ProjectNb, data: ProcessData) -> ExecutionResult:
+        cwd = str(Path(project_nb.uri).parent)
+        with self._pool.kernel(_kernel_name(project_nb), cwd) as kernel:
             return single_nb_execution(
                 project_nb.nb,
                 cwd=cwd,
                 timeout=data.timeout,
                 allow_errors=data.allow_errors,
+                km=kernel.km,
             )
 
 
-class ExecutionWorkerLocalMProc(ExecutionWorkerBase):
-    """Execution worker, that executes in local folder."""
+class ExecutionWorkerTempPooled(ExecutionWorkerTempSerial):
+    """Execution worker, that executes in temporary folder, using a pre-started kernel."""
 
-    @property
-    def logger(self) -> logging.Logger:
-        return mproc.get_logger()
+    def __init__(self, logger: logging.Logger, pool: KernelPool) -> None:
+        super().__init__(logger)
+        self._pool = pool
 
-    def log_info(self, msg: str):
-        # multiprocessing logs a lot at info level that we do not want to see
-        self.logger.log(REPORT_LEVEL, msg)
+    def execute(self, project_nb: ProjectNb, data: ProcessData) -> ExecutionResult:
+        # the pooled kernel runs in its own temporary folder,
+        # which may contain files from notebooks previously executed by the kernel
+        with self._pool.kernel(_kernel_name(project_nb)) as kernel:
+            copy_assets(project_nb.uri, project_nb.assets, kernel.workdir)
+            before = folder_digests(kernel.workdir)
+            result = single_nb_execution(
+                project_nb.nb,
+                cwd=kernel.workdir,
+                timeout=data.timeout,
+                allow_errors=data.allow_errors,
+                km=kernel.km,
+            )
+            result.artifacts = collect_artifacts(
+                kernel.workdir, before, data.artifacts, self.logger
+            )
+            return result
+
+
+class ExecutionWorkerLocalAsync(ExecutionWorkerLocalSerial):
+    """Execution worker, that executes in local folder, as a coroutine.
+
+    Only the execution is concurrent,
+    reading and caching notebooks is performed synchronously, in the calling process.
+    """
 
     @staticmethod
-    def execute(project_nb: ProjectNb, data: ProcessData) -> ExecutionResult:
+    async def async_execute(
+        project_nb: ProjectNb, data: ProcessData
+    ) -> ExecutionResult:
         cwd = str(Path(project_nb.uri).parent)
-        return single_nb_execution(
+        return await async_single_nb_execution(
             project_nb.nb,
             cwd=cwd,
             timeout=data.timeout,
             allow_errors=data.allow_errors,
         )
 
+    async def async_call(self, data: ProcessData) -> tuple[int, str]:
+        # notebooks execute concurrently, so each is traced on its own track
+        set_track(data.pk)
+        if data.queued_us is not None:
+            add_span("queue wait", data.queued_us, uri=data.uri)
+        project_nb = self.get_project_notebook(data)
+        if project_nb is None:
+            return (2, data.uri)
 
-class ExecutionWorkerTempMProc(ExecutionWorkerBase):
-    """Execution worker, that executes in temporary folder."""
+        try:
+            self.log_info("Executing: %s" % project_nb.uri)
+            with span("execute", uri=project_nb.uri):
+                result = await self.async_execute(project_nb, data)
+        except Exception:
+            self.logger.error(
+                "Failed Executing: %s" % data.uri,
+                exc_info=True,
+            )
+            return (2, data.uri)
+
+        return self.cache_result(project_nb, data, result)
+
+
+class ExecutionWorkerMProcBase(ExecutionWorkerBase):
+    """Base execution worker, that executes in a worker process."""
 
     @property
     def logger(self) -> logging.Logger:
@@ -172,16 +443,46 @@ class ExecutionWorkerTempMProc(ExecutionWorkerBase):
         # multiprocessing logs a lot at info level that we do not want to see
         self.logger.log(REPORT_LEVEL, msg)
 
+    def __call__(self, data: ProcessData) -> tuple[int, str]:
+        try:
+            return super().__call__(data)
+        finally:
+            # the cache is unpickled for each notebook,
+            # so its buffered metrics are written before it is discarded
+            data.cache.flush_metrics()
+
+
+class ExecutionWorkerLocalMProc(ExecutionWorkerMProcBase):
+    """Execution worker, that executes in local folder."""
+
     @staticmethod
     def execute(project_nb: ProjectNb, data: ProcessData) -> ExecutionResult:
+        cwd = str(Path(project_nb.uri).parent)
+        return single_nb_execution(
+            project_nb.nb,
+            cwd=cwd,
+            timeout=data.timeout,
+            allow_errors=data.allow_errors,
+        )
+
+
+class ExecutionWorkerTempMProc(ExecutionWorkerMProcBase):
+    """Execution worker, that executes in temporary folder."""
+
+    def execute(self, project_nb: ProjectNb, data: ProcessData) -> ExecutionResult:
         with tempfile.TemporaryDirectory() as cwd:
             copy_assets(project_nb.uri, project_nb.assets, cwd)
-            return single_nb_execution(
+            before = folder_digests(cwd)
+            result = single_nb_execution(
                 project_nb.nb,
                 cwd=cwd,
                 timeout=data.timeout,
                 allow_errors=data.allow_errors,
             )
+            result.artifacts = collect_artifacts(
+                cwd, before, data.artifacts, self.logger
+            )
+            return result
 
 
 class JupyterExecutorLocalSerial(JupyterExecutorAbstract):
@@ -197,21 +498,41 @@ class JupyterExecutorLocalSerial(JupyterExecutorAbstract):
         timeout=30,
         allow_errors=False,
         force=False,
+        retry_failed=False,
+        artifacts=None,
     ) -> ExecutorRunResult:
+        """Run execution, cache successfully executed notebooks and return their URIs
+
+        :param artifacts: The ``ArtifactOptions`` for collecting files created
+            by executions (temporary folder executors only)
+        """
         # Get the notebook that require re-execution
-        execute_records = self.get_records(
-            filter_uris, filter_pks, clear_tracebacks=True, force=force
+        execute_data = get_process_data(
+            self,
+            filter_uris,
+            filter_pks,
+            timeout,
+            allow_errors,
+            force,
+            artifacts,
+            retry_failed,
         )
 
-        self.logger.info("Executing %s notebook(s) in serial" % len(execute_records))
+        scheduler = DependencyScheduler(self.cache, execute_data, logger=self.logger)
+
+        self.logger.info("Executing %s notebook(s) in serial" % len(execute_data))
 
-        results = [
-            self._EXECUTION_WORKER(self.logger)(
-                ProcessData(record.pk, record.uri, self.cache, timeout, allow_errors)
+        worker = self._EXECUTION_WORKER(self.logger)
+        results = []
+        for data in scheduler:
+            status, uri = worker(data)
+            results.append((status, uri))
+            results.extend(
+                (2, skipped) for skipped in scheduler.complete(uri, status == 0)
             )
-            for record in execute_records
-        ]
 
+        # write the metrics buffered during the run
+        self.cache.flush_metrics()
         return ExecutorRunResult(
             succeeded=[p for i, p in results if i == 0],
             excepted=[p for i, p in results if i == 1],
@@ -225,12 +546,146 @@ class JupyterExecutorTempSerial(JupyterExecutorLocalSerial):
     _EXECUTION_WORKER = ExecutionWorkerTempSerial
 
 
+class JupyterExecutorLocalPooled(JupyterExecutorAbstract):
+    """An implementation of an executor; executing locally in serial,
+    with a pool of pre-started kernels.
+    """
+
+    _EXECUTION_WORKER = ExecutionWorkerLocalPooled
+
+    def get_kernel_names(self, execute_data: list[ProcessData]) -> list[str]:
+        """Return the kernelspec names of the notebooks, in order of first use."""
+        names = []
+        for data in execute_data:
+            try:
+                name = _kernel_name(
+                    data.project_nb or self.cache.get_project_notebook(data.pk)
+                )
+            except Exception:
+                # read errors are reported on execution
+                continue
+            if name not in names:
+                names.append(name)
+        return names
+
+    def run_and_cache(
+        self,
+        *,
+        filter_uris=None,
+        filter_pks=None,
+        timeout=30,
+        allow_errors=False,
+        force=False,
+        retry_failed=False,
+        pool_size=2,
+        max_kernel_uses=1,
+        artifacts=None,
+    ) -> ExecutorRunResult:
+        """Run execution, cache successfully executed notebooks and return their URIs
+
+        :param pool_size: The number of kernels to keep started, per kernelspec
+        :param max_kernel_uses: The number of notebooks to execute with a kernel,
+            before it is restarted (notebooks will share kernel state if > 1)
+        :param artifacts: The ``ArtifactOptions`` for collecting files created
+            by executions (temporary folder executors only)
+        """
+        # Get the notebook that require re-execution
+        execute_data = get_process_data(
+            self,
+            filter_uris,
+            filter_pks,
+            timeout,
+            allow_errors,
+            force,
+            artifacts,
+            retry_failed,
+        )
+
+        self.logger.info(
+            "Executing %s notebook(s) in serial, with a pool of %s kernel(s)"
+            % (len(execute_data), pool_size)
+        )
+
+        scheduler = DependencyScheduler(self.cache, execute_data, logger=self.logger)
+        with KernelPool(pool_size, max_kernel_uses, logger=self.logger) as pool:
+            # warm up kernels for all kernelspecs, before they are needed
+            for kernel_name in self.get_kernel_names(execute_data):
+                pool.prestart(kernel_name)
+            worker = self._EXECUTION_WORKER(self.logger, pool)
+            results = []
+            for data in scheduler:
+                status, uri = worker(data)
+                results.append((status, uri))
+                results.extend(
+                    (2, skipped) for skipped in scheduler.complete(uri, status == 0)
+                )
+
+        self.logger.info(
+            "Kernel pool saved %.2f second(s) of kernel start-up "
+            "(%s kernel(s) started, %.2f second(s) waited)"
+            % (pool.stats.saved_seconds, pool.stats.started, pool.stats.wait_seconds)
+        )
+
+        # write the metrics buffered during the run
+        self.cache.flush_metrics()
+        return ExecutorRunResult(
+            succeeded=[p for i, p in results if i == 0],
+            excepted=[p for i, p in results if i == 1],
+            errored=[p for i, p in results if i == 2],
+        )
+
+
+class JupyterExecutorTempPooled(JupyterExecutorLocalPooled):
+    """An implementation of an executor; executing in a temporary folder in serial,
+    with a pool of pre-started kernels.
+    """
+
+    _EXECUTION_WORKER = ExecutionWorkerTempPooled
+
+
 class JupyterExecutorLocalMproc(JupyterExecutorAbstract):
     """An implementation of an executor; executing locally in parallel."""
 
     _EXECUTION_WORKER = ExecutionWorkerLocalMProc
 
-    def run_and_cache(
+    def get_worker_count(
+        self,
+        records: Sequence[Union[NbProjectRecord, ProcessData]],
+        workers: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+    ) -> int:
+        """Return the number of processes to execute the notebooks with.
+
+        If the peak memory of the notebooks was recorded by previous executions,
+        the count is capped, so that the notebooks using the most memory
+        can all execute concurrently, within the memory limit.
+
+        :param workers: The maximum number of processes (defaults to the CPU count)
+        :param memory_limit: The memory (in bytes) available to the executing kernels
+            (defaults to the currently available system memory)
+        """
+        count = workers or os.cpu_count() or 1
+        peaks = [
+            data["peak_memory_bytes"]
+            for data in get_latest_cache_data(
+                self.cache, [r.uri for r in records]
+            ).values()
+            if data.get("peak_memory_bytes")
+        ]
+        if peaks:
+            if memory_limit is None:
+                memory_limit = available_memory()
+            if memory_limit is not None:
+                memory_count = max(1, int(memory_limit // max(peaks)))
+                if memory_count < count:
+                    self.logger.info(
+                        "Limiting to %s process(es), for peak notebook memory of %.1f MB"
+                        % (memory_count, max(peaks) / 1e6)
+                    )
+                    count = memory_count
+        return max(1, min(count, len(records)))
+
+    def iter_run_and_cache(
         self,
         *,
         filter_uris=None,
@@ -238,30 +693,192 @@ class JupyterExecutorLocalMproc(JupyterExecutorAbstract):
         timeout=30,
         allow_errors=False,
         force=False,
-    ) -> ExecutorRunResult:
+        retry_failed=False,
+        workers=None,
+        memory_limit=None,
+        fail_fast=False,
+        single_writer=False,
+        artifacts=None,
+    ) -> Iterator[tuple[int, str]]:
+        """Run execution, yielding each notebook's result as soon as it is cached.
+
+        Results are yielded in order of completion, as ``(status, uri)``,
+        where status is 0 (succeeded), 1 (excepted) or 2 (errored).
+
+        :param workers: The maximum number of processes (defaults to the CPU count)
+        :param memory_limit: The memory (in bytes) available to the executing kernels
+            (defaults to the currently available system memory)
+        :param fail_fast: On the first failed notebook, cancel all notebooks
+            that have not yet started executing
+        :param single_writer: Return executed notebooks to this process,
+            to be cached by a single writer thread (which truncates the cache
+            once per batch of queued commits), rather than each process
+            writing to the cache
+        :param artifacts: The ``ArtifactOptions`` for collecting files created
+            by executions (temporary folder executors only)
+        """
         # Get the notebook that require re-execution
-        execute_records = self.get_records(
-            filter_uris, filter_pks, clear_tracebacks=True
+        execute_data = get_process_data(
+            self,
+            filter_uris,
+            filter_pks,
+            timeout,
+            allow_errors,
+            force,
+            artifacts,
+            retry_failed,
+        )
+        workers = self.get_worker_count(execute_data, workers, memory_limit)
+
+        # schedule the longest expected executions first,
+        # so that a long execution does not start when the others are finishing
+        predicted = predict_execution_seconds(self.cache, [d.uri for d in execute_data])
+        execute_data = sorted(
+            execute_data, key=lambda d: predicted[d.uri], reverse=True
+        )
+        # notebooks are only started once the notebooks they depend on have succeeded
+        scheduler = DependencyScheduler(
+            self.cache, execute_data, predicted, logger=self.logger
         )
 
         self.logger.info(
-            "Executing %s notebook(s) over pool of %s processors"
-            % (len(execute_records), os.cpu_count())
+            "Executing %s notebook(s) over pool of %s processes"
+            % (len(execute_data), workers)
         )
         mproc.log_to_stderr(
             REPORT_LEVEL if self.logger.level == logging.INFO else self.logger.level
         )
 
-        with mproc.Pool() as pool:
-            results = pool.map(
-                self._EXECUTION_WORKER(),
-                [
-                    ProcessData(
-                        record.pk, record.uri, self.cache, timeout, allow_errors
-                    )
-                    for record in execute_records
-                ],
+        worker = self._EXECUTION_WORKER()
+        completed = 0
+        with ExitStack() as stack:
+            writer = (
+                stack.enter_context(CacheWriter(self.cache, self.logger))
+                if single_writer
+                else None
             )
+            timer = stack.enter_context(Timer())
+            pool = stack.enter_context(ProcessPoolExecutor(workers))
+            # only submit a notebook when a process becomes free,
+            # so that the order is kept and outstanding notebooks can be cancelled
+            executing: dict[Future, ProcessData] = {}
+            committing: set[Future] = set()
+            while scheduler or executing or committing:
+                while len(executing) < workers:
+                    data = scheduler.pop()
+                    if data is None:
+                        break
+                    if writer is None:
+                        executing[pool.submit(worker, data)] = data
+                    else:
+                        executing[pool.submit(worker.execute_data, data)] = data
+                done, _ = wait(
+                    set(executing).union(committing), return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    if future in committing:
+                        committing.remove(future)
+                        status, uri = future.result()
+                    elif writer is None:
+                        executing.pop(future)
+                        status, uri = future.result()
+                    else:
+                        data = executing.pop(future)
+                        executed = future.result()
+                        if executed is not None:
+                            committing.add(
+                                writer.submit(
+                                    partial(
+                                        worker.cache_result,
+                                        executed[0],
+                                        data,
+                                        executed[1],
+                                        truncate=False,
+                                    )
+                                )
+                            )
+                            continue
+                        status, uri = (2, data.uri)
+                    skipped = scheduler.complete(uri, status == 0)
+                    for result in [(status, uri)] + [(2, u) for u in skipped]:
+                        completed += 1
+                        self.logger.info(
+                            "[%s/%s] %s: %s"
+                            % (
+                                completed,
+                                len(execute_data),
+                                _RESULT_NAMES[result[0]],
+                                result[1],
+                            )
+                        )
+                        yield result
+                    if status != 0 and fail_fast and scheduler:
+                        self.logger.warning(
+                            "Cancelled %s notebook(s), after failure of: %s"
+                            % (scheduler.clear(), uri)
+                        )
+        if writer is not None:
+            self.logger.info(
+                "Cached %s notebook(s) in %s batch(es)"
+                % (writer.stats.commits, writer.stats.batches)
+            )
+        self.logger.info(
+            "Execution makespan: %.2f seconds (predicted %.2f seconds)"
+            % (
+                timer.last_split,
+                predict_makespan([predicted[d.uri] for d in execute_data], workers),
+            )
+        )
+
+    def run_and_cache(
+        self,
+        *,
+        filter_uris=None,
+        filter_pks=None,
+        timeout=30,
+        allow_errors=False,
+        force=False,
+        retry_failed=False,
+        workers=None,
+        memory_limit=None,
+        fail_fast=False,
+        single_writer=False,
+        artifacts=None,
+        callback: Optional[Callable[[int, str], None]] = None,
+    ) -> ExecutorRunResult:
+        """Run execution, cache successfully executed notebooks and return their URIs
+
+        :param workers: The maximum number of processes (defaults to the CPU count)
+        :param memory_limit: The memory (in bytes) available to the executing kernels
+            (defaults to the currently available system memory)
+        :param fail_fast: On the first failed notebook, cancel all notebooks
+            that have not yet started executing
+        :param single_writer: Return executed notebooks to this process,
+            to be cached by a single writer thread
+        :param artifacts: The ``ArtifactOptions`` for collecting files created
+            by executions (temporary folder executors only)
+        :param callback: Called with ``(status, uri)`` as each notebook finishes,
+            see ``iter_run_and_cache``
+        """
+        results = []
+        for status, uri in self.iter_run_and_cache(
+            filter_uris=filter_uris,
+            filter_pks=filter_pks,
+            timeout=timeout,
+            allow_errors=allow_errors,
+            force=force,
+            retry_failed=retry_failed,
+            workers=workers,
+            memory_limit=memory_limit,
+            fail_fast=fail_fast,
+            single_writer=single_writer,
+            artifacts=artifacts,
+        ):
+            if callback is not None:
+                callback(status, uri)
+            results.append((status, uri))
+        # write the metrics buffered during the run
+        self.cache.flush_metrics()
         return ExecutorRunResult(
             succeeded=[p for i, p in results if i == 0],
             excepted=[p for i, p in results if i == 1],
@@ -273,3 +890,127 @@ class JupyterExecutorTempMproc(JupyterExecutorLocalMproc):
     """An implementation of an executor; executing in a temporary directory and in parallel."""
 
     _EXECUTION_WORKER = ExecutionWorkerTempMProc
+
+
+class JupyterExecutorLocalAsync(JupyterExecutorLocalMproc):
+    """An implementation of an executor; executing locally and concurrently,
+    with the kernels driven from a single event loop.
+
+    Compared to the multiprocessing executors,
+    this avoids starting a python process (and database connection) per worker,
+    and all cache writes are made from the calling process.
+    """
+
+    _EXECUTION_WORKER = ExecutionWorkerLocalAsync
+
+    def iter_run_and_cache(
+        self,
+        *,
+        filter_uris=None,
+        filter_pks=None,
+        timeout=30,
+        allow_errors=False,
+        force=False,
+        retry_failed=False,
+        workers=None,
+        memory_limit=None,
+        fail_fast=False,
+        single_writer=True,
+        artifacts=None,
+    ) -> Iterator[tuple[int, str]]:
+        """Run execution, yielding each notebook's result as soon as it is cached.
+
+        Results are yielded in order of completion, as ``(status, uri)``,
+        where status is 0 (succeeded), 1 (excepted) or 2 (errored).
+
+        :param workers: The maximum number of concurrent executions
+            (defaults to the CPU count)
+        :param memory_limit: The memory (in bytes) available to the executing kernels
+            (defaults to the currently available system memory)
+        :param fail_fast: On the first failed notebook, cancel all notebooks
+            that have not yet started executing
+        :param single_writer: Ignored, notebooks are always cached by this process
+        :param artifacts: Ignored, notebooks are executed in their local folder
+        """
+        # Get the notebook that require re-execution
+        execute_data = get_process_data(
+            self,
+            filter_uris,
+            filter_pks,
+            timeout,
+            allow_errors,
+            force,
+            artifacts,
+            retry_failed,
+        )
+        workers = self.get_worker_count(execute_data, workers, memory_limit)
+
+        # schedule the longest expected executions first
+        predicted = predict_execution_seconds(self.cache, [d.uri for d in execute_data])
+        execute_data = sorted(
+            execute_data, key=lambda d: predicted[d.uri], reverse=True
+        )
+
+        self.logger.info(
+            "Executing %s notebook(s), with %s concurrent kernels"
+            % (len(execute_data), workers)
+        )
+
+        worker = self._EXECUTION_WORKER(self.logger)
+        # notebooks are only started once the notebooks they depend on have succeeded
+        scheduler = DependencyScheduler(
+            self.cache, execute_data, predicted, logger=self.logger
+        )
+        loop = asyncio.new_event_loop()
+        running: set = set()
+        completed = 0
+        try:
+            with Timer() as timer:
+                while scheduler or running:
+                    # only start a notebook when a kernel slot becomes free,
+                    # so that outstanding notebooks can be cancelled
+                    while len(running) < workers:
+                        data = scheduler.pop()
+                        if data is None:
+                            break
+                        running.add(loop.create_task(worker.async_call(data)))
+                    done, running = loop.run_until_complete(
+                        asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    )
+                    for task in done:
+                        status, uri = task.result()
+                        skipped = scheduler.complete(uri, status == 0)
+                        for result in [(status, uri)] + [(2, u) for u in skipped]:
+                            completed += 1
+                            self.logger.info(
+                                "[%s/%s] %s: %s"
+                                % (
+                                    completed,
+                                    len(execute_data),
+                                    _RESULT_NAMES[result[0]],
+                                    result[1],
+                                )
+                            )
+                            yield result
+                        if status != 0 and fail_fast and scheduler:
+                            self.logger.warning(
+                                "Cancelled %s notebook(s), after failure of: %s"
+                                % (scheduler.clear(), uri)
+                            )
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                loop.run_until_complete(
+                    asyncio.gather(*running, return_exceptions=True)
+                )
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+        self.logger.info(
+            "Execution makespan: %.2f seconds (predicted %.2f seconds)"
+            % (
+                timer.last_split,
+                predict_makespan([predicted[d.uri] for d in execute_data], workers),
+            )
+        )
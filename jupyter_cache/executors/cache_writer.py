@@ -0,0 +1,133 @@
+"""Commit execution results to the cache from a single thread.
+
+When many worker processes commit to the cache directly,
+they contend for the SQLite database lock, and each truncates the cache.
+Instead, workers can return their executed notebooks to the parent process,
+which queues the commits to a ``CacheWriter``.
+"""
+
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+import attr
+
+from jupyter_cache.base import JupyterCacheAbstract
+
+base_logger = logging.getLogger(__name__)
+
+
+@attr.s(slots=True)
+class CacheWriterStats:
+    """Statistics on the commits of a writer."""
+
+    # number of commits made
+    commits: int = attr.ib(default=0)
+    # number of batches the commits were made in
+    batches: int = attr.ib(default=0)
+    # the largest number of commits in a batch
+    max_batch: int = attr.ib(default=0)
+
+    def as_json(self) -> dict[str, Any]:
+        """Return the statistics as a JSON serializable dict."""
+        return attr.asdict(self)
+
+
+class CacheWriter:
+    """A single thread, which makes all commits to a cache.
+
+    Commits are made one after another, so that worker processes do not contend
+    for the database lock. Commits queued while the thread is busy are grouped
+    as a batch, after which the cache is truncated (once) to its limit.
+    Note, each commit still makes its own database transactions,
+    only the truncation is shared by the batch.
+    Commit callables should therefore not truncate the cache themselves::
+
+        with CacheWriter(cache) as writer:
+            future = writer.submit(
+                lambda: cache.cache_notebook_bundle(bundle, truncate=False)
+            )
+        record = future.result()
+    """
+
+    def __init__(
+        self, cache: JupyterCacheAbstract, logger: Optional[logging.Logger] = None
+    ) -> None:
+        """Initiate CacheWriter
+
+        :param cache: The cache to truncate, after each batch of commits
+        """
+        self._cache = cache
+        self._logger = logger or base_logger
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="jcache_cache_writer", daemon=True
+        )
+        self._thread.start()
+        self.stats = CacheWriterStats()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._cache!r})"
+
+    def __enter__(self) -> "CacheWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def submit(self, commit: Callable[[], Any]) -> Future:
+        """Queue a commit, returning a future for its result."""
+        future: Future = Future()
+        self._queue.put((commit, future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            closing = False
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if closing:
+                return
+
+    def _commit(self, batch: list) -> None:
+        results = []
+        for commit, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                results.append((future, True, commit()))
+            except BaseException as exc:
+                results.append((future, False, exc))
+        try:
+            self._cache.truncate_caches()
+        except Exception:
+            self._logger.error("Failed truncating cache", exc_info=True)
+        self.stats.commits += len(results)
+        self.stats.batches += 1
+        self.stats.max_batch = max(self.stats.max_batch, len(results))
+        # only report the commits as done once the batch is complete
+        for future, succeeded, value in results:
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def close(self) -> None:
+        """Make all queued commits, then stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
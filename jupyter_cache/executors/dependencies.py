@@ -0,0 +1,220 @@
+"""Scheduling of notebooks by their dependencies on other project notebooks.
+
+A notebook depends on (is downstream of) another notebook in the project,
+if it declares the notebook in ``exec_data["depends_on"]``,
+or if one of its assets is a file the other notebook declares
+in ``exec_data["outputs"]`` (or is in, or contains, such a file).
+"""
+
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+import heapq
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from jupyter_cache.base import JupyterCacheAbstract
+from jupyter_cache.cache.db import NbProjectRecord
+
+if TYPE_CHECKING:
+    from jupyter_cache.executors.basic import ProcessData
+
+base_logger = logging.getLogger(__name__)
+
+
+def project_dependencies(records: Iterable[NbProjectRecord]) -> dict[str, set[str]]:
+    """Return the URIs of the (direct) upstream notebooks of each project notebook.
+
+    Notebooks without dependencies are omitted.
+    """
+    records = list(records)
+    uris = {record.uri for record in records}
+    outputs = [
+        (Path(path).absolute(), record.uri)
+        for record in records
+        for path in (record.exec_data or {}).get("outputs", [])
+    ]
+    upstream = {}
+    for record in records:
+        depends_on = {
+            str(Path(path).absolute())
+            for path in (record.exec_data or {}).get("depends_on", [])
+        }
+        found = depends_on & uris
+        for asset in record.assets:
+            asset = Path(asset).absolute()
+            for output, uri in outputs:
+                if (
+                    output == asset
+                    or output in asset.parents
+                    or asset in output.parents
+                ):
+                    found.add(uri)
+        found.discard(record.uri)
+        if found:
+            upstream[record.uri] = found
+    return upstream
+
+
+def downstream_notebooks(
+    upstream: Mapping[str, Iterable[str]], uris: Iterable[str]
+) -> set[str]:
+    """Return the URIs of all notebooks (transitively) downstream of the given URIs."""
+    downstream: dict[str, set[str]] = {}
+    for uri, upstream_uris in upstream.items():
+        for upstream_uri in upstream_uris:
+            downstream.setdefault(upstream_uri, set()).add(uri)
+    found: set[str] = set()
+    stack = list(uris)
+    while stack:
+        for uri in downstream.get(stack.pop(), ()):
+            if uri not in found:
+                found.add(uri)
+                stack.append(uri)
+    return found
+
+
+class DependencyScheduler:
+    """Release notebooks for execution, once their upstream notebooks have succeeded.
+
+    Only dependencies between the notebooks to execute are waited on.
+    Ready notebooks are released longest critical path first
+    (their predicted duration, plus that of the longest chain downstream),
+    then in the order given.
+
+    When a notebook succeeds, the cached executions of all notebooks downstream
+    (in the whole project) are invalidated, since they used the previous outputs.
+    When it fails, the notebooks downstream of it are skipped.
+    In serial, the scheduler can simply be iterated over::
+
+        for data in scheduler:
+            status, uri = worker(data)
+            skipped = scheduler.complete(uri, status == 0)
+    """
+
+    def __init__(
+        self,
+        cache: JupyterCacheAbstract,
+        execute_data: Sequence["ProcessData"],
+        durations: Optional[Mapping[str, float]] = None,
+        upstream: Optional[Mapping[str, Iterable[str]]] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """Initiate DependencyScheduler
+
+        :param durations: The predicted execution time of each notebook URI
+        :param upstream: The upstream notebooks of each notebook in the project
+            (defaults to ``project_dependencies`` of the cache's project)
+        :raises ValueError: If the notebooks to execute have cyclic dependencies
+        """
+        self._cache = cache
+        self._logger = logger or base_logger
+        if upstream is None:
+            upstream = project_dependencies(cache.list_project_records())
+        self._project_upstream = upstream
+        self._data = {data.uri: data for data in execute_data}
+        self._upstream = {
+            uri: set(upstream.get(uri, ())).intersection(self._data)
+            for uri in self._data
+        }
+        self._downstream: dict[str, set[str]] = {uri: set() for uri in self._data}
+        for uri, upstream_uris in self._upstream.items():
+            for upstream_uri in upstream_uris:
+                self._downstream[upstream_uri].add(uri)
+
+        ordered = self._topological_order()
+        durations = durations or {}
+        critical: dict[str, float] = {}
+        for uri in reversed(ordered):
+            critical[uri] = durations.get(uri, 0.0) + max(
+                (critical[d] for d in self._downstream[uri]), default=0.0
+            )
+        index = {uri: i for i, uri in enumerate(self._data)}
+        self._priority = {uri: (-critical[uri], index[uri]) for uri in self._data}
+
+        self._waiting = {uri: len(ups) for uri, ups in self._upstream.items()}
+        self._pending = set(self._data)
+        self._ready = [
+            (self._priority[uri], uri) for uri, n in self._waiting.items() if n == 0
+        ]
+        heapq.heapify(self._ready)
+
+    def _topological_order(self) -> list[str]:
+        waiting = {uri: len(ups) for uri, ups in self._upstream.items()}
+        ready = [uri for uri, n in waiting.items() if n == 0]
+        ordered = []
+        while ready:
+            uri = ready.pop()
+            ordered.append(uri)
+            for downstream in self._downstream[uri]:
+                waiting[downstream] -= 1
+                if waiting[downstream] == 0:
+                    ready.append(downstream)
+        if len(ordered) < len(self._data):
+            cycle = sorted(set(self._data).difference(ordered))
+            raise ValueError(f"Notebook dependencies form a cycle: {cycle}")
+        return ordered
+
+    def __len__(self) -> int:
+        """Return the number of notebooks not yet released (or skipped)."""
+        return len(self._pending)
+
+    def __iter__(self) -> Iterator["ProcessData"]:
+        while True:
+            data = self.pop()
+            if data is None:
+                return
+            yield data
+
+    def pop(self) -> Optional["ProcessData"]:
+        """Release the next notebook ready for execution,
+        or return None if all remaining notebooks are waiting on others.
+        """
+        if not self._ready:
+            return None
+        _, uri = heapq.heappop(self._ready)
+        self._pending.discard(uri)
+        return self._data[uri]
+
+    def complete(self, uri: str, succeeded: bool) -> list[str]:
+        """Record the result of a released notebook.
+
+        :returns: The URIs of the notebooks skipped, since they depend on a failure
+        """
+        if succeeded:
+            self._invalidate_downstream(uri)
+            for downstream in self._downstream.get(uri, ()):
+                self._waiting[downstream] -= 1
+                if self._waiting[downstream] == 0 and downstream in self._pending:
+                    heapq.heappush(
+                        self._ready, (self._priority[downstream], downstream)
+                    )
+            return []
+        skipped = sorted(
+            downstream_notebooks(self._upstream, [uri]).intersection(self._pending),
+            key=self._priority.get,
+        )
+        self._pending.difference_update(skipped)
+        for skipped_uri in skipped:
+            self._logger.warning(
+                "Skipped, after failure of upstream %s: %s" % (uri, skipped_uri)
+            )
+        return skipped
+
+    def clear(self) -> int:
+        """Cancel all notebooks not yet released, returning their number."""
+        count = len(self._pending)
+        self._pending.clear()
+        self._ready = []
+        return count
+
+    def _invalidate_downstream(self, uri: str) -> None:
+        for downstream in downstream_notebooks(self._project_upstream, [uri]):
+            try:
+                record = self._cache.get_cached_project_nb(downstream)
+            except Exception:
+                continue
+            if record is not None:
+                self._logger.info(
+                    "Invalidating cache of %s, downstream of: %s" % (downstream, uri)
+                )
+                self._cache.remove_cache(record.pk)
@@ -0,0 +1,298 @@
+"""A pool of pre-started kernels, shared across the notebooks of a single run.
+
+Starting a kernel, and waiting for it to be ready, can account for most of the
+execution time of short notebooks.
+The pool starts kernels in background threads, before they are needed,
+and recycles them (by starting a fresh kernel in the background) after use.
+"""
+
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import logging
+import shutil
+import tempfile
+import threading
+from typing import Any, Optional
+
+import attr
+
+from jupyter_cache.utils import Timer
+
+base_logger = logging.getLogger(__name__)
+
+
+@attr.s(slots=True)
+class KernelPoolStats:
+    """Statistics on the kernels of a pool."""
+
+    # number of kernels started
+    started: int = attr.ib(default=0)
+    # number of times a kernel was acquired for execution
+    acquired: int = attr.ib(default=0)
+    # total seconds spent starting kernels (in the background)
+    startup_seconds: float = attr.ib(default=0.0)
+    # total seconds spent waiting for a kernel to be ready, when acquiring
+    wait_seconds: float = attr.ib(default=0.0)
+    # seconds of kernel start-up that execution did not have to wait for
+    saved_seconds: float = attr.ib(default=0.0)
+
+    def as_json(self) -> dict[str, Any]:
+        """Return the statistics as a JSON serializable dict."""
+        return attr.asdict(self)
+
+
+class PooledKernel:
+    """A kernel owned by a ``KernelPool``."""
+
+    def __init__(self, kernel_name: str, cwd: Optional[str] = None) -> None:
+        """Initiate PooledKernel
+
+        :param kernel_name: The name of the kernelspec (default kernel if empty)
+        :param cwd: The working directory to start the kernel in,
+            if None, a private temporary directory is created,
+            which is removed when the kernel is shutdown.
+        """
+        self.kernel_name = kernel_name
+        self.cwd = cwd
+        self.km = None
+        self.uses = 0
+        self.startup_seconds = 0.0
+        self._tempdir: Optional[str] = None
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}"
+            f"(kernel_name={self.kernel_name!r}, cwd={self.workdir!r})"
+        )
+
+    @property
+    def workdir(self) -> Optional[str]:
+        """The directory the kernel was started in."""
+        return self._tempdir if self.cwd is None else self.cwd
+
+    @property
+    def language(self) -> str:
+        """The language of the kernel."""
+        return self.km.kernel_spec.language if self.km is not None else ""
+
+    def start(self, startup_timeout: int = 60) -> "PooledKernel":
+        """Start the kernel, and wait for it to be ready."""
+        from jupyter_client import KernelManager
+
+        if self.cwd is None:
+            self._tempdir = tempfile.mkdtemp(prefix="jcache_kernel_")
+        kwargs = {"kernel_name": self.kernel_name} if self.kernel_name else {}
+        # nbclient communicates with the kernel asynchronously
+        km = KernelManager(
+            client_class="jupyter_client.asynchronous.AsyncKernelClient", **kwargs
+        )
+        with Timer() as timer:
+            km.start_kernel(cwd=self.workdir)
+            kc = km.blocking_client()
+            kc.start_channels()
+            try:
+                kc.wait_for_ready(timeout=startup_timeout)
+            except RuntimeError:
+                km.shutdown_kernel(now=True)
+                raise
+            finally:
+                kc.stop_channels()
+        self.km = km
+        self.startup_seconds = timer.last_split
+        return self
+
+    def chdir(self, path: str, timeout: int = 60) -> None:
+        """Change the working directory of a running (python) kernel.
+
+        :raises RuntimeError: if the directory could not be changed
+        """
+        kc = self.km.blocking_client()
+        kc.start_channels()
+        try:
+            reply = kc.execute(
+                f"__import__('os').chdir({str(path)!r})",
+                silent=True,
+                store_history=False,
+                reply=True,
+                timeout=timeout,
+            )
+        finally:
+            kc.stop_channels()
+        if reply["content"]["status"] != "ok":
+            raise RuntimeError(f"Failed to change kernel directory to: {path}")
+
+    def is_alive(self) -> bool:
+        return self.km is not None and self.km.is_alive()
+
+    def shutdown(self) -> None:
+        """Shutdown the kernel, and remove any temporary directory."""
+        if self.km is not None:
+            try:
+                self.km.shutdown_kernel(now=True)
+            except Exception:
+                base_logger.debug("Failed to shutdown kernel: %s", self, exc_info=True)
+            self.km = None
+        if self._tempdir is not None:
+            shutil.rmtree(self._tempdir, ignore_errors=True)
+            self._tempdir = None
+
+
+class KernelPool:
+    """A pool of pre-started kernels, keyed by kernelspec name.
+
+    Pooled kernels are started in a private temporary directory,
+    and python kernels are moved to the requested working directory on acquisition.
+    Use as a context manager, to ensure all kernels are shutdown on exit::
+
+        with KernelPool() as pool:
+            with pool.kernel("python3", cwd) as kernel:
+                single_nb_execution(nb, cwd, timeout, allow_errors, km=kernel.km)
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_uses: int = 1,
+        startup_timeout: int = 60,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """Initiate KernelPool
+
+        :param size: The number of kernels to keep per kernelspec, one kernel can be
+            executing while the others are (re)started in the background.
+        :param max_uses: The number of notebooks executed by a kernel before it
+            is recycled. Note, a value above 1 means that notebooks share the
+            kernel state (variables, imports, files, etc) of previous executions.
+        :param startup_timeout: Seconds to wait for a new kernel to be ready.
+        """
+        assert isinstance(size, int) and size > 0, "size must be a positive integer"
+        assert (
+            isinstance(max_uses, int) and max_uses > 0
+        ), "max_uses must be a positive integer"
+        self._size = size
+        self._max_uses = max_uses
+        self._startup_timeout = startup_timeout
+        self._logger = logger or base_logger
+        self._lock = threading.Lock()
+        self._kernels: dict[str, list[Future]] = {}
+        self._threads = ThreadPoolExecutor(thread_name_prefix="jcache_kernel_pool")
+        self.stats = KernelPoolStats()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(size={self._size}, max_uses={self._max_uses})"
+        )
+
+    def __enter__(self) -> "KernelPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def _start(self, kernel: PooledKernel) -> PooledKernel:
+        kernel.start(self._startup_timeout)
+        with self._lock:
+            self.stats.started += 1
+            self.stats.startup_seconds += kernel.startup_seconds
+        self._logger.debug(
+            "Started kernel in %.2f seconds: %s", kernel.startup_seconds, kernel
+        )
+        return kernel
+
+    def _recycle(self, kernel: PooledKernel) -> PooledKernel:
+        kernel.shutdown()
+        return self._start(PooledKernel(kernel.kernel_name))
+
+    def _release(self, kernel: PooledKernel, used: bool = True) -> None:
+        """Return a kernel to the pool, recycling it if it has been used up.
+
+        :param used: Whether the kernel executed a notebook
+        """
+        if used:
+            kernel.uses += 1
+        if kernel.uses < self._max_uses and kernel.is_alive():
+            returned = Future()
+            returned.set_result(kernel)
+        else:
+            returned = self._threads.submit(self._recycle, kernel)
+        with self._lock:
+            self._kernels.setdefault(kernel.kernel_name, []).append(returned)
+
+    def prestart(self, kernel_name: str) -> None:
+        """Start kernels in the background, until the pool is full for this kernelspec.
+
+        :param kernel_name: The name of the kernelspec (default kernel if empty)
+        """
+        with self._lock:
+            futures = self._kernels.setdefault(kernel_name, [])
+            while len(futures) < self._size:
+                futures.append(
+                    self._threads.submit(self._start, PooledKernel(kernel_name))
+                )
+
+    @contextmanager
+    def kernel(
+        self, kernel_name: str, cwd: Optional[str] = None
+    ) -> Iterator[PooledKernel]:
+        """Acquire a ready kernel, returning it to the pool on exit.
+
+        :param kernel_name: The name of the kernelspec (default kernel if empty)
+        :param cwd: The working directory for the kernel,
+            if None, the kernel runs in its own temporary directory.
+            Non-python kernels cannot change directory,
+            so a dedicated kernel is started (and not pooled) in this case.
+        """
+        self.prestart(kernel_name)
+        with self._lock:
+            futures = self._kernels[kernel_name]
+            future = next((f for f in futures if f.done()), futures[0])
+            futures.remove(future)
+        try:
+            with Timer() as timer:
+                kernel: PooledKernel = future.result()
+                if cwd is not None and kernel.language == "python":
+                    kernel.chdir(cwd, self._startup_timeout)
+        except Exception:
+            # replace the failed kernel, for the next acquisition
+            self.prestart(kernel_name)
+            raise
+
+        if cwd is not None and kernel.language != "python":
+            # the pooled kernel is not used, so is returned as is
+            self._release(kernel, used=False)
+            with Timer() as timer:
+                dedicated = PooledKernel(kernel_name, cwd).start(self._startup_timeout)
+            with self._lock:
+                self.stats.started += 1
+                self.stats.acquired += 1
+                self.stats.startup_seconds += dedicated.startup_seconds
+                self.stats.wait_seconds += timer.last_split
+            try:
+                yield dedicated
+            finally:
+                dedicated.shutdown()
+            return
+
+        with self._lock:
+            self.stats.acquired += 1
+            self.stats.wait_seconds += timer.last_split
+            self.stats.saved_seconds += max(
+                kernel.startup_seconds - timer.last_split, 0.0
+            )
+        try:
+            yield kernel
+        finally:
+            self._release(kernel)
+
+    def shutdown(self) -> None:
+        """Shutdown all kernels in the pool."""
+        with self._lock:
+            futures = [f for fs in self._kernels.values() for f in fs]
+            self._kernels = {}
+        for future in futures:
+            try:
+                future.result().shutdown()
+            except Exception:
+                pass
+        self._threads.shutdown()
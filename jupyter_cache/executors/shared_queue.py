@@ -0,0 +1,209 @@
+"""An executor that shares the execution of a project between multiple machines.
+
+Each executor claims notebooks from a queue of leases, stored in the cache database,
+so that (with the cache on a shared file system)
+running the executor on several machines executes each notebook once::
+
+    jcache project execute --executor shared-queue --queue-id "$CI_PIPELINE_ID"
+
+A lease is renewed while its notebook executes, and if its executor dies,
+the lease expires and the notebook is claimed by another executor.
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Optional
+import uuid
+
+import attr
+
+from jupyter_cache.cache.db import NbCacheRecord, NbLeaseRecord
+from jupyter_cache.executors.base import ExecutorRunResult, JupyterExecutorAbstract
+from jupyter_cache.executors.basic import (
+    ExecutionWorkerLocalSerial,
+    ProcessData,
+    get_process_data,
+)
+from jupyter_cache.executors.dependencies import project_dependencies
+from jupyter_cache.executors.utils import predict_execution_seconds
+
+
+class LeaseHeartbeat:
+    """Renew a lease in a background thread, until stopped."""
+
+    def __init__(
+        self,
+        queue: str,
+        hashkey: str,
+        owner: str,
+        seconds: float,
+        executor: JupyterExecutorAbstract,
+    ) -> None:
+        self._args = (queue, hashkey, owner, seconds)
+        self._executor = executor
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="jcache_lease_heartbeat", daemon=True
+        )
+        # set if the lease could not be renewed
+        self.lost = False
+
+    def _run(self) -> None:
+        # renew well before expiry, to allow for slow database access
+        while not self._stop.wait(self._args[3] / 3):
+            try:
+                renewed = NbLeaseRecord.renew(*self._args, self._executor.cache.db)
+            except Exception:
+                self._executor.logger.warning("Failed renewing lease", exc_info=True)
+                continue
+            if not renewed:
+                self.lost = True
+                return
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class JupyterExecutorSharedQueue(JupyterExecutorAbstract):
+    """An implementation of an executor; executing locally in serial,
+    claiming notebooks from a queue shared with other executors.
+
+    Run one executor per machine (or more, for concurrency on the same machine).
+    """
+
+    _EXECUTION_WORKER = ExecutionWorkerLocalSerial
+
+    def hash_data(self, data: ProcessData) -> Optional[ProcessData]:
+        """Return the data with the notebook read and hashed,
+        since notebooks are leased by their hashkey,
+        or None if the notebook cannot be read.
+        """
+        project_nb = data.project_nb
+        if project_nb is not None and project_nb.hashkey is not None:
+            return data
+        if project_nb is None:
+            try:
+                project_nb = self.cache.get_project_notebook(data.pk)
+            except Exception:
+                return None
+        hashkey = self.cache.hash_project_notebook(project_nb)
+        return data._replace(project_nb=attr.evolve(project_nb, hashkey=hashkey))
+
+    def run_and_cache(
+        self,
+        *,
+        filter_uris=None,
+        filter_pks=None,
+        timeout=30,
+        allow_errors=False,
+        force=False,
+        retry_failed=False,
+        queue_id=None,
+        lease_seconds=60,
+        poll_seconds=5,
+    ) -> ExecutorRunResult:
+        """Run execution, cache successfully executed notebooks and return their URIs
+
+        Only the notebooks executed by this executor are returned.
+
+        :param queue_id: The queue shared by executors of the same run.
+            Notebooks are executed at most once per queue (including failures),
+            so a new ID should be used for each run, e.g. a CI pipeline ID
+            (defaults to the ``JCACHE_QUEUE_ID`` environment variable,
+            or ``"default"``)
+        :param lease_seconds: The time after which the lease on a notebook expires,
+            if not renewed by its executor
+        :param poll_seconds: The time to wait, before checking again for notebooks
+            whose lease (held by another executor) has expired
+        """
+        queue = queue_id or os.environ.get("JCACHE_QUEUE_ID") or "default"
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        NbLeaseRecord.create_table(self.cache.db)
+
+        execute_data = get_process_data(
+            self,
+            filter_uris,
+            filter_pks,
+            timeout,
+            allow_errors,
+            force,
+            retry_failed=retry_failed,
+        )
+        # claim the longest expected executions first
+        predicted = predict_execution_seconds(self.cache, [d.uri for d in execute_data])
+        execute_data = sorted(
+            execute_data, key=lambda d: predicted[d.uri], reverse=True
+        )
+
+        upstream = project_dependencies(self.cache.list_project_records())
+        if any(data.uri in upstream for data in execute_data):
+            self.logger.warning(
+                "Notebook dependencies are not waited on by this executor, "
+                "since notebooks may be executed by other executors"
+            )
+
+        self.logger.info(
+            "Executing up to %s notebook(s) from queue %r, as %s"
+            % (len(execute_data), queue, owner)
+        )
+
+        worker = self._EXECUTION_WORKER(self.logger)
+        results = []
+        pending = {}
+        for data in execute_data:
+            hashed = self.hash_data(data)
+            if hashed is None:
+                # let the worker report the failure to read the notebook
+                results.append(worker(data))
+            else:
+                pending[hashed.project_nb.hashkey] = hashed
+
+        while pending:
+            for key, data in list(pending.items()):
+                if not NbLeaseRecord.claim(
+                    queue, key, data.uri, owner, lease_seconds, self.cache.db
+                ):
+                    continue
+                pending.pop(key)
+                if not force and self._is_cached(key):
+                    # executed by another executor, since the notebooks were listed
+                    NbLeaseRecord.complete(queue, key, owner, self.cache.db)
+                    continue
+                with LeaseHeartbeat(queue, key, owner, lease_seconds, self) as beat:
+                    result = worker(data)
+                if beat.lost or not NbLeaseRecord.complete(
+                    queue, key, owner, self.cache.db
+                ):
+                    self.logger.warning("Lease expired during execution: %s" % data.uri)
+                results.append(result)
+            # notebooks completed by other executors no longer need to be claimed
+            for record in NbLeaseRecord.records_from_queue(queue, self.cache.db):
+                if record.done:
+                    pending.pop(record.hashkey, None)
+            if pending:
+                self.logger.debug(
+                    "Waiting on %s notebook(s) leased by other executors" % len(pending)
+                )
+                time.sleep(poll_seconds)
+
+        # write the metrics buffered during the run
+        self.cache.flush_metrics()
+        return ExecutorRunResult(
+            succeeded=[p for i, p in results if i == 0],
+            excepted=[p for i, p in results if i == 1],
+            errored=[p for i, p in results if i == 2],
+        )
+
+    def _is_cached(self, hashkey: str) -> bool:
+        try:
+            NbCacheRecord.record_from_hashkey(hashkey, self.cache.db)
+        except KeyError:
+            return False
+        return True
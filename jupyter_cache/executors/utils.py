@@ -1,16 +1,34 @@
+from collections.abc import Iterable
+from contextlib import asynccontextmanager
+import heapq
+import logging
+import os
 from pathlib import Path
 import shutil
 import traceback
 from typing import Any, Optional, Union
 
 import attr
-from nbclient import execute as executenb
+from nbclient import NotebookClient
 from nbclient.client import CellExecutionError, CellTimeoutError
 from nbformat import NotebookNode
 
-from jupyter_cache.base import CacheBundleIn, ProjectNb
-from jupyter_cache.cache.main import NbArtifacts
-from jupyter_cache.utils import Timer, to_relative_paths
+from jupyter_cache.base import (
+    CacheBundleIn,
+    JupyterCacheAbstract,
+    NbArtifactsAbstract,
+    ProjectNb,
+)
+from jupyter_cache.cache.db import NbProjectRecord
+from jupyter_cache.cache.main import NbArtifacts, NbArtifactsInMemory
+from jupyter_cache.tracing import add_span, now_us
+from jupyter_cache.utils import (
+    CELL_SECONDS_KEY,
+    Timer,
+    file_digest,
+    get_latest_cache_data,
+    to_relative_paths,
+)
 
 
 @attr.s()
@@ -20,6 +38,278 @@ class ExecutionResult:
     time: float = attr.ib()
     err: Optional[Union[CellExecutionError, CellTimeoutError]] = attr.ib(default=None)
     exc_string: Optional[str] = attr.ib(default=None)
+    # additional data on the execution, to store in the cache record
+    data: dict = attr.ib(factory=dict)
+    # files created by the execution, to store in the cache
+    artifacts: Optional[NbArtifactsAbstract] = attr.ib(default=None)
+
+
+@attr.s(frozen=True, slots=True)
+class ArtifactOptions:
+    """Options for collecting the files created by an execution, as artifacts."""
+
+    # glob patterns (relative to the execution folder) of files to collect
+    include: tuple[str, ...] = attr.ib(default=("**/*",), converter=tuple)
+    # glob patterns of files not to collect
+    exclude: tuple[str, ...] = attr.ib(default=(), converter=tuple)
+    # the maximum size (in bytes) of a file to collect
+    max_file_size: Optional[int] = attr.ib(default=10 * 2**20)
+    # the maximum size (in bytes) of all files collected for an execution
+    max_total_size: Optional[int] = attr.ib(default=100 * 2**20)
+
+
+def kernel_pid(km) -> Optional[int]:
+    """Return the process ID of a running kernel, if available."""
+    provisioner = getattr(km, "provisioner", None)  # jupyter_client >= 7
+    if provisioner is not None:
+        return getattr(provisioner, "pid", None)
+    return getattr(getattr(km, "kernel", None), "pid", None)
+
+
+def process_peak_memory(pid: int) -> Optional[int]:
+    """Return the peak resident memory (in bytes) of a running process.
+
+    This is read from ``/proc`` on Linux, or from ``psutil`` on Windows (if installed).
+    None is returned if the peak is not available on the platform.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        # only available on windows
+        return getattr(psutil.Process(pid).memory_info(), "peak_wset", None)
+    except psutil.Error:
+        return None
+
+
+def process_cpu_times(pid: int) -> Optional[tuple[float, float]]:
+    """Return the (user, system) CPU seconds used by a running process.
+
+    This is read from ``/proc`` on Linux, or from ``psutil`` (if installed).
+    None is returned if the times are not available on the platform.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as handle:
+            # the process name (in brackets) may contain spaces
+            fields = handle.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        return int(fields[11]) / ticks, int(fields[12]) / ticks
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        times = psutil.Process(pid).cpu_times()
+    except psutil.Error:
+        return None
+    return times.user, times.system
+
+
+def available_memory() -> Optional[int]:
+    """Return the memory (in bytes) available for starting new processes."""
+    try:
+        with open("/proc/meminfo") as handle:
+            for line in handle:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.virtual_memory().available
+
+
+def predict_execution_seconds(
+    cache: JupyterCacheAbstract, uris: Iterable[str]
+) -> dict[str, float]:
+    """Predict the execution time of each notebook URI,
+    from the most recent cache record of the same URI.
+
+    URIs without a recorded time are predicted as the mean of the recorded times
+    (or zero, if there are none).
+    """
+    uris = list(uris)
+    recorded = {
+        uri: float(data["execution_seconds"])
+        for uri, data in get_latest_cache_data(cache, uris).items()
+        if data.get("execution_seconds") is not None
+    }
+    default = sum(recorded.values()) / len(recorded) if recorded else 0.0
+    return {uri: recorded.get(uri, default) for uri in uris}
+
+
+def predict_makespan(durations: Iterable[float], workers: int) -> float:
+    """Predict the total time to run tasks, in the given order,
+    on workers which each pull the next task when they become free.
+    """
+    loads = [0.0] * max(workers, 1)
+    for duration in durations:
+        heapq.heappush(loads, heapq.heappop(loads) + duration)
+    return max(loads)
+
+
+def partition_by_duration(durations: dict[str, float], count: int) -> list[list[str]]:
+    """Partition tasks into groups with similar total durations.
+
+    Tasks are assigned longest first, to the group with the least total duration
+    (then the fewest tasks, then the lowest index).
+    The result does not depend on the order of ``durations``,
+    so independent processes (e.g. CI jobs) compute the same partition.
+    """
+    groups: list[list[str]] = [[] for _ in range(count)]
+    loads = [(0.0, 0, index) for index in range(count)]
+    for key in sorted(durations, key=lambda k: (-durations[k], k)):
+        load, size, index = heapq.heappop(loads)
+        groups[index].append(key)
+        heapq.heappush(loads, (load + durations[key], size + 1, index))
+    return groups
+
+
+def shard_project(
+    cache: JupyterCacheAbstract, index: int, count: int
+) -> list[NbProjectRecord]:
+    """Return the project records in one of ``count`` shards of the project.
+
+    Shards are balanced by the execution time predicted for each notebook
+    (see ``predict_execution_seconds``), regardless of whether it is up-to-date,
+    so that the partition is stable between runs.
+
+    :param index: The shard to return, from 1 to ``count``
+    """
+    if not 1 <= index <= count:
+        raise ValueError(f"shard index must be between 1 and {count}: {index}")
+    records = {record.uri: record for record in cache.list_project_records()}
+    groups = partition_by_duration(predict_execution_seconds(cache, records), count)
+    return [records[uri] for uri in groups[index - 1]]
+
+
+class MeasuredNotebookClient(NotebookClient):
+    """A notebook client, which measures the resources used by the kernel."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # seconds until the kernel was ready (near zero for a pre-started kernel)
+        self.kernel_startup_seconds: Optional[float] = None
+        # peak resident memory of the kernel process
+        self.peak_memory: Optional[int] = None
+        # (user, system) CPU seconds used by the kernel process, during execution
+        self.cpu_times: Optional[tuple[float, float]] = None
+        # the execution time of each code cell, by cell index
+        self.cell_seconds: dict[int, float] = {}
+
+    async def async_execute_cell(
+        self,
+        cell: NotebookNode,
+        cell_index: int,
+        execution_count: Optional[int] = None,
+        store_history: bool = True,
+    ) -> NotebookNode:
+        if cell.cell_type != "code" or not cell.source.strip():
+            return await super().async_execute_cell(
+                cell, cell_index, execution_count, store_history
+            )
+        start = now_us()
+        timer = Timer()
+        try:
+            with timer:
+                return await super().async_execute_cell(
+                    cell, cell_index, execution_count, store_history
+                )
+        finally:
+            self.cell_seconds[cell_index] = timer.last_split
+            add_span("cell", start, index=cell_index)
+
+    @asynccontextmanager
+    async def async_setup_kernel(self, **kwargs: Any):
+        start = now_us()
+        timer = Timer()
+        async with super().async_setup_kernel(**kwargs):
+            timer.split()
+            self.kernel_startup_seconds = timer.last_split
+            add_span("kernel start", start)
+            pid = kernel_pid(self.km)
+            start_times = process_cpu_times(pid) if pid is not None else None
+            try:
+                yield
+            finally:
+                if pid is not None:
+                    self.peak_memory = process_peak_memory(pid)
+                    end_times = process_cpu_times(pid)
+                    if start_times is not None and end_times is not None:
+                        self.cpu_times = (
+                            end_times[0] - start_times[0],
+                            end_times[1] - start_times[1],
+                        )
+
+
+def _notebook_client(
+    nb: NotebookNode,
+    cwd: Optional[str],
+    timeout: Optional[int],
+    allow_errors: bool,
+    meta_override: bool,
+    record_timing: bool,
+    km: Optional[Any],
+    **kwargs: Any,
+) -> MeasuredNotebookClient:
+    """Create the client for ``single_nb_execution``."""
+    if meta_override and "execution" in nb.metadata:
+        if "timeout" in nb.metadata.execution:
+            timeout = nb.metadata.execution.timeout
+        if "allow_errors" in nb.metadata.execution:
+            allow_errors = nb.metadata.execution.allow_errors
+
+    return MeasuredNotebookClient(
+        nb,
+        km=km,
+        resources={"metadata": {"path": cwd}} if cwd is not None else {},
+        timeout=timeout,
+        allow_errors=allow_errors,
+        record_timing=record_timing,
+        **kwargs,
+    )
+
+
+def _execution_result(
+    client: MeasuredNotebookClient,
+    cwd: Optional[str],
+    time: float,
+    error: Optional[Union[CellExecutionError, CellTimeoutError]],
+    exc_string: Optional[str],
+) -> ExecutionResult:
+    """Create the result for ``single_nb_execution``."""
+    data = {}
+    if client.kernel_startup_seconds is not None:
+        data["kernel_startup_seconds"] = client.kernel_startup_seconds
+    if client.peak_memory is not None:
+        data["peak_memory_bytes"] = client.peak_memory
+    if client.cpu_times is not None:
+        data["cpu_user_seconds"], data["cpu_system_seconds"] = client.cpu_times
+    if client.cell_seconds:
+        # indexed by code cell, as in the cached notebook
+        code_indices = [
+            index
+            for index, cell in enumerate(client.nb.cells)
+            if cell.cell_type == "code"
+        ]
+        data[CELL_SECONDS_KEY] = [
+            [code_index, round(client.cell_seconds[index], 4)]
+            for code_index, index in enumerate(code_indices)
+            if index in client.cell_seconds
+        ]
+    return ExecutionResult(client.nb, cwd, time, error, exc_string, data)
 
 
 def single_nb_execution(
@@ -29,6 +319,7 @@ def single_nb_execution(
     allow_errors: bool,
     meta_override: bool = True,
     record_timing: bool = False,
+    km: Optional[Any] = None,
     **kwargs: Any,
 ) -> ExecutionResult:
     """Execute notebook in place.
@@ -40,34 +331,119 @@ def single_nb_execution(
                 execution is stopped and a ``CellExecutionError`` is raised.
     :param meta_override: If ``True`` then timeout and allow_errors may be overridden
                 by equivalent keys in nb.metadata.execution
+    :param record_timing: If ``True`` then nbclient's timing data is also
+                added to the metadata of each cell (the execution time of each
+                code cell is always recorded in ``ExecutionResult.data``).
+    :param km: An already started kernel manager to execute with,
+                which is not shutdown after execution (e.g. from a ``KernelPool``).
     :param kwargs: Additional keyword arguments to pass to the ``NotebookClient``.
 
     :returns: The execution time in seconds
     """
-    if meta_override and "execution" in nb.metadata:
-        if "timeout" in nb.metadata.execution:
-            timeout = nb.metadata.execution.timeout
-        if "allow_errors" in nb.metadata.execution:
-            allow_errors = nb.metadata.execution.allow_errors
+    client = _notebook_client(
+        nb, cwd, timeout, allow_errors, meta_override, record_timing, km, **kwargs
+    )
+    error = exc_string = None
+    timer = Timer()
+    with timer:
+        try:
+            client.execute()
+        except (CellExecutionError, CellTimeoutError) as err:
+            error = err
+            exc_string = "".join(traceback.format_exc())
+        finally:
+            # the client only cleans up after kernels it started itself
+            if km is not None and client.kc is not None:
+                client.kc.stop_channels()
+
+    return _execution_result(client, cwd, timer.last_split, error, exc_string)
+
 
+async def async_single_nb_execution(
+    nb: NotebookNode,
+    cwd: Optional[str],
+    timeout: Optional[int],
+    allow_errors: bool,
+    meta_override: bool = True,
+    record_timing: bool = False,
+    **kwargs: Any,
+) -> ExecutionResult:
+    """Execute notebook in place, asynchronously.
+
+    This allows multiple notebooks to be executed concurrently, on one event loop.
+    See ``single_nb_execution`` for the parameters.
+    """
+    client = _notebook_client(
+        nb, cwd, timeout, allow_errors, meta_override, record_timing, None, **kwargs
+    )
     error = exc_string = None
-    # TODO nbclient with record_timing=True will add execution data to each cell
     timer = Timer()
     with timer:
         try:
-            executenb(
-                nb,
-                cwd=cwd,
-                timeout=timeout,
-                allow_errors=allow_errors,
-                record_timing=record_timing,
-                **kwargs,
-            )
+            await client.async_execute()
         except (CellExecutionError, CellTimeoutError) as err:
             error = err
             exc_string = "".join(traceback.format_exc())
 
-    return ExecutionResult(nb, cwd, timer.last_split, error, exc_string)
+    return _execution_result(client, cwd, timer.last_split, error, exc_string)
+
+
+def folder_digests(folder: Union[str, Path]) -> dict[str, str]:
+    """Return the digest of every file in a folder, by relative (posix) path."""
+    folder = Path(folder)
+    return {
+        path.relative_to(folder).as_posix(): file_digest(path)
+        for path in folder.glob("**/*")
+        if path.is_file()
+    }
+
+
+def collect_artifacts(
+    folder: Union[str, Path],
+    before: dict[str, str],
+    options: Optional[ArtifactOptions] = None,
+    logger: Optional[logging.Logger] = None,
+) -> NbArtifactsInMemory:
+    """Read the files created or modified by an execution, as artifacts.
+
+    :param folder: The folder the notebook was executed in
+    :param before: The digests of the files in the folder before execution
+        (from ``folder_digests``), e.g. copied assets, which are not collected
+        unless their content changed
+    :param options: The files to collect, and size limits
+    """
+    options = options or ArtifactOptions()
+    logger = logger or logging.getLogger(__name__)
+    folder = Path(folder)
+    paths = {p for pattern in options.include for p in folder.glob(pattern)}
+    paths -= {p for pattern in options.exclude for p in folder.glob(pattern)}
+    files = {}
+    total_size = 0
+    for path in sorted(paths):
+        if not path.is_file():
+            continue
+        rel_path = path.relative_to(folder).as_posix()
+        if rel_path in before and before[rel_path] == file_digest(path):
+            continue
+        size = path.stat().st_size
+        if options.max_file_size is not None and size > options.max_file_size:
+            logger.warning(
+                "Artifact not cached, exceeds max file size (%s bytes): %s"
+                % (options.max_file_size, rel_path)
+            )
+            continue
+        if (
+            options.max_total_size is not None
+            and total_size + size > options.max_total_size
+        ):
+            logger.warning(
+                "Artifact not cached, exceeds max total size (%s bytes): %s"
+                % (options.max_total_size, rel_path)
+            )
+            continue
+        files[rel_path] = path.read_bytes()
+        total_size += size
+    return NbArtifactsInMemory(files)
 
 
 def copy_assets(uri: str, assets: list[str], folder: str) -> list[Path]:
@@ -88,20 +464,24 @@ def create_cache_bundle(
     asset_files: Optional[list[Path]],
     exec_time: float,
     exec_tb: Optional[str],
+    exec_data: Optional[dict] = None,
+    artifacts: Optional[NbArtifactsAbstract] = None,
 ) -> CacheBundleIn:
-    """Create a cache bundle to save."""
+    """Create a cache bundle to save.
+
+    :param artifacts: Artifacts already collected from the execution
+        (e.g. by ``collect_artifacts``), otherwise they are retrieved from
+        ``execdir``, if ``asset_files`` is given
+    """
+    if artifacts is None and execdir is not None and asset_files is not None:
+        artifacts = NbArtifacts(
+            [p for p in Path(execdir).glob("**/*") if p not in asset_files],
+            execdir,
+        )
     return CacheBundleIn(
         project_nb.nb,
         project_nb.uri,
-        # TODO retrieve assets that have changed file mtime?
-        artifacts=(
-            NbArtifacts(
-                [p for p in Path(execdir).glob("**/*") if p not in asset_files],
-                execdir,
-            )
-            if (execdir is not None and asset_files is not None)
-            else None
-        ),
-        data={"execution_seconds": exec_time},
+        artifacts=artifacts,
+        data={"execution_seconds": exec_time, **(exec_data or {})},
         traceback=exec_tb,
     )
@@ -0,0 +1,97 @@
+"""Metrics on the use of a cache, e.g. its hit ratio, and their export."""
+
+import os
+from pathlib import Path
+import tempfile
+from typing import Mapping, Optional, Union
+
+# the counters persisted in the cache database, and their descriptions
+COUNTERS = {
+    "lookup_hits": "Lookups of notebooks that matched a cached execution",
+    "lookup_misses": "Lookups of notebooks that did not match a cached execution",
+    "lookup_seconds": "Time spent on lookups, including hashing notebooks",
+    "upstream_hits": "Lookups matched in an upstream cache, and promoted into the cache",
+    "cached_notebooks": "Executed notebooks written to the cache",
+    "cached_bytes": "Bytes of notebooks and artifacts written to the cache",
+    "evictions": "Cached notebooks removed, to keep within the cache limit",
+    "executions_succeeded": "Notebooks executed successfully by executors",
+    "executions_failed": "Notebooks that failed to execute, by executors",
+    "execution_seconds": "Time spent executing notebooks, by executors",
+}
+
+# values derived from the counters, or the current state of the cache
+GAUGES = {
+    "hit_ratio": "Fraction of lookups that matched a cached execution",
+    "lookup_seconds_avg": "Average time of a lookup",
+    "records": "Executed notebooks currently in the cache",
+    "cache_limit": "Maximum number of executed notebooks in the cache",
+}
+
+
+def derive_stats(counters: Mapping[str, float]) -> dict[str, float]:
+    """Return all counters (zero if missing), and the values derived from them."""
+    stats = {name: float(counters.get(name, 0)) for name in COUNTERS}
+    lookups = stats["lookup_hits"] + stats["lookup_misses"]
+    stats["hit_ratio"] = stats["lookup_hits"] / lookups if lookups else 0.0
+    stats["lookup_seconds_avg"] = stats["lookup_seconds"] / lookups if lookups else 0.0
+    return stats
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(
+    stats: Mapping[str, float],
+    prefix: str = "jcache",
+    labels: Optional[Mapping[str, str]] = None,
+) -> str:
+    """Format the stats of a cache in the Prometheus text exposition format.
+
+    :param stats: The stats, from ``JupyterCacheAbstract.stats``
+    :param labels: Labels to add to every metric, e.g. the cache path
+    """
+    label_str = ""
+    if labels:
+        label_str = (
+            "{"
+            + ",".join(f'{k}="{_escape_label(str(v))}"' for k, v in labels.items())
+            + "}"
+        )
+    lines = []
+    for name, value in stats.items():
+        if name in COUNTERS:
+            metric, kind, description = f"{prefix}_{name}_total", "counter", COUNTERS
+        elif name in GAUGES:
+            metric, kind, description = f"{prefix}_{name}", "gauge", GAUGES
+        else:
+            continue
+        lines.append(f"# HELP {metric} {description[name]}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric}{label_str} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(
+    stats: Mapping[str, float],
+    path: Union[str, Path],
+    prefix: str = "jcache",
+    labels: Optional[Mapping[str, str]] = None,
+) -> None:
+    """Write the stats of a cache to a file, for the node exporter textfile collector.
+
+    The file is replaced atomically, so that it is never read partially written.
+    See ``format_prometheus`` for the parameters.
+    """
+    path = Path(path)
+    handle, temp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(handle, "w", encoding="utf8") as file:
+            file.write(format_prometheus(stats, prefix, labels))
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,163 @@
+"""Tracing of the phases of an execution run, exported as Chrome trace events.
+
+Tracing is enabled for a block of code with ``tracing``,
+which also applies to the processes started within it (e.g. by parallel executors),
+since each process appends its spans to a file in a folder
+given by the ``JCACHE_TRACE_DIR`` environment variable.
+On exit, the spans are merged into a JSON file,
+which can be opened in ``chrome://tracing`` or https://ui.perfetto.dev::
+
+    with tracing("trace.json"):
+        executor.run_and_cache()
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+import contextvars
+import json
+import multiprocessing as mproc
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Optional, TextIO, Union
+
+TRACE_DIR_ENV = "JCACHE_TRACE_DIR"
+
+# the track that spans are drawn on (defaults to the thread),
+# so that notebooks executing concurrently on one event loop do not overlap
+_TRACK: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "jcache_trace_track", default=None
+)
+# the open span file of this process, by (trace folder, process ID)
+_FILES: dict[tuple[str, int], TextIO] = {}
+_FILES_LOCK = threading.Lock()
+
+
+def now_us() -> int:
+    """Return the current time, in microseconds since the epoch."""
+    return time.time_ns() // 1000
+
+
+def tracing_enabled() -> bool:
+    """Return whether spans are being recorded."""
+    return bool(os.environ.get(TRACE_DIR_ENV))
+
+
+def set_track(track: int) -> None:
+    """Set the track that spans are drawn on, in the current (async) context."""
+    _TRACK.set(track)
+
+
+def _write_event(folder: str, event: dict[str, Any]) -> None:
+    pid = os.getpid()
+    with _FILES_LOCK:
+        handle = _FILES.get((folder, pid))
+        if handle is None:
+            handle = _FILES[(folder, pid)] = open(
+                Path(folder, f"{pid}.jsonl"), "a", encoding="utf8"
+            )
+            process = mproc.current_process().name
+            name = "main" if process == "MainProcess" else f"worker {pid}"
+            handle.write(
+                json.dumps(
+                    {
+                        "name": "process_name",
+                        "ph": "M",
+                        "pid": pid,
+                        "args": {"name": name},
+                    }
+                )
+                + "\n"
+            )
+        # flushed per span, since worker processes may be terminated
+        handle.write(json.dumps(event) + "\n")
+        handle.flush()
+
+
+def add_span(
+    name: str, start_us: int, end_us: Optional[int] = None, **args: Any
+) -> None:
+    """Record a span, if tracing is enabled.
+
+    :param start_us: The start time, from ``now_us``
+    :param end_us: The end time (defaults to now)
+    :param args: Data to show for the span, e.g. the notebook URI
+    """
+    folder = os.environ.get(TRACE_DIR_ENV)
+    if not folder:
+        return
+    end_us = now_us() if end_us is None else end_us
+    _write_event(
+        folder,
+        {
+            "name": name,
+            "cat": "jcache",
+            "ph": "X",
+            "ts": start_us,
+            "dur": max(end_us - start_us, 0),
+            "pid": os.getpid(),
+            "tid": _TRACK.get() or threading.get_ident(),
+            "args": args,
+        },
+    )
+
+
+@contextmanager
+def span(name: str, **args: Any) -> Iterator[None]:
+    """Record a span for the duration of the block, if tracing is enabled.
+
+    :param args: Data to show for the span, e.g. the notebook URI
+    """
+    if not os.environ.get(TRACE_DIR_ENV):
+        yield
+        return
+    start = now_us()
+    try:
+        yield
+    finally:
+        add_span(name, start, **args)
+
+
+def read_trace_events(folder: Union[str, Path]) -> list[dict[str, Any]]:
+    """Read the spans recorded in a trace folder, ordered by start time."""
+    events = []
+    for path in sorted(Path(folder).glob("*.jsonl")):
+        with open(path, encoding="utf8") as handle:
+            for line in handle:
+                # the last line may be incomplete, if the process was terminated
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return sorted(events, key=lambda e: (e["ph"] != "M", e.get("ts", 0)))
+
+
+@contextmanager
+def tracing(path: Union[str, Path]) -> Iterator[None]:
+    """Record spans within the block (and its child processes),
+    then write them to a Chrome trace-event JSON file.
+    """
+    folder = tempfile.mkdtemp(prefix="jcache_trace_")
+    previous = os.environ.get(TRACE_DIR_ENV)
+    os.environ[TRACE_DIR_ENV] = folder
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop(TRACE_DIR_ENV, None)
+        else:
+            os.environ[TRACE_DIR_ENV] = previous
+        with _FILES_LOCK:
+            for key in [key for key in _FILES if key[0] == folder]:
+                _FILES.pop(key).close()
+        try:
+            events = read_trace_events(folder)
+            Path(path).write_text(
+                json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}),
+                encoding="utf8",
+            )
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
@@ -1,8 +1,11 @@
 """Non-core imports in this module are lazily loaded, in order to improve CLI speed"""
 
+from collections.abc import Iterable
+import heapq
+import os
 from pathlib import Path
 import time
-from typing import TYPE_CHECKING, Optional, Union
+from typing import TYPE_CHECKING, NamedTuple, Optional, Union
 
 from jupyter_cache.readers import NbReadError
 
@@ -40,6 +43,17 @@ def to_relative_paths(
     return rel_paths
 
 
+def file_digest(path: Union[str, Path]) -> str:
+    """Return the SHA-256 digest of a file's content."""
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 class Timer:
     """Context manager for timing runtime."""
 
@@ -99,6 +113,19 @@ def tabulate_cache_records(
     )
 
 
+def folder_size(path: Union[str, Path]) -> int:
+    """Return the total size of the files in a folder."""
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                # deleted whilst walking
+                pass
+    return size
+
+
 def tabulate_project_records(
     records: list["NbProjectRecord"],
     path_length: Optional[int] = None,
@@ -133,3 +160,112 @@ def tabulate_project_records(
             )
         )
     return tabulate.tabulate(rows, headers="keys")
+
+
+def get_latest_cache_data(
+    cache: "JupyterCacheAbstract", uris: Iterable[str]
+) -> dict[str, dict]:
+    """Return the data of the most recent cache record for each URI (if any).
+
+    This can be used to predict the resources required to re-execute a notebook.
+    """
+    uris = set(uris)
+    latest = {}
+    for record in cache.list_cache_records():
+        if record.uri not in uris:
+            continue
+        if record.uri not in latest or latest[record.uri].created < record.created:
+            latest[record.uri] = record
+    return {uri: record.data or {} for uri, record in latest.items()}
+
+
+# the resources recorded in ``NbCacheRecord.data``, by executors
+RESOURCE_KEYS = {
+    "execution_seconds": "Execution (s)",
+    "kernel_startup_seconds": "Kernel start-up (s)",
+    "peak_memory_bytes": "Peak memory (MB)",
+    "cpu_user_seconds": "CPU user (s)",
+    "cpu_system_seconds": "CPU system (s)",
+}
+
+# the execution time of each code cell, recorded in ``NbCacheRecord.data``
+# (as a list of ``[code cell index, seconds]``, i.e. the index of the cell
+# in the cached notebook, which only contains code cells)
+CELL_SECONDS_KEY = "cell_seconds"
+
+
+class CellTiming(NamedTuple):
+    """The execution time of a cell in a cached notebook."""
+
+    seconds: float
+    pk: int
+    uri: str
+    # the index of the cell, within the code cells of the notebook
+    index: int
+
+
+def get_slowest_cells(
+    cache: "JupyterCacheAbstract", count: Optional[int] = 10
+) -> list[CellTiming]:
+    """Return the slowest cells across all cached notebooks, slowest first.
+
+    :param count: The maximum number of cells to return (all if None)
+    """
+    timings = (
+        CellTiming(seconds, record.pk, record.uri, index)
+        for record in cache.list_cache_records()
+        for index, seconds in (record.data or {}).get(CELL_SECONDS_KEY, [])
+    )
+    if count is None:
+        return sorted(timings, reverse=True)
+    return heapq.nlargest(count, timings)
+
+
+def format_resources(data: dict) -> dict[str, str]:
+    """Format the resources recorded for an execution, for display.
+
+    :param data: The data of a cache record
+    """
+    formatted = {}
+    for key, name in RESOURCE_KEYS.items():
+        value = data.get(key)
+        if value is None:
+            formatted[name] = "-"
+        elif key == "peak_memory_bytes":
+            formatted[name] = f"{value / 1e6:.1f}"
+        else:
+            formatted[name] = f"{value:.2f}"
+    return formatted
+
+
+def tabulate_project_stats(
+    records: list["NbProjectRecord"],
+    cache: "JupyterCacheAbstract",
+    path_length: Optional[int] = None,
+    sort_by: Optional[str] = None,
+) -> str:
+    """Tabulate the resources used by the latest execution of each project notebook.
+
+    :param records: list of ``NbProjectRecord``
+    :param cache: The cache to retrieve execution data from
+    :param path_length: truncate URI paths to x components
+    :param sort_by: A key of ``RESOURCE_KEYS`` to sort by (largest first)
+    """
+    import tabulate
+
+    latest = get_latest_cache_data(cache, [r.uri for r in records])
+    if sort_by is not None:
+        records = sorted(
+            records,
+            key=lambda r: latest.get(r.uri, {}).get(sort_by) or 0,
+            reverse=True,
+        )
+    rows = [
+        {
+            "ID": record.pk,
+            "URI": str(shorten_path(record.uri, path_length)),
+            **format_resources(latest.get(record.uri, {})),
+        }
+        for record in records
+    ]
+    return tabulate.tabulate(rows, headers="keys")
@@ -1,6 +1,9 @@
+import logging
 import os
 import re
 import shutil
+import sys
+import tarfile
 from textwrap import dedent
 
 import nbformat as nbf
@@ -8,7 +11,8 @@ import pytest
 
 from jupyter_cache import __version__
 from jupyter_cache.base import NbValidityError
-from jupyter_cache.cache.main import JupyterCacheBase
+from jupyter_cache.cache.main import MAX_SHARD_DEPTH, JupyterCacheBase
+from jupyter_cache.utils import Timer
 
 NB_PATH = os.path.join(os.path.realpath(os.path.dirname(__file__)), "notebooks")
 ANSI_REGEX = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
@@ -193,7 +197,16 @@ def test_artifacts(tmp_path):
 
 
 @pytest.mark.parametrize(
-    "executor_key", ["local-serial", "temp-serial", "local-parallel", "temp-parallel"]
+    "executor_key",
+    [
+        "local-serial",
+        "temp-serial",
+        "local-parallel",
+        "temp-parallel",
+        "local-pooled",
+        "temp-pooled",
+        "async-parallel",
+    ],
 )
 def test_execution(tmp_path, executor_key):
     from jupyter_cache.executors import load_executor
@@ -231,18 +244,917 @@ def test_execution(tmp_path, executor_key):
         "source": "a=1\nprint(a)",
     }
     assert "execution_seconds" in bundle.record.data
+    assert "kernel_startup_seconds" in bundle.record.data
+    if sys.platform == "linux":
+        assert bundle.record.data["peak_memory_bytes"] > 0
+        assert bundle.record.data["cpu_user_seconds"] >= 0
+        assert bundle.record.data["cpu_system_seconds"] >= 0
 
-    # TODO artifacts
-    # with db.cache_artefacts_temppath(2) as path:
-    #     paths = [str(p.relative_to(path)) for p in path.glob("**/*") if p.is_file()]
-    #     assert paths == ["artifact.txt"]
-    #     assert path.joinpath("artifact.txt").read_text(encoding="utf8") == "hi"
+    # files created in a temporary folder are cached, but not the copied assets
+    artifact_pk = db.get_cached_project_nb(3).pk
+    with db.cache_artefacts_temppath(artifact_pk) as path:
+        paths = [str(p.relative_to(path)) for p in path.glob("**/*") if p.is_file()]
+        if executor_key.startswith("temp"):
+            assert paths == ["artifact.txt"]
+            assert path.joinpath("artifact.txt").read_text(encoding="utf8") == "hi"
+        else:
+            assert paths == []
 
     project_record = db.get_project_record(2)
     assert project_record.traceback is not None
     assert "Exception: oopsie!" in ANSI_REGEX.sub("", project_record.traceback)
 
 
+def test_execution_hashkey(tmp_path, caplog):
+    """Test notebooks are read and hashed once, and cached against that hash."""
+    from jupyter_cache.executors.basic import ExecutionWorkerLocalSerial, ProcessData
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    shutil.copyfile(os.path.join(NB_PATH, "basic_unrun.ipynb"), tmp_path / "nb.ipynb")
+    db.add_nb_to_project(str(tmp_path / "nb.ipynb"))
+    (project_nb,) = db.list_unexecuted_notebooks()
+    hashkey = db.create_hashed_notebook(project_nb.nb)[1]
+    assert project_nb.hashkey == hashkey
+
+    worker = ExecutionWorkerLocalSerial(logging.getLogger(__name__))
+    data = ProcessData(project_nb.pk, project_nb.uri, db, 30, False, project_nb)
+    assert worker.get_project_notebook(data) is project_nb
+    result = worker.execute(project_nb, data)
+
+    # change the source during execution
+    (tmp_path / "nb.ipynb").write_text(
+        nbf.writes(nbf.v4.new_notebook(cells=[nbf.v4.new_code_cell("b=1")]))
+    )
+    os.utime(tmp_path / "nb.ipynb", ns=(0, project_nb.mtime_ns + 1))
+    with caplog.at_level(logging.WARNING):
+        assert worker.cache_result(project_nb, data, result) == (0, project_nb.uri)
+    assert "Source changed during execution" in caplog.text
+    # the executed source is cached
+    assert db.list_cache_records()[0].hashkey == hashkey
+    assert [r.pk for r in db.list_unexecuted()] == [project_nb.pk]
+
+
+def test_collect_artifacts(tmp_path, caplog):
+    """Test new and modified files are collected, within the options given."""
+    from jupyter_cache.executors.utils import (
+        ArtifactOptions,
+        collect_artifacts,
+        folder_digests,
+    )
+
+    tmp_path.joinpath("asset.txt").write_text("asset")
+    tmp_path.joinpath("modified.txt").write_text("original")
+    before = folder_digests(tmp_path)
+    tmp_path.joinpath("modified.txt").write_text("modified")
+    tmp_path.joinpath("sub").mkdir()
+    tmp_path.joinpath("sub", "new.txt").write_text("new")
+    tmp_path.joinpath("new.log").write_text("log")
+    tmp_path.joinpath("large.txt").write_text("x" * 100)
+
+    artifacts = collect_artifacts(tmp_path, before)
+    assert sorted(p.as_posix() for p in artifacts.relative_paths) == [
+        "large.txt",
+        "modified.txt",
+        "new.log",
+        "sub/new.txt",
+    ]
+    with caplog.at_level(logging.WARNING):
+        artifacts = collect_artifacts(
+            tmp_path,
+            before,
+            ArtifactOptions(
+                include=["**/*.txt"],
+                exclude=["sub/*"],
+                max_file_size=50,
+            ),
+        )
+    assert {p.as_posix(): h.read() for p, h in artifacts} == {
+        "modified.txt": b"modified"
+    }
+    assert "exceeds max file size" in caplog.text
+    artifacts = collect_artifacts(tmp_path, before, ArtifactOptions(max_total_size=110))
+    assert sorted(p.as_posix() for p in artifacts.relative_paths) == [
+        "large.txt",
+        "modified.txt",
+    ]
+
+
+def test_parallel_worker_count(tmp_path):
+    """Test the number of processes is capped by recorded peak memory."""
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path))
+    for name in ["basic.ipynb", "complex_outputs.ipynb"]:
+        db.add_nb_to_project(os.path.join(NB_PATH, name))
+    records = db.list_project_records()
+    executor = load_executor("local-parallel", db)
+    assert executor.get_worker_count(records, workers=1) == 1
+    assert executor.get_worker_count(records, workers=8, memory_limit=10**9) == 2
+    db.cache_notebook_file(
+        os.path.join(NB_PATH, "basic.ipynb"),
+        data={"peak_memory_bytes": 4 * 10**9},
+        check_validity=False,
+    )
+    assert executor.get_worker_count(records, workers=8, memory_limit=10**9) == 1
+    assert executor.get_worker_count(records, workers=8, memory_limit=10**10) == 2
+
+
+def test_predict_execution_seconds(tmp_path):
+    from jupyter_cache.executors.utils import (
+        predict_execution_seconds,
+        predict_makespan,
+    )
+
+    db = JupyterCacheBase(str(tmp_path))
+    db.cache_notebook_file(
+        os.path.join(NB_PATH, "basic.ipynb"),
+        uri="a.ipynb",
+        data={"execution_seconds": 1.0},
+        check_validity=False,
+    )
+    db.cache_notebook_file(
+        os.path.join(NB_PATH, "complex_outputs.ipynb"),
+        uri="a.ipynb",
+        data={"execution_seconds": 3.0},
+        check_validity=False,
+    )
+    db.cache_notebook_file(
+        os.path.join(NB_PATH, "basic_failing.ipynb"),
+        uri="b.ipynb",
+        data={"execution_seconds": 5.0},
+        check_validity=False,
+    )
+    # the most recent record is used, and unknown URIs get the mean
+    assert predict_execution_seconds(db, ["a.ipynb", "b.ipynb", "c.ipynb"]) == {
+        "a.ipynb": 3.0,
+        "b.ipynb": 5.0,
+        "c.ipynb": 4.0,
+    }
+    assert predict_makespan([5, 3, 2], 2) == 5
+    assert predict_makespan([2, 3, 5], 2) == 7
+
+
+def test_parallel_single_writer(tmp_path):
+    """Test executed notebooks are cached by the parent process."""
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    db.change_cache_limit(1)
+    # execute in a copy, since a notebook writes a file to its folder
+    nb_path = tmp_path / "notebooks"
+    shutil.copytree(NB_PATH, nb_path)
+    db.add_nb_to_project(os.path.join(nb_path, "basic_unrun.ipynb"))
+    db.add_nb_to_project(os.path.join(nb_path, "basic_failing.ipynb"))
+    db.add_nb_to_project(os.path.join(nb_path, "external_output.ipynb"))
+    executor = load_executor("local-parallel", db)
+    result = executor.run_and_cache(workers=2, single_writer=True)
+    assert sorted(result.succeeded) == [
+        os.path.join(nb_path, "basic_unrun.ipynb"),
+        os.path.join(nb_path, "external_output.ipynb"),
+    ]
+    assert result.excepted == [os.path.join(nb_path, "basic_failing.ipynb")]
+    assert db.get_project_record(2).traceback is not None
+    # the cache is truncated after each batch
+    assert len(db.list_cache_records()) == 1
+
+
+def _write_code_notebook(path, *sources):
+    nb = nbf.v4.new_notebook(cells=[nbf.v4.new_code_cell(s) for s in sources])
+    nb.metadata.kernelspec = {"name": "python3", "display_name": "Python 3"}
+    nbf.write(nb, str(path))
+    return str(path)
+
+
+def test_dependency_scheduler(tmp_path):
+    from jupyter_cache.executors.basic import ProcessData
+    from jupyter_cache.executors.dependencies import (
+        DependencyScheduler,
+        project_dependencies,
+    )
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    for name in "abcd":
+        (tmp_path / f"{name}.ipynb").touch()
+    db.add_nb_to_project(str(tmp_path / "a.ipynb"), outputs=[str(tmp_path / "a.txt")])
+    db.add_nb_to_project(str(tmp_path / "b.ipynb"), assets=[str(tmp_path / "a.txt")])
+    db.add_nb_to_project(
+        str(tmp_path / "c.ipynb"), depends_on=[str(tmp_path / "b.ipynb")]
+    )
+    db.add_nb_to_project(str(tmp_path / "d.ipynb"))
+    records = db.list_project_records()
+    uris = [r.uri for r in records]
+    assert project_dependencies(records) == {uris[1]: {uris[0]}, uris[2]: {uris[1]}}
+
+    data = [ProcessData(r.pk, r.uri, db, 30, False) for r in records]
+    scheduler = DependencyScheduler(db, data, durations={uris[3]: 1.0})
+    # the longest critical path (a -> b -> c) is started first
+    assert [scheduler.pop().uri, scheduler.pop().uri, scheduler.pop()] == [
+        uris[3],
+        uris[0],
+        None,
+    ]
+    assert scheduler.complete(uris[3], True) == []
+    assert scheduler.complete(uris[0], True) == []
+    assert scheduler.pop().uri == uris[1]
+    # notebooks downstream of a failure are skipped
+    assert scheduler.complete(uris[1], False) == [uris[2]]
+    assert len(scheduler) == 0
+
+    db.add_nb_to_project(
+        str(tmp_path / "e.ipynb"), depends_on=[str(tmp_path / "f.ipynb")]
+    )
+    db.add_nb_to_project(
+        str(tmp_path / "f.ipynb"), depends_on=[str(tmp_path / "e.ipynb")]
+    )
+    data = [ProcessData(r.pk, r.uri, db, 30, False) for r in db.list_project_records()]
+    with pytest.raises(ValueError, match="cycle"):
+        DependencyScheduler(db, data)
+
+
+@pytest.mark.parametrize(
+    "executor_key", ["local-serial", "local-parallel", "async-parallel"]
+)
+def test_execution_dependencies(tmp_path, executor_key):
+    """Test notebooks execute after the notebooks whose outputs they use,
+    and are re-executed when those notebooks are.
+    """
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    upstream = _write_code_notebook(
+        tmp_path / "upstream.ipynb",
+        "import time; time.sleep(1)",
+        "open('data.txt', 'w').write('1')",
+    )
+    downstream = _write_code_notebook(
+        tmp_path / "downstream.ipynb", "assert open('data.txt').read() == '1'"
+    )
+    db.add_nb_to_project(upstream, outputs=[str(tmp_path / "data.txt")])
+    db.add_nb_to_project(downstream, assets=[str(tmp_path / "data.txt")])
+    executor = load_executor(executor_key, db)
+    kwargs = {} if executor_key == "local-serial" else {"workers": 2}
+    result = executor.run_and_cache(**kwargs)
+    assert result.succeeded == [upstream, downstream]
+    assert len(db.list_cache_records()) == 2
+
+    # changing the upstream notebook also re-executes (and re-caches) downstream
+    _write_code_notebook(
+        tmp_path / "upstream.ipynb", "open('data.txt', 'w').write('1')"
+    )
+    result = load_executor("local-serial", db).run_and_cache()
+    assert result.succeeded == [upstream, downstream]
+    assert db.get_cached_project_nb(downstream) is not None
+
+    # a failing upstream notebook skips (and invalidates nothing) downstream
+    _write_code_notebook(tmp_path / "upstream.ipynb", "raise ValueError")
+    result = load_executor("local-serial", db).run_and_cache()
+    assert (result.excepted, result.errored) == ([upstream], [downstream])
+
+
+def test_hash_assets(tmp_path, monkeypatch):
+    """Test notebooks are re-executed when their assets change, if enabled."""
+    from jupyter_cache.cache import main
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    uri = _write_code_notebook(
+        tmp_path / "nb.ipynb", "print(open('data/a.txt').read())"
+    )
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "a.txt").write_text("a")
+    db.add_nb_to_project(uri, assets=[str(tmp_path / "data")])
+    load_executor("local-serial", db).run_and_cache()
+    assert db.list_unexecuted() == []
+
+    db.change_hash_assets(True)
+    assert [r.uri for r in db.list_unexecuted()] == [uri]
+    assert load_executor("local-serial", db).run_and_cache().succeeded == [uri]
+    assert db.list_unexecuted() == []
+    # project notebooks are matched by their hashkey, including the assets
+    pk, merged = db.merge_match_into_project_nb(uri)
+    assert pk == db.get_cached_project_nb(uri).pk
+    assert merged.cells[0].outputs[0].text == "a\n"
+    project_nb = db.get_project_notebook(uri)
+    hashkey = db.hash_project_notebook(project_nb)
+    assert db.merge_match_into_notebook(project_nb.nb, hashkey=hashkey)[0] == pk
+
+    # unchanged files are not read again
+    digested = []
+    monkeypatch.setattr(
+        main, "file_digest", lambda path: digested.append(path) or "digest"
+    )
+    assert db.list_unexecuted() == []
+    assert digested == []
+    (tmp_path / "data" / "b.txt").write_text("b")
+    assert [r.uri for r in db.list_unexecuted()] == [uri]
+    assert digested == [str(tmp_path / "data" / "b.txt")]
+
+    db.change_hash_assets(False)
+    assert db.list_unexecuted() == []
+
+
+def test_cell_timings(tmp_path):
+    """Test the execution time of each code cell is recorded."""
+    from jupyter_cache.executors import load_executor
+    from jupyter_cache.utils import get_slowest_cells
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    uri = _write_code_notebook(
+        tmp_path / "nb.ipynb", "import time", "", "time.sleep(0.5)", "a = 1"
+    )
+    nb = nbf.read(uri, nbf.NO_CONVERT)
+    nb.cells.insert(0, nbf.v4.new_markdown_cell("# Title"))
+    nbf.write(nb, uri)
+    db.add_nb_to_project(uri)
+    load_executor("local-serial", db).run_and_cache()
+    record = db.get_cached_project_nb(uri)
+    assert [index for index, _ in record.data["cell_seconds"]] == [0, 2, 3]
+    # timings are not added to each cell, unless requested
+    assert "execution" not in db.get_cache_bundle(record.pk).nb.cells[2].metadata
+
+    slowest = get_slowest_cells(db, 2)
+    assert len(slowest) == 2
+    assert (slowest[0].pk, slowest[0].uri, slowest[0].index) == (record.pk, uri, 2)
+    assert slowest[0].seconds >= 0.5
+    assert len(get_slowest_cells(db, None)) == 3
+
+
+@pytest.mark.parametrize("executor_key", ["local-serial", "local-parallel"])
+def test_tracing(tmp_path, executor_key):
+    """Test the phases of an execution are traced, per notebook and process."""
+    import json
+
+    from jupyter_cache.executors import load_executor
+    from jupyter_cache.tracing import TRACE_DIR_ENV, tracing
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    for name in ["a", "b"]:
+        db.add_nb_to_project(_write_code_notebook(tmp_path / f"{name}.ipynb", "a = 1"))
+    with tracing(tmp_path / "trace.json"):
+        load_executor(executor_key, db).run_and_cache(force=True)
+    assert TRACE_DIR_ENV not in os.environ
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    spans = [e for e in events if e["ph"] == "X"]
+    for name in ["read", "hash", "queue wait", "execute", "kernel start", "cell"]:
+        assert len([e for e in spans if e["name"] == name]) == 2, name
+    assert {e["args"]["uri"] for e in spans if e["name"] == "execute"} == {
+        str(tmp_path / "a.ipynb"),
+        str(tmp_path / "b.ipynb"),
+    }
+    assert [e for e in spans if e["name"] == "cache write"]
+    names = {e["args"]["name"] for e in events if e["ph"] == "M"}
+    if executor_key == "local-parallel":
+        assert any(name.startswith("worker") for name in names)
+    else:
+        assert names == {"main"}
+
+
+def test_stats(tmp_path):
+    """Test the use of the cache is counted, and persisted in the database."""
+    import pickle
+
+    from jupyter_cache.executors import load_executor
+    from jupyter_cache.metrics import format_prometheus
+
+    cache = JupyterCacheBase(str(tmp_path / "cache"))
+    assert cache.stats()["lookup_hits"] == 0
+    cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    cache.match_cache_file(os.path.join(NB_PATH, "basic.ipynb"))
+    with pytest.raises(KeyError):
+        cache.match_cache_file(os.path.join(NB_PATH, "complex_outputs.ipynb"))
+    # buffered lookups are not pickled, so not written twice
+    assert pickle.loads(pickle.dumps(cache))._metrics == {}
+
+    cache.change_cache_limit(1)
+    uri = _write_code_notebook(tmp_path / "nb.ipynb", "a = 1")
+    cache.add_nb_to_project(uri)
+    load_executor("local-serial", cache).run_and_cache()
+
+    stats = JupyterCacheBase(str(tmp_path / "cache")).stats()
+    assert {k: v for k, v in stats.items() if "seconds" not in k} == {
+        "lookup_hits": 1,
+        "lookup_misses": 2,
+        "upstream_hits": 0,
+        "cached_notebooks": 2,
+        "cached_bytes": stats["cached_bytes"],
+        "evictions": 1,
+        "executions_succeeded": 1,
+        "executions_failed": 0,
+        "hit_ratio": 1 / 3,
+        "records": 1,
+        "cache_limit": 1,
+    }
+    assert stats["cached_bytes"] > 0
+    assert stats["lookup_seconds_avg"] > 0
+    assert (
+        'jcache_lookup_hits_total{cache="a \\"b\\""} 1'
+        in format_prometheus(stats, labels={"cache": 'a "b"'}).splitlines()
+    )
+
+    cache.reset_stats()
+    assert cache.stats()["cached_notebooks"] == 0
+
+
+def test_fsck(tmp_path):
+    """Test orphan folders and dangling records are found, then removed."""
+    cache = JupyterCacheBase(str(tmp_path / "cache"))
+    kept = cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    dangling = cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "complex_outputs.ipynb"), check_validity=False
+    )
+    # as left by a process crashing during a commit or removal
+    shutil.rmtree(cache._get_notebook_path_cache(dangling.hashkey).parent)
+    orphan = tmp_path / "cache" / "executed" / "orphan"
+    orphan.mkdir()
+    orphan.joinpath("base.ipynb").write_text("x" * 100)
+
+    # recent records and folders may be part of a commit in progress
+    result = cache.fsck(dry_run=True)
+    assert (result.orphan_folders, result.dangling_records) == ([], [])
+
+    result = cache.fsck(dry_run=True, min_age=0)
+    assert result.orphan_folders == ["orphan"]
+    assert result.dangling_records == [dangling.pk]
+    assert result.reclaimable_bytes == 100
+    assert orphan.exists()
+    assert len(cache.list_cache_records()) == 2
+
+    result = cache.fsck(min_age=0)
+    assert not orphan.exists()
+    assert [r.pk for r in cache.list_cache_records()] == [kept.pk]
+    assert cache.fsck(min_age=0).orphan_folders == []
+
+
+def test_deferred_deletion(tmp_path):
+    """Test removed notebooks are moved to the trash, then deleted in the background."""
+    from jupyter_cache.cache.trash import TRASH_FOLDER, wait_for_purge
+
+    cache = JupyterCacheBase(str(tmp_path / "cache"))
+    record = cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    folder = cache._get_notebook_path_cache(record.hashkey).parent
+    cache.remove_cache(record.pk)
+    assert not folder.exists()
+    assert wait_for_purge(10)
+    assert list((tmp_path / "cache" / TRASH_FOLDER).iterdir()) == []
+
+    # folders left in the trash, e.g. by a process that exited, are deleted by fsck
+    leftover = tmp_path / "cache" / TRASH_FOLDER / "leftover"
+    leftover.mkdir()
+    leftover.joinpath("base.ipynb").write_text("x" * 10)
+    result = cache.fsck(dry_run=True)
+    assert (result.trash_folders, result.reclaimable_bytes) == (1, 10)
+    cache.fsck()
+    assert not leftover.exists()
+
+    cache.clear_cache()
+    assert not (tmp_path / "cache").exists()
+    assert wait_for_purge(10)
+    assert list(tmp_path.iterdir()) == []
+
+    # renamed cache folders, left by a process that exited, are deleted by fsck
+    leftover = tmp_path / ".cache.deleted.leftover"
+    leftover.mkdir()
+    leftover.joinpath("global.db").write_text("x" * 10)
+    result = cache.fsck(dry_run=True)
+    assert (result.trash_folders, result.reclaimable_bytes) == (1, 10)
+    cache.fsck()
+    assert not leftover.exists()
+
+    # or by the next clear
+    leftover.mkdir()
+    cache.clear_cache()
+    assert wait_for_purge(10)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shard_depth(tmp_path):
+    """Test cached notebooks are moved to a sharded layout, and read from either."""
+    cache = JupyterCacheBase(str(tmp_path / "cache"))
+    record = cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    executed = tmp_path / "cache" / "executed"
+    assert executed.joinpath(record.hashkey, "base.ipynb").exists()
+
+    assert cache.change_shard_depth(2) == 1
+    key = record.hashkey
+    folder = executed / key[:2] / key[2:4] / key
+    assert folder.joinpath("base.ipynb").exists()
+    assert not executed.joinpath(key).exists()
+    assert JupyterCacheBase(str(tmp_path / "cache")).get_shard_depth() == 2
+    new = cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "complex_outputs.ipynb"), check_validity=False
+    )
+    assert cache._get_notebook_path_cache(new.hashkey).parent.parent.name == (
+        new.hashkey[2:4]
+    )
+
+    # as if not yet moved, e.g. by an interrupted migration
+    folder.rename(executed / key)
+    cache._prune_shard_folders()
+    assert cache.get_cache_bundle(record.pk).nb.cells
+    assert cache.fsck(dry_run=True, min_age=0).orphan_folders == []
+    assert cache.change_shard_depth(2) == 1
+    assert folder.exists()
+
+    assert cache.change_shard_depth(0) == 2
+    assert sorted(p.name for p in executed.iterdir()) == sorted([key, new.hashkey])
+    with pytest.raises(ValueError):
+        cache.change_shard_depth(MAX_SHARD_DEPTH + 1)
+
+
+def test_truncate_dangling_records(tmp_path):
+    """Test records without files do not stop the eviction of other records."""
+    cache = JupyterCacheBase(str(tmp_path / "cache"))
+    dangling = cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    shutil.rmtree(cache._get_notebook_path_cache(dangling.hashkey).parent)
+    cache.cache_notebook_file(
+        path=_write_code_notebook(tmp_path / "nb.ipynb", "a = 1"), check_validity=False
+    )
+    cache.change_cache_limit(1)
+    latest = cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "complex_outputs.ipynb"), check_validity=False
+    )
+    # records without files may be a commit in progress, so are left to fsck
+    assert [r.pk for r in cache.list_cache_records()] == [dangling.pk, latest.pk]
+    # only the records removed are counted as evicted
+    assert cache.stats()["evictions"] == 1
+
+
+def test_skip_unchanged_failures(tmp_path):
+    """Test notebooks that failed are not re-executed, until changed or retried."""
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    failing = _write_code_notebook(tmp_path / "failing.ipynb", "raise ValueError")
+    downstream = _write_code_notebook(tmp_path / "downstream.ipynb", "a = 1")
+    db.add_nb_to_project(failing)
+    db.add_nb_to_project(downstream, depends_on=[failing])
+    result = load_executor("local-serial", db).run_and_cache()
+    assert (result.excepted, result.errored) == ([failing], [downstream])
+
+    # the failure (and the notebooks downstream) are skipped, but still reported
+    result = load_executor("local-serial", db).run_and_cache()
+    assert result.all() == []
+    assert "ValueError" in db.get_project_record(failing).traceback
+    result = load_executor("local-serial", db).run_and_cache(retry_failed=True)
+    assert (result.excepted, result.errored) == ([failing], [downstream])
+
+    _write_code_notebook(tmp_path / "failing.ipynb", "b = 1")
+    result = load_executor("local-serial", db).run_and_cache()
+    assert result.succeeded == [failing, downstream]
+    _write_code_notebook(tmp_path / "failing.ipynb", "raise ValueError")
+    assert load_executor("local-serial", db).run_and_cache().excepted == [failing]
+
+
+def test_env_fingerprint(tmp_path, monkeypatch):
+    """Test notebooks are re-executed when their environment changes, if enabled."""
+    from jupyter_cache.cache import environment
+    from jupyter_cache.cache.environment import EnvironmentOptions
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    uri = _write_code_notebook(tmp_path / "nb.ipynb", "a = 1")
+    db.add_nb_to_project(uri)
+    load_executor("local-serial", db).run_and_cache()
+    assert db.list_unexecuted() == []
+
+    lockfile = tmp_path / "requirements.txt"
+    lockfile.write_text("numpy==1.0")
+    db.change_env_fingerprint(EnvironmentOptions(lockfiles=[str(lockfile)]))
+    assert db.get_env_fingerprint().lockfiles == (str(lockfile),)
+    assert [r.uri for r in db.list_unexecuted()] == [uri]
+    assert load_executor("local-serial", db).run_and_cache().succeeded == [uri]
+    assert db.list_unexecuted() == []
+    # project notebooks are matched by their hashkey, including the environment
+    pk, _ = db.merge_match_into_project_nb(uri)
+    assert pk == db.get_cached_project_nb(uri).pk
+    project_nb = db.get_project_notebook(uri)
+    hashkey = db.hash_project_notebook(project_nb)
+    assert db.match_cache_notebook(project_nb.nb, hashkey=hashkey).pk == pk
+    lockfile.write_text("numpy==2.0")
+    assert [r.uri for r in db.list_unexecuted()] == [uri]
+
+    # only the selected packages (and python) are part of the fingerprint
+    monkeypatch.setattr(
+        environment,
+        "kernel_environment",
+        lambda name: ("python", ("Numpy==2.0", "pandas==1.0", "python==3.9")),
+    )
+    fingerprint = environment.environment_fingerprint(
+        "python3", EnvironmentOptions(packages=["numpy"])
+    )
+    assert "pandas" not in fingerprint
+    assert "Numpy==2.0" in fingerprint and "python==3.9" in fingerprint
+
+    db.change_env_fingerprint(None)
+    assert db.get_env_fingerprint() is None
+    assert db.list_unexecuted() == []
+
+
+def test_partition_by_duration():
+    from jupyter_cache.executors.utils import partition_by_duration
+
+    durations = {"a": 5.0, "b": 4.0, "c": 3.0, "d": 3.0, "e": 3.0}
+    groups = partition_by_duration(durations, 2)
+    assert groups == [["a", "d"], ["b", "c", "e"]]
+    # independent of the input order
+    assert partition_by_duration(dict(reversed(durations.items())), 2) == groups
+    # without recorded durations, notebooks are split by count
+    assert partition_by_duration(dict.fromkeys("abcde", 0.0), 2) == [
+        ["a", "c", "e"],
+        ["b", "d"],
+    ]
+
+
+def test_import_cache(tmp_path):
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    other = JupyterCacheBase(str(tmp_path / "other"))
+    record = other.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"),
+        uri="basic.ipynb",
+        artifacts=[os.path.join(NB_PATH, "artifact_folder", "artifact.txt")],
+        check_validity=False,
+        data={"execution_seconds": 1.0},
+    )
+    assert db.import_cache(str(tmp_path / "other")) == ([record.hashkey], [])
+    imported = db.list_cache_records()[0]
+    assert (imported.uri, imported.data) == ("basic.ipynb", {"execution_seconds": 1.0})
+    assert imported.created == record.created
+    bundle = db.get_cache_bundle(imported.pk)
+    assert [str(p) for p in bundle.artifacts.relative_paths] == [
+        os.path.join("artifact_folder", "artifact.txt")
+    ]
+    # files are hardlinked, where possible
+    source = other._get_notebook_path_cache(record.hashkey)
+    assert db._get_notebook_path_cache(record.hashkey).samefile(source)
+    # records already in the cache are skipped
+    assert db.import_cache(other, hardlink=False) == ([], [record.hashkey])
+    with pytest.raises(FileNotFoundError):
+        db.import_cache(str(tmp_path / "missing"))
+
+
+def test_export_archive(tmp_path):
+    """Test a snapshot of a cache restores a new cache, or merges into another."""
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    record = db.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"),
+        uri="basic.ipynb",
+        artifacts=[os.path.join(NB_PATH, "artifact_folder", "artifact.txt")],
+        check_validity=False,
+    )
+    other = db.cache_notebook_file(
+        path=os.path.join(NB_PATH, "complex_outputs.ipynb"), check_validity=False
+    )
+    db.add_nb_to_project(os.path.join(NB_PATH, "basic.ipynb"))
+    db.change_shard_depth(1)
+    archive = tmp_path / "snapshot.tar.gz"
+    with archive.open("wb") as handle:
+        assert sorted(db.export_archive(handle)) == sorted(
+            [record.hashkey, other.hashkey]
+        )
+
+    restored = JupyterCacheBase(str(tmp_path / "restored"))
+    with archive.open("rb") as handle:
+        imported, skipped = restored.import_archive(handle)
+    assert (sorted(imported), skipped) == (sorted([record.hashkey, other.hashkey]), [])
+    assert restored.get_shard_depth() == 1
+    assert len(restored.list_project_records()) == 1
+    pk = {r.hashkey: r.pk for r in restored.list_cache_records()}[record.hashkey]
+    bundle = restored.get_cache_bundle(pk)
+    assert [str(p) for p in bundle.artifacts.relative_paths] == [
+        os.path.join("artifact_folder", "artifact.txt")
+    ]
+
+    # project notebooks that cannot be read are skipped
+    missing = tmp_path / "missing.ipynb"
+    shutil.copyfile(os.path.join(NB_PATH, "complex_outputs.ipynb"), missing)
+    db.add_nb_to_project(str(missing))
+    missing.unlink()
+    with archive.open("wb") as handle:
+        assert db.export_archive(handle, project_only=True) == [record.hashkey]
+    merged = JupyterCacheBase(str(tmp_path / "merged"))
+    merged.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    with archive.open("rb") as handle:
+        assert merged.import_archive(handle) == ([], [record.hashkey])
+    assert not any(p.name.startswith(".") for p in tmp_path.iterdir())
+
+    with tarfile.open(archive, "w:gz") as tar:
+        tar.add(os.path.join(NB_PATH, "basic.ipynb"), arcname="basic.ipynb")
+    with pytest.raises(ValueError, match="not a snapshot"):
+        with archive.open("rb") as handle:
+            merged.import_archive(handle)
+
+
+def test_layered_cache(tmp_path, monkeypatch):
+    """Test lookups fall back to upstream caches, promoting matches into local."""
+    from jupyter_cache.cache.layered import UPSTREAM_ENV, LayeredCache
+
+    team = JupyterCacheBase(str(tmp_path / "team"))
+    record = team.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"),
+        uri="basic.ipynb",
+        artifacts=[os.path.join(NB_PATH, "artifact_folder", "artifact.txt")],
+        check_validity=False,
+    )
+    team.change_shard_depth(1)
+    monkeypatch.setenv(
+        UPSTREAM_ENV,
+        os.pathsep.join([str(tmp_path / "missing"), str(tmp_path / "team")]),
+    )
+    cache = LayeredCache(str(tmp_path / "cache"))
+    assert len(cache.upstreams) == 2
+    with pytest.raises(RuntimeError):
+        cache.upstreams[1].change_cache_limit(10)
+    nb = nbf.read(os.path.join(NB_PATH, "basic_unrun.ipynb"), nbf.NO_CONVERT)
+    assert cache.list_cache_records() == []
+
+    pk, merged = cache.merge_match_into_notebook(nb)
+    assert merged.cells[1].outputs
+    local = cache.get_cache_record(pk)
+    assert (local.hashkey, local.uri) == (record.hashkey, "basic.ipynb")
+    assert local.accessed > record.accessed
+    bundle = cache.get_cache_bundle(pk)
+    assert [str(p) for p in bundle.artifacts.relative_paths] == [
+        os.path.join("artifact_folder", "artifact.txt")
+    ]
+    source = team._get_notebook_path_cache(record.hashkey)
+    assert cache._get_notebook_path_cache(record.hashkey).samefile(source)
+    assert cache.stats()["upstream_hits"] == 1
+
+    # writes only go to the local cache
+    new = cache.cache_notebook_file(
+        path=os.path.join(NB_PATH, "complex_outputs.ipynb"), check_validity=False
+    )
+    assert cache.match_cache_notebook(nb).pk == pk
+    assert [r.hashkey for r in team.list_cache_records()] == [record.hashkey]
+    cache.remove_cache(new.pk)
+    with pytest.raises(KeyError):
+        cache.match_cache_file(os.path.join(NB_PATH, "complex_outputs.ipynb"))
+    assert len(team.list_cache_records()) == 1
+
+
+def _run_shared_queue(cache_path, queue_id):
+    from jupyter_cache.executors import load_executor
+
+    executor = load_executor("shared-queue", JupyterCacheBase(cache_path))
+    return executor.run_and_cache(queue_id=queue_id, poll_seconds=0.1).succeeded
+
+
+def test_shared_queue(tmp_path):
+    """Test executors sharing a queue execute each notebook once between them."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    from jupyter_cache.cache.db import NbLeaseRecord
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    nb_path = tmp_path / "notebooks"
+    shutil.copytree(NB_PATH, nb_path)
+    uris = []
+    for i in range(4):
+        nb = nbf.read(os.path.join(NB_PATH, "basic_unrun.ipynb"), nbf.NO_CONVERT)
+        nb.cells.append(nbf.v4.new_code_cell(f"b = {i}"))
+        uris.append(str(nb_path / f"basic_{i}.ipynb"))
+        nbf.write(nb, uris[-1])
+        db.add_nb_to_project(uris[-1])
+    with ProcessPoolExecutor(3) as pool:
+        futures = [
+            pool.submit(_run_shared_queue, str(tmp_path / "cache"), "run1")
+            for _ in range(3)
+        ]
+        executed = [uri for future in futures for uri in future.result()]
+    assert sorted(executed) == sorted(uris)
+    assert len(db.list_cache_records()) == 4
+    assert all(r.done for r in NbLeaseRecord.records_from_queue("run1", db.db))
+
+
+def test_cache_writer(tmp_path):
+    """Test commits queued while the writer is busy are grouped as one batch."""
+    from threading import Event
+
+    from jupyter_cache.executors.cache_writer import CacheWriter
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    truncations = []
+    db.truncate_caches = lambda: truncations.append(1)
+    busy = Event()
+    with CacheWriter(db) as writer:
+        first = writer.submit(busy.wait)
+        futures = [writer.submit(lambda i=i: i) for i in range(5)]
+        busy.set()
+        failed = writer.submit(lambda: 1 / 0)
+    assert first.result() is True
+    assert [f.result() for f in futures] == list(range(5))
+    with pytest.raises(ZeroDivisionError):
+        failed.result()
+    assert writer.stats.commits == 7
+    assert writer.stats.batches < 7
+    # the cache is truncated once per batch, rather than per commit
+    assert len(truncations) == writer.stats.batches
+
+
+def test_async_parallel_concurrent(tmp_path):
+    """Test notebooks are executed concurrently, on one event loop."""
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    for name in ("a", "b"):
+        # distinct notebooks, so that they have distinct cache records
+        nb = nbf.read(os.path.join(NB_PATH, "sleep_2.ipynb"), nbf.NO_CONVERT)
+        nb.cells.append(nbf.v4.new_code_cell(f"name = {name!r}"))
+        nbf.write(nb, str(tmp_path / f"sleep_{name}.ipynb"))
+        db.add_nb_to_project(str(tmp_path / f"sleep_{name}.ipynb"))
+    executor = load_executor("async-parallel", db)
+    with Timer() as timer:
+        result = executor.run_and_cache(workers=2)
+    assert len(result.succeeded) == 2
+    # all cache writes are made by the calling process
+    records = db.list_cache_records()
+    assert len(records) == 2
+    # the executions overlapped
+    assert timer.last_split < sum(r.data["execution_seconds"] for r in records)
+
+
+@pytest.mark.parametrize("executor_key", ["local-parallel", "async-parallel"])
+def test_parallel_fail_fast(tmp_path, executor_key):
+    """Test results are streamed, and outstanding work cancelled on failure."""
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    db.add_nb_to_project(os.path.join(NB_PATH, "basic_failing.ipynb"))
+    db.add_nb_to_project(os.path.join(NB_PATH, "basic_unrun.ipynb"))
+    db.add_nb_to_project(os.path.join(NB_PATH, "sleep_2.ipynb"))
+    db.add_nb_to_project(os.path.join(NB_PATH, "external_output.ipynb"))
+    executor = load_executor(executor_key, db)
+    streamed = []
+    result = executor.run_and_cache(
+        workers=1, fail_fast=True, callback=lambda *args: streamed.append(args)
+    )
+    assert streamed == [(1, os.path.join(NB_PATH, "basic_failing.ipynb"))]
+    assert result.all() == [os.path.join(NB_PATH, "basic_failing.ipynb")]
+
+
+def test_serial_then_parallel_execution(tmp_path):
+    """Test that a parallel execution can follow a serial one in the same process."""
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    db.add_nb_to_project(os.path.join(NB_PATH, "basic_unrun.ipynb"))
+    result = load_executor("local-serial", db).run_and_cache()
+    assert result.succeeded == [os.path.join(NB_PATH, "basic_unrun.ipynb")]
+    result = load_executor("local-parallel", db).run_and_cache(force=True, workers=2)
+    assert result.succeeded == [os.path.join(NB_PATH, "basic_unrun.ipynb")]
+
+
+def test_kernel_pool(tmp_path):
+    """Test that kernels are started ahead of time, and recycled after use."""
+    from jupyter_cache.executors.kernel_pool import KernelPool
+
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    with KernelPool(size=2) as pool:
+        pool.prestart("python3")
+        with pool.kernel("python3", str(tmp_path / "a")) as kernel:
+            first_km = kernel.km
+            assert kernel.is_alive()
+        # kernels are shared across working directories
+        with pool.kernel("python3", str(tmp_path / "b")) as kernel:
+            assert kernel.km is not first_km
+    assert pool.stats.acquired == 2
+    assert pool.stats.started >= 2
+    assert pool.stats.saved_seconds > 0
+    assert not first_km.is_alive()
+
+
+def test_execution_pooled_cwd(tmp_path):
+    """Test pooled kernels execute in the notebook folder."""
+    from jupyter_cache.executors import load_executor
+
+    db = JupyterCacheBase(str(tmp_path / "cache"))
+    nb_path = tmp_path / "notebooks"
+    nb_path.mkdir()
+    nb = nbf.v4.new_notebook(
+        cells=[nbf.v4.new_code_cell("import os; print(os.getcwd())")],
+        metadata={"kernelspec": {"name": "python3", "display_name": "Python 3"}},
+    )
+    nbf.write(nb, str(nb_path / "cwd.ipynb"))
+    db.add_nb_to_project(str(nb_path / "cwd.ipynb"))
+    result = load_executor("local-pooled", db).run_and_cache()
+    assert result.succeeded == [str(nb_path / "cwd.ipynb")]
+    bundle = db.get_cache_bundle(db.get_cached_project_nb(1).pk)
+    assert bundle.nb.cells[0].outputs[0].text.strip() == str(nb_path)
+
+
 def test_execution_jupytext(tmp_path):
     """Test execution with the jupytext reader."""
     from jupyter_cache.executors import load_executor
@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 
 from click.testing import CliRunner
+import nbformat as nbf
 import pytest
 
 from jupyter_cache.cache.main import JupyterCacheBase
@@ -228,6 +229,276 @@ def test_project_execute(runner: Runner):
     assert len(db.list_cache_records()) == 1
 
 
+def test_cache_cell_timings(runner: Runner):
+    db = runner.create_cache()
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic_unrun.ipynb"))
+    result = runner.invoke(cmd_project.execute_nbs, [])
+    assert result.exception is None, result.output
+    pk = db.get_cached_project_nb(1).pk
+    result = runner.invoke(cmd_cache.cached_info, [str(pk), "--timings"])
+    assert result.exception is None, result.output
+    assert "Cell timings:" in result.output, result.output
+    assert "a=1" in result.output, result.output
+    result = runner.invoke(cmd_cache.slowest_cells, ["-n", "1"])
+    assert result.exception is None, result.output
+    assert "basic_unrun.ipynb" in result.output, result.output
+
+
+def test_project_execute_trace(runner: Runner, tmp_path: Path):
+    db = runner.create_cache()
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic_unrun.ipynb"))
+    trace = tmp_path / "trace.json"
+    result = runner.invoke(cmd_project.execute_nbs, ["--trace", str(trace)])
+    assert result.exception is None, result.output
+    assert "Trace written to:" in result.output, result.output
+    assert "traceEvents" in trace.read_text()
+
+
+def test_cache_stats(runner: Runner, tmp_path: Path):
+    db = runner.create_cache()
+    db.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    db.match_cache_file(os.path.join(NB_PATH, "basic.ipynb"))
+    db.flush_metrics()
+    path = tmp_path / "jcache.prom"
+    result = runner.invoke(cmd_cache.cache_stats, ["--prometheus", str(path)])
+    assert result.exception is None, result.output
+    assert "hit_ratio" in result.output, result.output
+    assert "100.0%" in result.output, result.output
+    assert "# TYPE jcache_lookup_hits_total counter" in path.read_text()
+    result = runner.invoke(cmd_cache.cache_stats, ["--reset"])
+    assert result.exception is None, result.output
+    assert db.stats()["lookup_hits"] == 0
+
+
+def test_cache_fsck(runner: Runner):
+    db = runner.create_cache()
+    record = db.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    db._get_notebook_path_cache(record.hashkey).unlink()
+    result = runner.invoke(cmd_cache.fsck_cache, ["--dry-run", "--min-age", "0"])
+    assert result.exception is None, result.output
+    assert f"Record without files: ID {record.pk}" in result.output, result.output
+    assert "Dry run" in result.output, result.output
+    assert len(db.list_cache_records()) == 1
+    result = runner.invoke(cmd_cache.fsck_cache, ["--min-age", "0"])
+    assert result.exception is None, result.output
+    assert db.list_cache_records() == []
+
+
+def test_cache_layout(runner: Runner):
+    db = runner.create_cache()
+    record = db.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"), check_validity=False
+    )
+    result = runner.invoke(cmd_cache.change_layout, ["2"])
+    assert result.exception is None, result.output
+    assert "Moved 1 notebook(s)" in result.output, result.output
+    assert db._get_notebook_path_cache(record.hashkey).parent.parent.name == (
+        record.hashkey[2:4]
+    )
+    result = runner.invoke(cmd_cache.change_layout, [])
+    assert "Current shard depth: 2" in result.output, result.output
+
+
+def test_project_execute_retry_failed(runner: Runner):
+    db = runner.create_cache()
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic_failing.ipynb"))
+    result = runner.invoke(cmd_project.execute_nbs, [])
+    assert result.exception is None, result.output
+    assert "basic_failing.ipynb" in result.output, result.output
+    result = runner.invoke(cmd_project.execute_nbs, [])
+    assert result.exception is None, result.output
+    assert "excepted: []" in result.output, result.output
+    result = runner.invoke(cmd_notebook.list_nbs_in_project, [])
+    assert "❌" in result.output, result.output
+    result = runner.invoke(cmd_project.execute_nbs, ["--retry-failed"])
+    assert result.exception is None, result.output
+    assert "excepted: []" not in result.output, result.output
+    result = runner.invoke(cmd_notebook.execute_nbs, ["1", "--no-force"])
+    assert result.exception is None, result.output
+    assert "excepted: []" in result.output, result.output
+    result = runner.invoke(
+        cmd_notebook.execute_nbs, ["1", "--no-force", "--retry-failed"]
+    )
+    assert result.exception is None, result.output
+    assert "excepted: []" not in result.output, result.output
+
+
+def test_project_execute_jobs(runner: Runner, tmp_path: Path):
+    db = runner.create_cache()
+    tmp_path.joinpath("notebooks").mkdir()
+    for name in ("a", "b"):
+        # distinct notebooks, so that their commits do not race on one cache record
+        nb = nbf.read(os.path.join(NB_PATH, "basic_unrun.ipynb"), nbf.NO_CONVERT)
+        nb.cells.append(nbf.v4.new_code_cell(f"name = {name!r}"))
+        path = tmp_path / "notebooks" / f"basic_{name}.ipynb"
+        nbf.write(nb, str(path))
+        db.add_nb_to_project(path=str(path))
+    result = runner.invoke(
+        cmd_project.execute_nbs, ["--executor", "local-parallel", "--jobs", "2"]
+    )
+    assert result.exception is None, result.output
+    assert result.exit_code == 0, result.output
+    assert len(db.list_cache_records()) == 2
+
+
+def test_project_execute_pooled(runner: Runner):
+    db = runner.create_cache()
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic.ipynb"))
+    result = runner.invoke(
+        cmd_project.execute_nbs,
+        ["--executor", "local-pooled", "--pool-size", "1", "--max-kernel-uses", "2"],
+    )
+    assert result.exception is None, result.output
+    assert result.exit_code == 0, result.output
+    assert len(db.list_cache_records()) == 1
+
+
+def test_project_execute_artifacts(runner: Runner):
+    db = runner.create_cache()
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "external_output.ipynb"))
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic_unrun.ipynb"))
+    result = runner.invoke(
+        cmd_project.execute_nbs,
+        ["--executor", "temp-serial", "--artifact-max-size", "1"],
+    )
+    assert result.exception is None, result.output
+    assert result.exit_code == 0, result.output
+    pk = db.get_cached_project_nb(1).pk
+    result = runner.invoke(cmd_cache.cached_info, [str(pk)])
+    assert "- artifact.txt" in result.output, result.output
+    result = runner.invoke(
+        cmd_project.execute_nbs,
+        ["--executor", "temp-serial", "--force", "--artifact-exclude", "*.txt"],
+    )
+    assert result.exception is None, result.output
+    pk = db.get_cached_project_nb(1).pk
+    result = runner.invoke(cmd_cache.cached_info, [str(pk)])
+    assert result.exit_code == 0, result.output
+    assert "artifact.txt" not in result.output, result.output
+
+
+def test_project_execute_shard(runner: Runner):
+    db = runner.create_cache()
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic_unrun.ipynb"))
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic_failing.ipynb"))
+    result = runner.invoke(cmd_project.execute_nbs, ["--shard", "2/2"])
+    assert result.exception is None, result.output
+    assert result.exit_code == 0, result.output
+    assert "basic_unrun.ipynb" in result.output, result.output
+    assert "basic_failing.ipynb" not in result.output, result.output
+    result = runner.invoke(cmd_project.execute_nbs, ["--shard", "3/2"])
+    assert result.exit_code == 2, result.output
+    assert "INDEX must be between 1 and COUNT" in result.output, result.output
+
+
+def test_project_stats(runner: Runner):
+    db = runner.create_cache()
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic.ipynb"))
+    db.add_nb_to_project(path=os.path.join(NB_PATH, "basic_unrun.ipynb"))
+    db.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"),
+        check_validity=False,
+        data={
+            "execution_seconds": 2.5,
+            "kernel_startup_seconds": 1.0,
+            "peak_memory_bytes": 52_000_000,
+            "cpu_user_seconds": 0.75,
+            "cpu_system_seconds": 0.25,
+        },
+    )
+    result = runner.invoke(
+        cmd_project.project_stats, ["--sort-by", "memory", "--path-length", "1"]
+    )
+    assert result.exception is None, result.output
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert "Peak memory (MB)" in lines[0]
+    assert lines[2].split() == [
+        "1",
+        "basic.ipynb",
+        "2.50",
+        "1.00",
+        "52.0",
+        "0.75",
+        "0.25",
+    ]
+    assert lines[3].split() == ["2", "basic_unrun.ipynb", "-", "-", "-", "-", "-"]
+    result = runner.invoke(cmd_cache.cached_info, ["1"])
+    assert result.exception is None, result.output
+    assert "Peak memory (MB): '52.0'" in result.output, result.output
+
+
+def test_cache_import(runner: Runner, tmp_path: Path):
+    db = runner.create_cache()
+    db.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"),
+        uri="basic.ipynb",
+        check_validity=False,
+    )
+    other = JupyterCacheBase(str(tmp_path / "other"))
+    other.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"),
+        uri="basic.ipynb",
+        check_validity=False,
+    )
+    other.cache_notebook_file(
+        path=os.path.join(NB_PATH, "complex_outputs.ipynb"),
+        uri="complex_outputs.ipynb",
+        check_validity=False,
+    )
+    result = runner.invoke(cmd_cache.import_caches, [str(tmp_path / "other")])
+    assert result.exception is None, result.output
+    assert result.exit_code == 0, result.output
+    assert "Imported 1 notebook(s), skipped 1" in result.output, result.output
+    assert len(db.list_cache_records()) == 2
+
+
+def test_cache_export(runner: Runner, tmp_path: Path):
+    db = runner.create_cache()
+    db.cache_notebook_file(
+        path=os.path.join(NB_PATH, "basic.ipynb"),
+        uri="basic.ipynb",
+        check_validity=False,
+    )
+    result = runner.invoke(cmd_cache.export_cache, [])
+    assert result.exception is None, result.output
+    assert result.exit_code == 0, result.output
+    assert "Exported 1 notebook(s)" in result.stderr, result.stderr
+    restored = Runner(tmp_path / "restored")
+    result = restored.invoke(cmd_cache.import_caches, ["-"], input=result.stdout_bytes)
+    assert result.exception is None, result.output
+    assert "Imported 1 notebook(s), skipped 0" in result.output, result.output
+    assert len(restored.create_cache().list_cache_records()) == 1
+
+
+def test_project_hash_assets(runner: Runner):
+    result = runner.invoke(cmd_project.change_hash_assets, ["on"])
+    assert result.exception is None, result.output
+    assert runner.create_cache().get_hash_assets() is True
+    result = runner.invoke(cmd_project.change_hash_assets, [])
+    assert result.exception is None, result.output
+    assert "Hash assets: on" in result.output, result.output
+
+
+def test_project_env_fingerprint(runner: Runner):
+    result = runner.invoke(
+        cmd_project.change_env_fingerprint, ["on", "--package", "nbformat"]
+    )
+    assert result.exception is None, result.output
+    assert runner.create_cache().get_env_fingerprint().packages == ("nbformat",)
+    result = runner.invoke(cmd_project.change_env_fingerprint, [])
+    assert result.exception is None, result.output
+    assert "Environment fingerprint: on" in result.output, result.output
+    assert "- package: nbformat" in result.output, result.output
+    result = runner.invoke(cmd_project.change_env_fingerprint, ["off"])
+    assert result.exception is None, result.output
+    assert runner.create_cache().get_env_fingerprint() is None
+
+
 def test_project_merge(runner: Runner, tmp_path: Path):
     db = runner.create_cache()
     record = db.add_nb_to_project(path=os.path.join(NB_PATH, "basic_unrun.ipynb"))
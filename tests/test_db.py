@@ -1,6 +1,6 @@
 import pytest
 
-from jupyter_cache.cache.db import NbCacheRecord, Setting, create_db
+from jupyter_cache.cache.db import NbCacheRecord, NbLeaseRecord, Setting, create_db
 
 
 def test_setting(tmp_path):
@@ -19,3 +19,29 @@ def test_nb_record(tmp_path):
     NbCacheRecord.create_record("a", "c", db, data="a")
     assert NbCacheRecord.record_from_hashkey("b", db).uri == "a"
     assert {b.hashkey for b in NbCacheRecord.records_from_uri("a", db)} == {"b", "c"}
+
+
+def test_lease_record(tmp_path):
+    db = create_db(tmp_path)
+    assert NbLeaseRecord.claim("q", "a", "a.ipynb", "x", 60, db)
+    assert not NbLeaseRecord.claim("q", "a", "a.ipynb", "y", 60, db)
+    # leases are per queue
+    assert NbLeaseRecord.claim("r", "a", "a.ipynb", "y", 60, db)
+    assert NbLeaseRecord.renew("q", "a", "x", 60, db)
+    assert not NbLeaseRecord.renew("q", "a", "y", 60, db)
+    # an expired lease can be taken over, by one executor only
+    assert NbLeaseRecord.renew("q", "a", "x", -1, db)
+    assert NbLeaseRecord.claim("q", "a", "a.ipynb", "y", 60, db)
+    assert not NbLeaseRecord.claim("q", "a", "a.ipynb", "z", 60, db)
+    assert not NbLeaseRecord.complete("q", "a", "x", db)
+    assert NbLeaseRecord.complete("q", "a", "y", db)
+    # a completed lease cannot be claimed again, even once expired
+    NbLeaseRecord.claim("q", "b", "b.ipynb", "x", -1, db)
+    NbLeaseRecord.complete("q", "b", "x", db)
+    assert not NbLeaseRecord.claim("q", "b", "b.ipynb", "y", 60, db)
+    assert {(r.hashkey, r.done) for r in NbLeaseRecord.records_from_queue("q", db)} == {
+        ("a", True),
+        ("b", True),
+    }
+    NbLeaseRecord.remove_queue("q", db)
+    assert NbLeaseRecord.records_from_queue("q", db) == []